@@ -0,0 +1,153 @@
+"""
+Ledger export: a user's (or a parent's whole family's) transactions and violations as
+CSV or NDJSON, for statements and disputes.
+
+The body is streamed as it is read. Rows come from server-side cursors in chunks of
+EXPORT_CHUNK_ROWS (`yield_per`), each chunk is encoded (and optionally gzip-compressed)
+and sent before the next one is fetched, so memory stays flat however long the history
+is. The stream reads through its own session (on a read replica when one is usable, see
+db.replicas) in one REPEATABLE READ transaction: the request's session is gone by the
+time the body is sent, and the two tables are read from the same snapshot.
+"""
+import csv
+import io
+import os
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, List, Literal, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from auth.security import get_current_user
+from auth.token_cache import Principal
+from db.replicas import get_read_db, read_sessionmaker
+from db.session import AsyncSessionLocal
+from models.models import Transaction, User, Violation
+
+router = APIRouter()
+
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', '2000'))
+
+COLUMNS = (
+    'record', 'id', 'user_id', 'goal_id', 'timestamp', 'type', 'status', 'amount',
+    'wallet_id', 'razorpay_payment_id', 'app_name', 'used_minutes', 'limit_minutes', 'warning_number',
+)
+MEDIA_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+
+def _transaction_record(row) -> dict:
+    return {
+        'record': 'transaction',
+        'id': row.id,
+        'user_id': row.user_id,
+        'goal_id': row.goal_id,
+        'timestamp': row.timestamp.isoformat() if row.timestamp else None,
+        'type': row.type.value,
+        'status': row.status.value if row.status else None,
+        'amount': row.amount,
+        'wallet_id': row.wallet_id,
+        'razorpay_payment_id': row.razorpay_payment_id,
+    }
+
+
+def _violation_record(row) -> dict:
+    return {
+        'record': 'violation',
+        'id': row.id,
+        'user_id': row.user_id,
+        'goal_id': row.goal_id,
+        'timestamp': row.timestamp.isoformat() if row.timestamp else None,
+        'type': row.event_type.value,
+        'status': 'settled' if row.settled_at else 'pending',
+        'amount': row.penalty_amount or 0,
+        'app_name': row.app_name,
+        'used_minutes': row.used_minutes,
+        'limit_minutes': row.limit_minutes,
+        'warning_number': row.warning_number,
+    }
+
+
+async def ledger_records(user_ids: List[str], chunk_rows: int = EXPORT_CHUNK_ROWS,
+                         session_factory: sessionmaker = AsyncSessionLocal) -> AsyncIterator[List[dict]]:
+    """Transactions, then violations, of `user_ids` in (user, timestamp, id) order, a chunk at a time."""
+    transactions = Transaction.__table__
+    violations = Violation.__table__
+    sources = (
+        (select(transactions).where(transactions.c.user_id.in_(user_ids))
+         .order_by(transactions.c.user_id, transactions.c.timestamp, transactions.c.id), _transaction_record),
+        (select(violations).where(violations.c.user_id.in_(user_ids))
+         .order_by(violations.c.user_id, violations.c.timestamp, violations.c.id), _violation_record),
+    )
+    async with session_factory() as db:
+        await db.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+        for stmt, to_record in sources:
+            result = await db.stream(stmt.execution_options(yield_per=chunk_rows))
+            async for rows in result.partitions():
+                yield [to_record(row) for row in rows]
+        await db.rollback()  # read-only; nothing to keep
+
+
+async def encode_csv(chunks: AsyncIterator[List[dict]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    async for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def encode_ndjson(chunks: AsyncIterator[List[dict]]) -> AsyncIterator[bytes]:
+    async for chunk in chunks:
+        yield b''.join(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE) for record in chunk)
+
+
+async def gzip_stream(parts: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    async for part in parts:
+        compressed = compressor.compress(part)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+@router.get('/ledger')
+async def export_ledger(
+    fmt: Literal['csv', 'ndjson'] = Query('csv', alias='format'),
+    scope: Literal['me', 'family'] = 'me',
+    compress: Optional[Literal['gzip']] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Download every transaction and violation of the current user, or with scope=family
+    of a parent and their linked children, as CSV or NDJSON (compress=gzip for .gz)."""
+    if scope == 'family':
+        if current_user.role != 'parent':
+            raise HTTPException(status_code=403, detail='Only parents can export their family ledger')
+        result = await db.execute(
+            select(User.id).where(or_(User.id == current_user.id, User.parent_id == current_user.id))
+        )
+        user_ids = list(result.scalars().all())
+    else:
+        user_ids = [current_user.id]
+    # release the request's connection now; the stream checks out its own
+    await db.close()
+
+    encode = encode_csv if fmt == 'csv' else encode_ndjson
+    body = encode(ledger_records(user_ids, session_factory=read_sessionmaker(current_user.id)))
+    filename = f'ledger-{datetime.utcnow():%Y%m%d}.{fmt}'
+    media_type = MEDIA_TYPES[fmt]
+    if compress == 'gzip':
+        body = gzip_stream(body)
+        filename += '.gz'
+        media_type = 'application/gzip'
+    return StreamingResponse(body, media_type=media_type,
+                             headers={'Content-Disposition': f'attachment; filename="{filename}"'})
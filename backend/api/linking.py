@@ -1,35 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.replicas import get_read_db, mark_written
 from db.session import get_db
 from models.models import User, LinkingCode
 from auth.security import get_current_user
+from auth.token_cache import Principal, token_cache
+from api.rate_limit import by_ip, by_user, rate_limit
+from api.response_cache import conditional_json, response_cache
+from services.linking_codes import CodeSpaceExhausted, linking_code_allocator
 from datetime import datetime, timedelta
-import random
-import string
 
 router = APIRouter()
 
 
-def generate_unique_code(db: Session) -> str:
-    """Generate a unique 6-digit linking code"""
-    while True:
-        # Generate 6-digit code
-        code = ''.join(random.choices(string.digits, k=6))
-        
-        # Check if code already exists and is not expired
-        existing = db.query(LinkingCode).filter(
-            LinkingCode.code == code,
-            LinkingCode.expires_at > datetime.utcnow()
-        ).first()
-        
-        if not existing:
-            return code
-
-
 @router.post('/generate-linking-code')
 async def generate_linking_code(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Generate a linking code for parent to share with child"""
     
@@ -38,11 +26,12 @@ async def generate_linking_code(
         raise HTTPException(status_code=403, detail='Only parents can generate linking codes')
     
     # Check if there's an existing unused code
-    existing_code = db.query(LinkingCode).filter(
+    result = await db.execute(select(LinkingCode).where(
         LinkingCode.parent_id == current_user.id,
         LinkingCode.is_used == False,
         LinkingCode.expires_at > datetime.utcnow()
-    ).first()
+    ))
+    existing_code = result.scalars().first()
     
     if existing_code:
         # Return existing valid code
@@ -54,19 +43,13 @@ async def generate_linking_code(
             'qr_data': f"{current_user.id}:{existing_code.code}"
         }
     
-    # Generate new code
-    code = generate_unique_code(db)
+    # Allocate a free code (O(1) from the allocator's shuffled pool, upserted to stay unique across workers)
     expires_at = datetime.utcnow() + timedelta(hours=24)
-    
-    linking_code = LinkingCode(
-        parent_id=current_user.id,
-        code=code,
-        expires_at=expires_at
-    )
-    
-    db.add(linking_code)
-    db.commit()
-    db.refresh(linking_code)
+    try:
+        code = await linking_code_allocator.allocate(db, current_user.id, expires_at)
+    except CodeSpaceExhausted:
+        raise HTTPException(status_code=503, detail='No linking codes available, please retry shortly')
+    await db.commit()
     
     return {
         'code': code,
@@ -77,11 +60,15 @@ async def generate_linking_code(
     }
 
 
-@router.post('/verify-linking-code')
+# 6-digit codes can be guessed; limit per account and per address before any lookup runs
+@router.post('/verify-linking-code', dependencies=[
+    Depends(rate_limit('verify_code_ip', '30/60', by_ip)),
+    Depends(rate_limit('verify_code_user', '5/60', by_user)),
+])
 async def verify_linking_code(
     payload: dict,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Verify linking code and link child to parent
     payload: {"code": "123456"} or {"qr_data": "parent_id:code"}
@@ -111,73 +98,108 @@ async def verify_linking_code(
         raise HTTPException(status_code=400, detail='Code or QR data required')
     
     # Find the linking code
-    linking_code = db.query(LinkingCode).filter(
+    result = await db.execute(select(LinkingCode).where(
         LinkingCode.code == code,
         LinkingCode.is_used == False,
         LinkingCode.expires_at > datetime.utcnow()
-    ).first()
+    ))
+    linking_code = result.scalars().first()
     
     if not linking_code:
         raise HTTPException(status_code=404, detail='Invalid or expired linking code')
     
     # Get parent
-    parent = db.query(User).filter(User.id == linking_code.parent_id).first()
+    result = await db.execute(select(User).where(User.id == linking_code.parent_id))
+    parent = result.scalars().first()
     if not parent:
         raise HTTPException(status_code=404, detail='Parent not found')
     
-    # Link child to parent
-    current_user.parent_id = parent.id
-    current_user.role = 'child'  # Ensure role is set to child
+    # Link child to parent. The checks above used the cached principal, which another
+    # worker's link may have made stale; repeat them on the locked row before overwriting it.
+    result = await db.execute(select(User).where(User.id == current_user.id).with_for_update())
+    user = result.scalars().first()
+    if not user:
+        raise HTTPException(status_code=404, detail='User not found')
+    if user.role == 'parent' or user.parent_id:
+        is_parent = user.role == 'parent'
+        await db.rollback()
+        token_cache.invalidate_user(current_user.id)
+        if is_parent:
+            raise HTTPException(status_code=403, detail='Parents cannot use linking codes')
+        raise HTTPException(status_code=400, detail='Already linked to a parent')
+    user.parent_id = parent.id
+    user.role = 'child'  # Ensure role is set to child
     
     # Mark code as used
     linking_code.is_used = True
-    linking_code.used_by_user_id = current_user.id
+    linking_code.used_by_user_id = user.id
     linking_code.used_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(user)
+    linking_code_allocator.mark_used(linking_code.code, linking_code.used_at)
+    # role and parent_id changed: drop cached principals for this user
+    token_cache.invalidate_user(user.id)
+    # the child's profile and the parent's children list changed
+    response_cache.invalidate_user(user.id, parent.id)
+    # the parent reads the new link next; keep those reads off lagging replicas too
+    mark_written(parent.id)
     
     return {
         'success': True,
         'parent_name': parent.name,
         'parent_email': parent.email,
-        'child_name': current_user.name,
-        'child_email': current_user.email,
+        'child_name': user.name,
+        'child_email': user.email,
         'linked_at': datetime.utcnow().isoformat()
     }
 
 
 @router.get('/my-children')
 async def get_my_children(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get list of children linked to current parent"""
+    """Get list of children linked to current parent (supports If-None-Match)"""
     
     if current_user.role != 'parent':
         raise HTTPException(status_code=403, detail='Only parents can view children')
     
-    children = db.query(User).filter(User.parent_id == current_user.id).all()
-    
-    return {
-        'children': [
-            {
-                'id': child.id,
-                'name': child.name,
-                'email': child.email,
-                'created_at': child.created_at.isoformat()
-            }
-            for child in children
-        ]
-    }
+    async def version():
+        # any link or profile change moves the count or the newest updated_at
+        result = await db.execute(
+            select(func.count(User.id), func.max(User.updated_at)).where(User.parent_id == current_user.id)
+        )
+        return tuple(result.one())
+
+    async def build():
+        result = await db.execute(select(User).where(User.parent_id == current_user.id))
+        children = result.scalars().all()
+        return {
+            'children': [
+                {
+                    'id': child.id,
+                    'name': child.name,
+                    'email': child.email,
+                    'created_at': child.created_at.isoformat()
+                }
+                for child in children
+            ]
+        }
+
+    return await conditional_json(request, response, 'my-children', current_user.id, version, build)
 
 
 @router.get('/my-parent')
 async def get_my_parent(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get parent info for current child"""
+    """Get parent info for current child (supports If-None-Match)"""
     
     if current_user.role != 'child':
         raise HTTPException(status_code=403, detail='Only children can view parent')
@@ -185,12 +207,22 @@ async def get_my_parent(
     if not current_user.parent_id:
         raise HTTPException(status_code=404, detail='No parent linked')
     
-    parent = db.query(User).filter(User.id == current_user.parent_id).first()
-    if not parent:
-        raise HTTPException(status_code=404, detail='Parent not found')
-    
-    return {
-        'id': parent.id,
-        'name': parent.name,
-        'email': parent.email
-    }
+    parent = None
+
+    async def version():
+        nonlocal parent
+        result = await db.execute(select(User).where(User.id == current_user.parent_id))
+        parent = result.scalars().first()
+        if not parent:
+            raise HTTPException(status_code=404, detail='Parent not found')
+        return (parent.updated_at,)
+
+    async def build():
+        return {
+            'id': parent.id,
+            'name': parent.name,
+            'email': parent.email
+        }
+
+    # keyed by the parent: every sibling shares one cached body
+    return await conditional_json(request, response, 'my-parent', current_user.parent_id, version, build)
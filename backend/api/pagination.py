@@ -0,0 +1,58 @@
+"""
+Keyset (cursor) pagination for newest-first history lists.
+
+A page is `WHERE <filters> AND (timestamp, id) < (:last_timestamp, :last_id)
+ORDER BY timestamp DESC, id DESC LIMIT n`. With an index on (user_id, timestamp, id)
+Postgres seeks straight to the cursor position, so page 1000 costs the same as page 1
+(OFFSET would read and discard every earlier row). The id breaks ties between rows
+with the same timestamp, so no row is skipped or repeated across pages.
+
+The cursor handed to clients is the (timestamp, id) of the last row of the page,
+base64-encoded; clients treat it as opaque and send it back as `?cursor=`.
+"""
+import base64
+import binascii
+from datetime import datetime
+from typing import Optional
+
+import orjson
+from fastapi import HTTPException
+from pydantic import TypeAdapter
+from sqlalchemy import Select, tuple_
+
+from api.responses import json_bytes
+from schemas.schemas import dump_list
+
+
+def encode_cursor(timestamp: datetime, row_id: str) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps([timestamp.isoformat(), row_id])).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """(timestamp, id) from a cursor; 400 if it was not produced by encode_cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, row_id = orjson.loads(raw)
+        return datetime.fromisoformat(timestamp), str(row_id)
+    except (binascii.Error, orjson.JSONDecodeError, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail='invalid cursor')
+
+
+def keyset_page(stmt: Select, model, cursor: Optional[str], limit: int) -> Select:
+    """Order `stmt` newest first and restrict it to the page after `cursor`.
+
+    Fetches one row more than `limit` so page_response can tell whether a next page exists.
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(model.timestamp, model.id) < tuple_(timestamp, row_id))
+    return stmt.order_by(model.timestamp.desc(), model.id.desc()).limit(limit + 1)
+
+
+def page_response(adapter: TypeAdapter, rows: list, limit: int):
+    """{"items": [...], "next_cursor": "..." | null} for rows fetched by keyset_page."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+    return json_bytes(b'{"items":' + dump_list(adapter, rows) + b',"next_cursor":' + orjson.dumps(next_cursor) + b'}')
@@ -0,0 +1,155 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from api.pagination import keyset_page, page_response
+from api.transactions import transaction_history
+from api.violations import LIST_LIMIT_MAX, violation_history
+from auth.security import get_current_user
+from auth.token_cache import Principal
+from db.replicas import get_read_db
+from models.models import (
+    Goal, GoalStatus, Transaction, TransactionStatus, TransactionType, User, Violation, ViolationType,
+    WalletLedger, WalletStatus
+)
+from schemas.schemas import transaction_list_adapter, violation_list_adapter
+
+router = APIRouter()
+
+
+def _wallet_view(wallet: WalletLedger) -> dict:
+    return {
+        'id': wallet.id,
+        'deposit_amount': wallet.deposit_amount,
+        'current_balance': wallet.current_balance,
+        'total_penalty': wallet.total_penalty or 0,
+        'total_warnings': wallet.total_warnings or 0,
+    }
+
+
+def _violation_view(violation: Violation) -> dict:
+    return {
+        'id': violation.id,
+        'app_name': violation.app_name,
+        'event_type': violation.event_type.value if violation.event_type else None,
+        'used_minutes': violation.used_minutes,
+        'limit_minutes': violation.limit_minutes,
+        'warning_number': violation.warning_number,
+        'penalty_applied': violation.penalty_applied,
+        'penalty_amount': violation.penalty_amount or 0,
+        'timestamp': violation.timestamp.isoformat(),
+    }
+
+
+@router.get('/dashboard')
+async def get_dashboard(
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Family overview for a parent: every child's active goals, wallets, warnings and today's violations.
+
+    Always four queries regardless of family size: children, their active goals and
+    those goals' active wallets (batched selectinload), and today's violations for
+    all children in one query keyed on the parent.
+    """
+    if current_user.role != 'parent':
+        raise HTTPException(status_code=403, detail='Only parents can view the dashboard')
+
+    result = await db.execute(
+        select(User)
+        .where(User.parent_id == current_user.id)
+        .order_by(User.created_at)
+        .options(
+            selectinload(User.goals.and_(Goal.status == GoalStatus.active))
+            .selectinload(Goal.wallets.and_(WalletLedger.status == WalletStatus.active))
+        )
+    )
+    children = result.scalars().all()
+
+    day_start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    result = await db.execute(
+        select(Violation)
+        .join(User, User.id == Violation.user_id)
+        .where(User.parent_id == current_user.id, Violation.timestamp >= day_start)
+        .order_by(Violation.timestamp)
+    )
+    violations_by_goal = defaultdict(list)
+    for violation in result.scalars().all():
+        violations_by_goal[violation.goal_id].append(violation)
+
+    family = []
+    for child in children:
+        goals = []
+        for goal in child.goals:
+            wallet = min(goal.wallets, key=lambda w: w.created_at) if goal.wallets else None
+            goals.append({
+                'id': goal.id,
+                'app_name': goal.app_name,
+                'daily_limit_minutes': goal.daily_limit_minutes,
+                'max_warnings': goal.max_warnings,
+                'penalty_percent': goal.penalty_percent,
+                'end_date': goal.end_date.isoformat() if goal.end_date else None,
+                'wallet': _wallet_view(wallet) if wallet else None,
+                'violations_today': [_violation_view(v) for v in violations_by_goal.get(goal.id, [])],
+            })
+        family.append({
+            'id': child.id,
+            'name': child.name,
+            'email': child.email,
+            'picture': child.picture,
+            'goals': goals,
+            'wallet_balance': sum(g['wallet']['current_balance'] for g in goals if g['wallet']),
+            'total_warnings': sum(g['wallet']['total_warnings'] for g in goals if g['wallet']),
+            'violations_today': sum(len(g['violations_today']) for g in goals),
+        })
+
+    return {'children': family, 'generated_at': datetime.utcnow().isoformat()}
+
+
+async def _require_child(db: AsyncSession, current_user: Principal, child_id: str) -> None:
+    if current_user.role != 'parent':
+        raise HTTPException(status_code=403, detail="Only parents can view a child's history")
+    result = await db.execute(select(User.id).where(User.id == child_id, User.parent_id == current_user.id))
+    if result.first() is None:
+        raise HTTPException(status_code=404, detail='Child not found')
+
+
+@router.get('/children/{child_id}/transactions')
+async def list_child_transactions(
+    child_id: str,
+    goal_id: Optional[str] = None,
+    txn_type: Optional[TransactionType] = Query(None, alias='type'),
+    status: Optional[TransactionStatus] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=LIST_LIMIT_MAX),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """A linked child's transactions, paginated like GET /api/transactions."""
+    await _require_child(db, current_user, child_id)
+    stmt = keyset_page(transaction_history(child_id, goal_id, txn_type, status), Transaction, cursor, limit)
+    result = await db.execute(stmt)
+    return page_response(transaction_list_adapter, result.scalars().all(), limit)
+
+
+@router.get('/children/{child_id}/violations')
+async def list_child_violations(
+    child_id: str,
+    goal_id: Optional[str] = None,
+    event_type: Optional[ViolationType] = Query(None, alias='type'),
+    status: Optional[Literal['settled', 'pending']] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=LIST_LIMIT_MAX),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """A linked child's violations, paginated like GET /api/violations."""
+    await _require_child(db, current_user, child_id)
+    stmt = keyset_page(violation_history(child_id, goal_id, event_type, status), Violation, cursor, limit)
+    result = await db.execute(stmt)
+    return page_response(violation_list_adapter, result.scalars().all(), limit)
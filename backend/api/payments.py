@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.session import get_db
+from services.payments import RAZORPAY_WEBHOOK_SECRET, InvalidWebhook, record_event, verify_signature
+
+router = APIRouter()
+
+
+@router.post('/razorpay/webhook')
+async def razorpay_webhook(request: Request, db: AsyncSession = Depends(get_db)):
+    """Razorpay event delivery: verify, store in the inbox and acknowledge.
+
+    Wallets are credited afterwards by the apply_payment_events job (see services.payments).
+    """
+    if not RAZORPAY_WEBHOOK_SECRET:
+        raise HTTPException(status_code=503, detail='webhook not configured')
+    body = await request.body()
+    if not verify_signature(body, request.headers.get('x-razorpay-signature')):
+        raise HTTPException(status_code=400, detail='invalid signature')
+    try:
+        created = await record_event(db, body, request.headers.get('x-razorpay-event-id'))
+    except InvalidWebhook as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await db.commit()
+    return {'status': 'ok', 'duplicate': not created}
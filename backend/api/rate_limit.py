@@ -0,0 +1,154 @@
+"""
+In-process rate limiting for endpoints that push work onto Postgres or Google.
+
+Each limiter is a set of token buckets, one per key (client IP or user id). A bucket
+is two floats (tokens left, last refill time), refilled lazily on each hit, so memory
+per key is constant and a check is a dict lookup plus arithmetic. Buckets are spread
+over shards, each an LRU capped at max_keys / shards: idle keys fall off the end, so a
+flood of distinct keys costs bounded memory instead of growing without limit.
+
+Limits are attached per route as dependencies, which FastAPI resolves before the
+endpoint's own parameters (and so before any DB session is used):
+
+    @router.post('/token', dependencies=[Depends(rate_limit('login_ip', '20/60'))])
+
+Limits are per worker; with N workers a client can get up to N times the configured
+rate, which is fine for slowing down guessing and floods. Configure with
+RATE_LIMIT_<NAME>="<requests>/<seconds>", e.g. RATE_LIMIT_LOGIN_IP=20/60, and set
+RATE_LIMIT_ENABLED=false to turn all limits off.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Request
+
+from auth.security import verify_access_token
+from auth.token_cache import token_cache
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000'))
+RATE_LIMIT_SHARDS = int(os.getenv('RATE_LIMIT_SHARDS', '16'))
+# Proxies in front of the app that append to X-Forwarded-For (0: use the socket peer)
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', '0'))
+
+
+def parse_limit(spec: str) -> tuple:
+    """'20/60' -> (20, 60.0): up to 20 requests per 60 seconds."""
+    count, _, seconds = spec.partition('/')
+    return int(count), float(seconds or 1)
+
+
+class RateLimiter:
+    """Token buckets of `capacity` tokens refilled over `period` seconds, keyed by string."""
+
+    def __init__(self, name: str, capacity: int, period: float,
+                 max_keys: int = RATE_LIMIT_MAX_KEYS, shards: int = RATE_LIMIT_SHARDS):
+        self.name = name
+        self.capacity = float(capacity)
+        self.refill_per_second = capacity / period
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._shard_size = max(max_keys // shards, 1)
+        self.allowed = 0
+        self.rejected = 0
+        self.evictions = 0
+
+    def hit(self, key: str, cost: float = 1.0) -> float:
+        """Take `cost` tokens from `key`'s bucket; returns 0 if allowed, else seconds to wait."""
+        shard = self._shards[hash(key) % len(self._shards)]
+        now = time.monotonic()
+        bucket = shard.get(key)
+        if bucket is None:
+            bucket = [self.capacity, now]
+            shard[key] = bucket
+            if len(shard) > self._shard_size:
+                shard.popitem(last=False)
+                self.evictions += 1
+        else:
+            shard.move_to_end(key)
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_per_second)
+            bucket[1] = now
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            self.allowed += 1
+            return 0.0
+        self.rejected += 1
+        return (cost - bucket[0]) / self.refill_per_second
+
+    def clear(self) -> None:
+        for shard in self._shards:
+            shard.clear()
+
+    def stats(self) -> dict:
+        return {
+            'keys': sum(len(shard) for shard in self._shards),
+            'capacity': self.capacity,
+            'refill_per_second': round(self.refill_per_second, 4),
+            'allowed': self.allowed,
+            'rejected': self.rejected,
+            'evictions': self.evictions,
+        }
+
+
+limiters: dict = {}
+
+
+def limiter(name: str, default: str) -> RateLimiter:
+    """The named limiter, created from RATE_LIMIT_<NAME> (or `default`) on first use."""
+    if name not in limiters:
+        capacity, period = parse_limit(os.getenv(f'RATE_LIMIT_{name.upper()}', default))
+        limiters[name] = RateLimiter(name, capacity, period)
+    return limiters[name]
+
+
+def rate_limit_stats() -> dict:
+    return {name: lim.stats() for name, lim in limiters.items()}
+
+
+def client_ip(request: Request) -> str:
+    if TRUSTED_PROXY_HOPS:
+        forwarded = [p.strip() for p in request.headers.get('x-forwarded-for', '').split(',') if p.strip()]
+        if len(forwarded) >= TRUSTED_PROXY_HOPS:
+            return forwarded[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else 'unknown'
+
+
+def bearer_subject(request: Request) -> Optional[str]:
+    """User id from the bearer token, without touching the DB (None if there is no valid token)."""
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    user_id = token_cache.peek_user_id(token)
+    if user_id is not None:
+        return user_id
+    payload = verify_access_token(token)
+    return payload.get('sub') if payload else None
+
+
+def by_ip(request: Request) -> str:
+    return f'ip:{client_ip(request)}'
+
+
+def by_user(request: Request) -> str:
+    # unauthenticated calls are limited by IP; get_current_user rejects them afterwards
+    subject = bearer_subject(request)
+    return f'user:{subject}' if subject else by_ip(request)
+
+
+def rate_limit(name: str, default: str, key: Callable[[Request], str] = by_ip):
+    """Route dependency enforcing limiter `name`; over-limit calls get 429 with Retry-After."""
+    bucket = limiter(name, default)
+
+    async def check(request: Request) -> None:
+        if not RATE_LIMIT_ENABLED:
+            return
+        retry_after = bucket.hit(key(request))
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail='Too many requests, please retry later',
+                headers={'Retry-After': str(max(int(retry_after + 0.999), 1))},
+            )
+
+    return check
@@ -0,0 +1,149 @@
+"""
+Conditional GET for endpoints the app polls.
+
+Each endpoint derives an ETag from cheap version data (row `updated_at` values) and
+answers a matching If-None-Match with 304 without building the body. Rendered bodies
+are kept in a small in-process LRU keyed by (endpoint, owner user id), so a repeat
+poll on the same worker costs no queries at all. Write paths that change what these
+endpoints return call `response_cache.invalidate_user`; entries also expire after
+RESPONSE_CACHE_TTL_SECONDS, which bounds staleness on workers that did not see the write.
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+import orjson
+from fastapi import Request, Response
+
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '10000'))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '30'))
+
+
+@dataclass(frozen=True)
+class CachedBody:
+    etag: str
+    body: bytes
+    expires_at: float
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1('|'.join(str(p) for p in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    # weak comparison, as required for If-None-Match
+    bare = etag[2:] if etag.startswith('W/') else etag
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate == etag or candidate == bare or candidate == f'W/{bare}':
+            return True
+    return False
+
+
+class ResponseCache:
+    """LRU of (endpoint name, owner user id) -> rendered JSON body and its ETag."""
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[tuple, CachedBody]' = OrderedDict()
+        self._by_user: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, name: str, owner_id: str) -> Optional[CachedBody]:
+        key = (name, owner_id)
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, name: str, owner_id: str, etag: str, body: bytes) -> CachedBody:
+        key = (name, owner_id)
+        entry = CachedBody(etag=etag, body=body, expires_at=time.monotonic() + self.ttl_seconds)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._by_user.setdefault(owner_id, set()).add(name)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+        return entry
+
+    def _remove(self, key: tuple) -> None:
+        self._entries.pop(key, None)
+        names = self._by_user.get(key[1])
+        if names is not None:
+            names.discard(key[0])
+            if not names:
+                del self._by_user[key[1]]
+
+    def invalidate_user(self, *user_ids: Optional[str]) -> None:
+        """Drop every cached response owned by the given users (None ids are ignored)."""
+        for user_id in user_ids:
+            for name in list(self._by_user.get(user_id, ())):
+                self._remove((name, user_id))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_user.clear()
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+        }
+
+
+response_cache = ResponseCache()
+
+
+def _send(request: Request, response: Response, etag: str, body: Optional[bytes]) -> Response:
+    if etag_matches(request, etag):
+        response_cache.not_modified += 1
+        out = Response(status_code=304)
+    else:
+        out = Response(content=body, media_type='application/json')
+    # keep headers set by dependencies (e.g. the refreshed X-Access-Token)
+    for key, value in response.headers.items():
+        out.headers[key] = value
+    out.headers['ETag'] = etag
+    out.headers['Cache-Control'] = 'private, no-cache'
+    return out
+
+
+async def conditional_json(
+    request: Request,
+    response: Response,
+    name: str,
+    owner_id: str,
+    version: Callable[[], Awaitable[tuple]],
+    build: Callable[[], Awaitable[dict]],
+) -> Response:
+    """Serve `name` for `owner_id` from cache, as a 304, or by building it.
+
+    `version()` returns the values the ETag is derived from and should be much cheaper
+    than `build()`, which is only called when the client's copy is out of date.
+    """
+    entry = response_cache.get(name, owner_id)
+    if entry is None:
+        etag = make_etag(name, owner_id, *(await version()))
+        if etag_matches(request, etag):
+            return _send(request, response, etag, None)
+        body = orjson.dumps(await build(), option=orjson.OPT_NON_STR_KEYS)
+        entry = response_cache.put(name, owner_id, etag, body)
+    return _send(request, response, entry.etag, entry.body)
@@ -0,0 +1,14 @@
+"""Default response class for the app: orjson renders dicts, lists and datetimes in C."""
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def json_bytes(body: bytes, status_code: int = 200) -> Response:
+    """Wrap already-encoded JSON (e.g. from schemas.dump_list) without re-encoding it."""
+    return Response(content=body, status_code=status_code, media_type='application/json')
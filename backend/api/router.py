@@ -1,24 +1,112 @@
-from fastapi import APIRouter, Depends, Response, HTTPException
-from sqlalchemy.orm import Session
+import hmac
+import os
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Request, Response, HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.response_cache import conditional_json, response_cache
 from auth.security import get_current_user
-from db.session import get_db
-from models.models import User
+from auth.token_cache import Principal, token_cache
+from services.scheduler import job_stats
+from services.profiler import SQL_PROFILER_ENABLED, profile_store
+from db.pool import pool_settings, pool_status
+from db.replicas import replica_set
+from db.session import async_engine, engine, get_db
+from config import load_env
+
+load_env()
+
+# Shared secret for the internal /health/* and /debug endpoints, sent as X-Ops-Token;
+# unset, those endpoints answer 404
+OPS_TOKEN = os.getenv('OPS_TOKEN', '')
 
 router = APIRouter()
 
 
+def require_ops_token(x_ops_token: Optional[str] = Header(None)) -> None:
+    # cache counters, pool state and SQL profiles are for operators, not app users
+    if not OPS_TOKEN:
+        raise HTTPException(status_code=404, detail='Not Found')
+    if not x_ops_token or not hmac.compare_digest(x_ops_token, OPS_TOKEN):
+        raise HTTPException(status_code=403, detail='Invalid ops token')
+
+
+ops_only = [Depends(require_ops_token)]
+
+
 @router.get("/health")
 def health():
     return {"status": "ok"}
 
 
-@router.get('/me')
-def me(response: Response, current_user: User = Depends(get_current_user)):
-    # returns the current user information; X-Access-Token header will be set by dependency
+@router.get("/health/token-cache", dependencies=ops_only)
+def token_cache_stats():
+    # hit/miss counters of the verified-token cache used by get_current_user
+    return token_cache.stats()
+
+
+@router.get("/health/jobs", dependencies=ops_only)
+def jobs_health():
+    # per-job run counts and runtimes of the maintenance scheduler
+    return job_stats()
+
+
+@router.get("/health/db", dependencies=ops_only)
+async def db_health(db: AsyncSession = Depends(get_db)):
+    # round trip through the request pool plus checkout/wait/overflow counters of both engines
+    started = time.perf_counter()
+    await db.execute(text("SELECT 1"))
+    ping_ms = (time.perf_counter() - started) * 1000
     return {
-        "id": str(current_user.id),
-        "email": current_user.email,
-        "name": current_user.name,
-        "picture": current_user.picture,
-        "role": current_user.role.value if current_user.role else None
+        "status": "ok",
+        "ping_ms": round(ping_ms, 2),
+        "settings": pool_settings(),
+        "async_pool": pool_status(async_engine),
+        "sync_pool": pool_status(engine),
+        # per replica: in rotation or not, replay lag, reads served (empty without DATABASE_READ_URL)
+        "replicas": {r.name: {**r.stats(), "pool": pool_status(r.engine)} for r in replica_set.replicas},
     }
+
+
+@router.get("/health/response-cache", dependencies=ops_only)
+def response_cache_stats():
+    # hit/miss/304 counters of the conditional GET cache (api.response_cache)
+    return response_cache.stats()
+
+
+@router.get("/debug/profiles", dependencies=ops_only)
+def list_profiles():
+    # recent request profiles (SQL_PROFILER=true only), newest first
+    if not SQL_PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail='SQL profiler is disabled')
+    return profile_store.summaries()
+
+
+@router.get("/debug/profiles/{request_id}", dependencies=ops_only)
+def get_profile(request_id: str):
+    if not SQL_PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail='SQL profiler is disabled')
+    report = profile_store.get(request_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail='Unknown request id')
+    return report
+
+
+@router.get('/me')
+async def me(request: Request, response: Response, current_user: Principal = Depends(get_current_user)):
+    # returns the current user information; X-Access-Token header will be set by dependency
+    async def version():
+        return (current_user.updated_at, current_user.role)
+
+    async def build():
+        return {
+            "id": str(current_user.id),
+            "email": current_user.email,
+            "name": current_user.name,
+            "picture": current_user.picture,
+            "role": current_user.role.value if current_user.role else None
+        }
+
+    return await conditional_json(request, response, 'me', current_user.id, version, build)
@@ -0,0 +1,80 @@
+"""
+Delta sync of the rules the device enforces: the user's goals and wallets.
+
+Every write to a goal or wallet is stamped with the id of the writing transaction, and
+deletions leave a tombstone stamped the same way (triggers in
+migrations/0011_add_sync_versions.py). A device sends the version it last saw and gets
+back only what changed after it:
+
+    GET /api/sync?since=42  ->  {"version": 45, "full": false, "goals": [...], "wallets": [...], "deleted": [...]}
+
+Transactions commit out of id order, so the version handed back is not the newest stamp
+read but the snapshot's xmin minus one: every transaction below xmin had finished when
+the reads began, so nothing can later appear at or below the cursor. Rows stamped above
+it that were already visible are sent again next time, which is harmless.
+
+Nothing changed costs one statement: the snapshot bounds plus an EXISTS probe of each
+(user_id, version) index. Otherwise each table is read with a range scan of that index.
+since=0 (first sync) or a version the database has not reached returns the full state
+with full=true.
+"""
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.responses import json_bytes
+from auth.security import get_current_user
+from auth.token_cache import Principal
+from db.replicas import get_read_db
+from models.models import Goal, SyncTombstone, WalletLedger
+from schemas.schemas import SyncResponse, sync_response_adapter
+
+router = APIRouter()
+
+# (xmin, xmax) of this statement's snapshot, and whether anything of the user's is newer than :since
+_SNAPSHOT = text("""
+    SELECT pg_snapshot_xmin(s)::text::bigint, pg_snapshot_xmax(s)::text::bigint,
+           EXISTS (SELECT 1 FROM goals WHERE user_id = :user_id AND version > :since)
+           OR EXISTS (SELECT 1 FROM wallet_ledger WHERE user_id = :user_id AND version > :since)
+           OR EXISTS (SELECT 1 FROM sync_tombstones WHERE user_id = :user_id AND version > :since)
+    FROM pg_current_snapshot() AS s
+""")
+
+
+@router.get('')
+async def sync(
+    since: int = Query(0, ge=0),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Goals, wallets and deletions of the current user newer than version `since`."""
+    xmin, xmax, changed = (await db.execute(_SNAPSHOT, {'user_id': current_user.id, 'since': since})).one()
+    full = since == 0 or since >= xmax
+    # a lagging replica can be behind a cursor the primary issued; never move the device back
+    version = max(xmin - 1, 0 if full else since)
+    if not full and not changed:
+        return json_bytes(sync_response_adapter.dump_json(
+            SyncResponse(version=version, full=False, goals=[], wallets=[], deleted=[])
+        ))
+
+    goals = select(Goal).where(Goal.user_id == current_user.id)
+    wallets = select(WalletLedger).where(WalletLedger.user_id == current_user.id)
+    if not full:
+        goals = goals.where(Goal.version > since)
+        wallets = wallets.where(WalletLedger.version > since)
+    goal_rows = (await db.execute(goals.order_by(Goal.version))).scalars().all()
+    wallet_rows = (await db.execute(wallets.order_by(WalletLedger.version))).scalars().all()
+    deleted = []
+    if not full:
+        result = await db.execute(
+            select(SyncTombstone)
+            .where(SyncTombstone.user_id == current_user.id, SyncTombstone.version > since)
+            .order_by(SyncTombstone.version, SyncTombstone.entity_id)
+        )
+        deleted = result.scalars().all()
+
+    # these reads run after the snapshot above, so they see everything stamped below xmin
+    return json_bytes(sync_response_adapter.dump_json(sync_response_adapter.validate_python(
+        {'version': version, 'full': full, 'goals': goal_rows, 'wallets': wallet_rows, 'deleted': deleted},
+        from_attributes=True,
+    )))
@@ -0,0 +1,51 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.pagination import keyset_page, page_response
+from api.violations import LIST_LIMIT_MAX
+from auth.security import get_current_user
+from auth.token_cache import Principal
+from db.replicas import get_read_db
+from models.models import Transaction, TransactionStatus, TransactionType
+from schemas.schemas import transaction_list_adapter
+
+router = APIRouter()
+
+
+def transaction_history(
+    user_id: str,
+    goal_id: Optional[str] = None,
+    txn_type: Optional[TransactionType] = None,
+    status: Optional[TransactionStatus] = None,
+) -> Select:
+    stmt = select(Transaction).where(Transaction.user_id == user_id)
+    if goal_id:
+        stmt = stmt.where(Transaction.goal_id == goal_id)
+    if txn_type:
+        stmt = stmt.where(Transaction.type == txn_type)
+    if status:
+        stmt = stmt.where(Transaction.status == status)
+    return stmt
+
+
+@router.get('')
+async def list_transactions(
+    goal_id: Optional[str] = None,
+    txn_type: Optional[TransactionType] = Query(None, alias='type'),
+    status: Optional[TransactionStatus] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=LIST_LIMIT_MAX),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """The current user's deposits, penalties and withdrawals, newest first.
+
+    Returns {"items": [...], "next_cursor": ...}; pass next_cursor back as `cursor` for
+    the following page (null on the last page).
+    """
+    stmt = keyset_page(transaction_history(current_user.id, goal_id, txn_type, status), Transaction, cursor, limit)
+    result = await db.execute(stmt)
+    return page_response(transaction_list_adapter, result.scalars().all(), limit)
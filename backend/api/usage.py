@@ -0,0 +1,113 @@
+import os
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth.security import get_current_user
+from auth.token_cache import Principal
+from db.replicas import get_read_db
+from db.session import get_db
+from models.models import DailyUsage, Goal, User
+from schemas.schemas import UsageReport
+from services.usage import usage_series
+
+router = APIRouter()
+
+# Upper bound on (app, day) rows accepted in one upload
+USAGE_BATCH_MAX = int(os.getenv('USAGE_BATCH_MAX', '1000'))
+# Longest range a single usage query may cover
+USAGE_QUERY_MAX_DAYS = int(os.getenv('USAGE_QUERY_MAX_DAYS', str(5 * 366)))
+
+
+@router.post('')
+async def report_usage(
+    reports: List[UsageReport],
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Upsert the current user's per-app daily totals.
+
+    Body: JSON array of {"app_name", "day", "minutes", "goal_id"?}. `minutes` is the
+    device's running total for that day, so re-sending is safe and a stale (lower)
+    total never overwrites a newer one.
+    """
+    if len(reports) > USAGE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f'at most {USAGE_BATCH_MAX} usage rows per request')
+    if not reports:
+        return {'accepted': 0}
+
+    # devices report local days, which can run up to a day ahead of UTC
+    latest_day = datetime.utcnow().date() + timedelta(days=1)
+    if any(r.day > latest_day for r in reports):
+        raise HTTPException(status_code=400, detail='usage reported for a future day')
+
+    goal_ids = {r.goal_id for r in reports if r.goal_id}
+    if goal_ids:
+        result = await db.execute(select(Goal.id).where(Goal.id.in_(goal_ids), Goal.user_id == current_user.id))
+        missing = goal_ids - set(result.scalars().all())
+        if missing:
+            raise HTTPException(status_code=404, detail=f'goals not found: {", ".join(sorted(missing))}')
+
+    # one row per key (an upsert cannot touch the same row twice), in key order for consistent locking
+    rows = {}
+    for r in reports:
+        key = (r.app_name, r.day)
+        if key not in rows or r.minutes > rows[key].minutes:
+            rows[key] = r
+    now = datetime.utcnow()
+    stmt = pg_insert(DailyUsage).values([
+        {
+            'user_id': current_user.id,
+            'app_name': r.app_name,
+            'day': r.day,
+            'goal_id': r.goal_id,
+            'minutes': r.minutes,
+            'updated_at': now,
+        }
+        for _, r in sorted(rows.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyUsage.user_id, DailyUsage.app_name, DailyUsage.day],
+        set_={
+            'minutes': func.greatest(DailyUsage.minutes, stmt.excluded.minutes),
+            'goal_id': func.coalesce(stmt.excluded.goal_id, DailyUsage.goal_id),
+            'updated_at': stmt.excluded.updated_at,
+        },
+    )
+    await db.execute(stmt)
+    await db.commit()
+    return {'accepted': len(rows)}
+
+
+@router.get('')
+async def get_usage(
+    start: date,
+    end: date,
+    app_name: Optional[str] = None,
+    user_id: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Usage between `start` and `end` (inclusive) for the current user or, for parents, a linked child.
+
+    Results are per day for short ranges, per week or per month for longer ones.
+    """
+    if end < start:
+        raise HTTPException(status_code=400, detail='end must not be before start')
+    if (end - start).days + 1 > USAGE_QUERY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f'range may cover at most {USAGE_QUERY_MAX_DAYS} days')
+
+    if user_id and user_id != current_user.id:
+        if current_user.role != 'parent':
+            raise HTTPException(status_code=403, detail='Only parents can view other users\' usage')
+        result = await db.execute(select(User.id).where(User.id == user_id, User.parent_id == current_user.id))
+        if result.scalar() is None:
+            raise HTTPException(status_code=404, detail='Child not found')
+    else:
+        user_id = current_user.id
+
+    return await usage_series(db, user_id, start, end, app_name)
@@ -0,0 +1,266 @@
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import ValidationError
+from sqlalchemy import Select, bindparam, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.pagination import keyset_page, page_response
+from auth.security import get_current_user
+from auth.token_cache import Principal
+from db.replicas import get_read_db
+from db.session import get_db
+from models.models import (
+    Goal, Transaction, TransactionStatus, TransactionType, Violation, ViolationType, WalletLedger, WalletStatus
+)
+from schemas.schemas import ViolationEvent, violation_list_adapter
+from services.penalty_rules import PENALTY_SETTLEMENT, penalty_fraction
+
+router = APIRouter()
+
+# Upper bound on events accepted in one request (devices split larger backlogs)
+VIOLATION_BATCH_MAX = int(os.getenv('VIOLATION_BATCH_MAX', '10000'))
+# Upper bound on rows returned by one list request
+LIST_LIMIT_MAX = int(os.getenv('LIST_LIMIT_MAX', '10000'))
+
+
+async def read_violation_events(request: Request) -> List[ViolationEvent]:
+    """Parse the request body as a JSON array or, for application/x-ndjson, one event per line.
+
+    Events without a timestamp get the time the batch was received.
+    """
+    too_large = HTTPException(status_code=413, detail=f'at most {VIOLATION_BATCH_MAX} violations per batch')
+    try:
+        if 'ndjson' in request.headers.get('content-type', ''):
+            events = []
+            buffer = b''
+            async for chunk in request.stream():
+                buffer += chunk
+                *lines, buffer = buffer.split(b'\n')
+                events.extend(ViolationEvent(**json.loads(line)) for line in lines if line.strip())
+                # stop reading here: the rest of the body (and any partial line) is never parsed
+                if len(events) > VIOLATION_BATCH_MAX:
+                    raise too_large
+            if buffer.strip():
+                events.append(ViolationEvent(**json.loads(buffer)))
+        else:
+            body = await request.json()
+            if not isinstance(body, list):
+                raise ValueError('expected a JSON array of violations')
+            events = [ViolationEvent(**item) for item in body]
+    except (ValueError, TypeError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f'invalid violation batch: {str(e)}')
+    if len(events) > VIOLATION_BATCH_MAX:
+        raise too_large
+    received_at = datetime.utcnow()
+    for event in events:
+        if event.event_type not in ViolationType.__members__:
+            raise HTTPException(status_code=400, detail=f'invalid event_type: {event.event_type}')
+        # store naive UTC like the rest of the schema
+        if event.timestamp is None:
+            event.timestamp = received_at
+        elif event.timestamp.tzinfo is not None:
+            event.timestamp = event.timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return events
+
+
+@router.post('/batch')
+async def ingest_violation_batch(
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Record a burst of violations reported by the current user's device.
+
+    Body: JSON array or NDJSON stream of {"client_event_id", "goal_id", "app_name",
+    "used_minutes", "limit_minutes", "timestamp"?}. Warning numbers are assigned in
+    timestamp order per goal (events without one count as received now), and warnings/penalties follow services.penalty_rules
+    (unless PENALTY_SETTLEMENT=nightly defers them to the penalty engine). Everything happens in one transaction
+    with bulk inserts and one UPDATE per wallet. Events already recorded (same
+    client_event_id) are skipped, so re-sending a batch is safe.
+    """
+    events = await read_violation_events(request)
+
+    # drop duplicates inside the batch, keeping the first occurrence
+    unique = {}
+    for event in events:
+        unique.setdefault(event.client_event_id, event)
+    events = list(unique.values())
+    if not events:
+        return {'received': 0, 'inserted': 0, 'duplicates': 0, 'warnings': 0, 'penalty_total': 0}
+
+    # Lock the goals (in id order, to avoid deadlocks) so concurrent batches for the same
+    # goal serialise and warning numbers stay sequential.
+    goal_ids = sorted({e.goal_id for e in events})
+    result = await db.execute(
+        select(Goal)
+        .where(Goal.id.in_(goal_ids), Goal.user_id == current_user.id)
+        .order_by(Goal.id)
+        .with_for_update()
+    )
+    goals = {g.id: g for g in result.scalars().all()}
+    missing = [gid for gid in goal_ids if gid not in goals]
+    if missing:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail=f'unknown goals: {", ".join(missing)}')
+
+    result = await db.execute(
+        select(Violation.client_event_id).where(
+            Violation.user_id == current_user.id,
+            Violation.client_event_id.in_(list(unique))
+        )
+    )
+    seen = set(result.scalars().all())
+    new_events = sorted(
+        (e for e in events if e.client_event_id not in seen),
+        key=lambda e: e.timestamp
+    )
+    if not new_events:
+        await db.rollback()
+        return {'received': len(events), 'inserted': 0, 'duplicates': len(events), 'warnings': 0, 'penalty_total': 0}
+
+    result = await db.execute(
+        select(Violation.goal_id, func.count(Violation.id))
+        .where(Violation.goal_id.in_(goal_ids))
+        .group_by(Violation.goal_id)
+    )
+    counts = dict(result.all())
+
+    result = await db.execute(
+        select(WalletLedger)
+        .where(WalletLedger.goal_id.in_(goal_ids), WalletLedger.status == WalletStatus.active)
+        .order_by(WalletLedger.id)
+        .with_for_update()
+    )
+    wallets = {w.goal_id: w for w in result.scalars().all()}
+    balances = {w.id: w.current_balance for w in wallets.values()}
+
+    settle = PENALTY_SETTLEMENT != 'nightly'
+    now = datetime.utcnow()
+    violation_rows = []
+    transaction_rows = []
+    wallet_penalty = defaultdict(int)
+    wallet_warnings = defaultdict(int)
+    for event in new_events:
+        goal = goals[event.goal_id]
+        wallet = wallets.get(event.goal_id)
+        warning_number = counts.get(goal.id, 0) + 1
+        counts[goal.id] = warning_number
+
+        event_type = ViolationType(event.event_type)
+
+        penalty = 0
+        fraction = 0.0
+        if settle and wallet is not None:
+            fraction = penalty_fraction(
+                event_type, warning_number, goal.max_warnings, goal.penalty_percent, wallet.deposit_amount
+            )
+            balance = balances[wallet.id]
+            # amounts are integer paise; round deductions down
+            penalty = min(int(balance * fraction), balance)
+            balances[wallet.id] = balance - penalty
+        if penalty > 0:
+            wallet_penalty[wallet.id] += penalty
+            transaction_rows.append({
+                'user_id': current_user.id,
+                'goal_id': goal.id,
+                'wallet_id': wallet.id,
+                'type': TransactionType.penalty,
+                'amount': penalty,
+                'status': TransactionStatus.success,
+                'timestamp': now,
+            })
+        elif settle and wallet is not None and fraction == 0:
+            wallet_warnings[wallet.id] += 1
+
+        violation_rows.append({
+            'user_id': current_user.id,
+            'goal_id': goal.id,
+            'app_name': event.app_name,
+            'used_minutes': event.used_minutes,
+            'limit_minutes': event.limit_minutes,
+            'warning_number': warning_number,
+            'penalty_applied': penalty > 0,
+            'penalty_amount': penalty,
+            'event_type': event_type,
+            'timestamp': event.timestamp,
+            'settled_at': now if settle else None,
+            'client_event_id': event.client_event_id,
+        })
+
+    await db.execute(insert(Violation), violation_rows)
+    if transaction_rows:
+        await db.execute(insert(Transaction), transaction_rows)
+
+    wallet_updates = [
+        {
+            'wallet_id': wallet_id,
+            'penalty': wallet_penalty.get(wallet_id, 0),
+            'warnings': wallet_warnings.get(wallet_id, 0),
+        }
+        for wallet_id in set(wallet_penalty) | set(wallet_warnings)
+    ]
+    if wallet_updates:
+        wallet_table = WalletLedger.__table__
+        await db.execute(
+            update(wallet_table)
+            .where(wallet_table.c.id == bindparam('wallet_id'))
+            .values(
+                current_balance=wallet_table.c.current_balance - bindparam('penalty'),
+                total_penalty=func.coalesce(wallet_table.c.total_penalty, 0) + bindparam('penalty'),
+                total_warnings=func.coalesce(wallet_table.c.total_warnings, 0) + bindparam('warnings'),
+            ),
+            wallet_updates
+        )
+    await db.commit()
+
+    return {
+        'received': len(events),
+        'inserted': len(violation_rows),
+        'duplicates': len(events) - len(violation_rows),
+        'warnings': sum(wallet_warnings.values()),
+        'penalty_total': sum(wallet_penalty.values()),
+    }
+
+
+def violation_history(
+    user_id: str,
+    goal_id: Optional[str] = None,
+    event_type: Optional[ViolationType] = None,
+    status: Optional[str] = None,
+) -> Select:
+    stmt = select(Violation).where(Violation.user_id == user_id)
+    if goal_id:
+        stmt = stmt.where(Violation.goal_id == goal_id)
+    if event_type:
+        stmt = stmt.where(Violation.event_type == event_type)
+    if status == 'settled':
+        stmt = stmt.where(Violation.settled_at.is_not(None))
+    elif status == 'pending':
+        stmt = stmt.where(Violation.settled_at.is_(None))
+    return stmt
+
+
+@router.get('')
+async def list_violations(
+    goal_id: Optional[str] = None,
+    event_type: Optional[ViolationType] = Query(None, alias='type'),
+    status: Optional[Literal['settled', 'pending']] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=LIST_LIMIT_MAX),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """The current user's violations, newest first, optionally for one goal.
+
+    `status` is settled (warnings/penalties applied) or pending (waiting for the nightly
+    penalty engine). Returns {"items": [...], "next_cursor": ...}; pass next_cursor back
+    as `cursor` for the following page.
+    """
+    stmt = keyset_page(violation_history(current_user.id, goal_id, event_type, status), Violation, cursor, limit)
+    result = await db.execute(stmt)
+    return page_response(violation_list_adapter, result.scalars().all(), limit)
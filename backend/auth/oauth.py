@@ -1,27 +1,165 @@
+import asyncio
+import logging
 import os
-from google.oauth2 import id_token
-from google.auth.transport import requests
-from dotenv import load_dotenv
+import re
+import time
+from typing import Optional
+
+import httpx
+from jose import jwt, JWTError
+
+from config import load_env
+
+from services.metrics import GOOGLE_JWKS_FETCH_SECONDS, GOOGLE_VERIFY_INVALID, GOOGLE_VERIFY_OK
 
 # Load env from backend/.env
-load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+load_env()
 
 # Keep only Android (mobile) flow: we only need the Google client ID to verify id_tokens
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
 
+# Google's signing keys for id_tokens, published as a JWKS document
+GOOGLE_CERTS_URL = os.getenv('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v3/certs')
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+# Allowed clock skew (seconds) when checking exp/iat
+GOOGLE_CLOCK_SKEW_SECONDS = int(os.getenv('GOOGLE_CLOCK_SKEW_SECONDS', '60'))
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class GoogleKeyCache:
+    """In-process cache of Google's public signing keys, keyed by `kid`.
+
+    Keys are kept for the Cache-Control max-age Google sends with them. A background task
+    (started from `main.on_startup`) refreshes them shortly before they expire, so token
+    verification normally never waits on the network. A cold or stale cache is filled on
+    first use, and an unknown `kid` forces a refetch in case Google rotated its keys.
+    """
+
+    def __init__(
+        self,
+        certs_url: str = GOOGLE_CERTS_URL,
+        default_max_age: int = 3600,
+        refresh_margin: int = 300,
+        min_refetch_seconds: int = 30,
+    ):
+        self.certs_url = certs_url
+        self.default_max_age = default_max_age
+        self.refresh_margin = refresh_margin
+        self.min_refetch_seconds = min_refetch_seconds
+        self._keys: dict = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_fresh(self) -> bool:
+        return bool(self._keys) and time.monotonic() < self._expires_at
+
+    def load_jwks(self, jwks: dict, max_age: Optional[int] = None) -> None:
+        """Replace the cached keys with the ones in a JWKS document."""
+        now = time.monotonic()
+        self._keys = {k['kid']: k for k in jwks.get('keys', []) if 'kid' in k}
+        self._fetched_at = now
+        self._expires_at = now + (self.default_max_age if max_age is None else max_age)
+
+    async def _fetch(self) -> int:
+        with GOOGLE_JWKS_FETCH_SECONDS.time():
+            async with httpx.AsyncClient(timeout=10) as client:
+                resp = await client.get(self.certs_url)
+                resp.raise_for_status()
+        match = _MAX_AGE_RE.search(resp.headers.get('cache-control', ''))
+        max_age = int(match.group(1)) if match else self.default_max_age
+        self.load_jwks(resp.json(), max_age)
+        return max_age
+
+    async def refresh(self) -> int:
+        """Fetch the current keys from Google; returns the max-age they are valid for."""
+        async with self._lock:
+            return await self._fetch()
+
+    async def get_key(self, kid: Optional[str]) -> Optional[dict]:
+        key = self._keys.get(kid)
+        if key is not None and self.is_fresh:
+            return key
+        async with self._lock:
+            # another request may have refreshed the keys while we waited for the lock
+            key = self._keys.get(kid)
+            if key is not None and self.is_fresh:
+                return key
+            # unknown kid on a fresh cache: refetch, but never more often than min_refetch_seconds
+            if not self.is_fresh or time.monotonic() - self._fetched_at >= self.min_refetch_seconds:
+                await self._fetch()
+            return self._keys.get(kid)
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                max_age = await self.refresh()
+                delay = max(max_age - self.refresh_margin, self.min_refetch_seconds)
+            except Exception:
+                logger.warning('Google signing key refresh failed', exc_info=True)
+                delay = self.min_refetch_seconds
+            await asyncio.sleep(delay)
 
-def verify_google_token(token_string: str) -> dict:
-    """Verify a Google id_token and return the claims."""
+    def start(self):
+        """Start refreshing keys in the background (requires a running event loop)."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+google_keys = GoogleKeyCache()
+
+
+async def verify_google_token(token_string: str) -> dict:
+    """Verify a Google id_token against the cached signing keys and return the claims.
+
+    Signature, audience, expiry and issuer are all checked locally; the network is only
+    used when the key cache is cold or stale. Raises ValueError if the token is invalid.
+    """
+    started = time.perf_counter()
+    try:
+        claims = await _verify_google_token(token_string)
+    except Exception:
+        GOOGLE_VERIFY_INVALID.observe(time.perf_counter() - started)
+        raise
+    GOOGLE_VERIFY_OK.observe(time.perf_counter() - started)
+    return claims
+
+
+async def _verify_google_token(token_string: str) -> dict:
     try:
-        # Verify the token using Google's official library
-        idinfo = id_token.verify_oauth2_token(
-            token_string, 
-            requests.Request(), 
-            GOOGLE_CLIENT_ID
+        header = jwt.get_unverified_header(token_string)
+    except JWTError as e:
+        raise ValueError(f"Invalid token: {str(e)}")
+
+    key = await google_keys.get_key(header.get('kid'))
+    if key is None:
+        raise ValueError("Invalid token: unknown signing key")
+
+    try:
+        claims = jwt.decode(
+            token_string,
+            key,
+            algorithms=['RS256'],
+            audience=GOOGLE_CLIENT_ID,
+            options={'leeway': GOOGLE_CLOCK_SKEW_SECONDS},
         )
-        
-        # Token is valid, return the claims
-        return idinfo
-    except Exception as e:
-        print(f"Token verification error: {e}")
+    except JWTError as e:
         raise ValueError(f"Invalid token: {str(e)}")
+
+    if claims.get('iss') not in GOOGLE_ISSUERS:
+        raise ValueError("Invalid token: wrong issuer")
+    return claims
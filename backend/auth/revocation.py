@@ -0,0 +1,131 @@
+import asyncio
+import logging
+from typing import Iterable, Optional
+
+import asyncpg
+
+from db.session import DATABASE_DIRECT_URL, to_async_url
+from auth.token_cache import token_cache
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel on which token_exchange announces a parent's new session token
+REVOCATION_CHANNEL = 'session_revocations'
+# How often the listener pings its connection so a dead link is noticed quickly
+LISTENER_KEEPALIVE_SECONDS = 30
+LISTENER_RETRY_SECONDS = 5
+
+
+class RevocationTable:
+    """Current session token per parent account, fed by Postgres LISTEN/NOTIFY.
+
+    Tokens are stored as raw bytes (they are hex strings) to keep the table compact.
+    Until the listener has (re)built the table from the DB it is not `ready` and every
+    lookup reports the session as unknown, so callers fall back to reading the row.
+    """
+
+    def __init__(self):
+        self._current: dict = {}
+        self.ready = False
+
+    def set(self, user_id: str, session_token: str) -> None:
+        self._current[user_id] = bytes.fromhex(session_token)
+
+    def replace(self, rows: Iterable) -> None:
+        self._current = {user_id: bytes.fromhex(token) for user_id, token in rows}
+
+    def is_current(self, user_id: str, session_token: Optional[str]) -> bool:
+        if not self.ready or not session_token:
+            return False
+        current = self._current.get(user_id)
+        return current is not None and current == bytes.fromhex(session_token)
+
+
+session_revocations = RevocationTable()
+
+
+def encode_revocation(user_id: str, session_token: str) -> str:
+    return f"{user_id}:{session_token}"
+
+
+class RevocationListener:
+    """Background task that keeps a RevocationTable in sync across workers.
+
+    On every (re)connect it LISTENs first and then reloads all parent session tokens,
+    so nothing published while the connection was down is missed. Notifications that
+    arrive during the reload are applied after it.
+    """
+
+    def __init__(self, table: RevocationTable, dsn: str = DATABASE_DIRECT_URL):
+        url, self._connect_args = to_async_url(dsn)
+        self._dsn = url.set(drivername='postgresql').render_as_string(hide_password=False)
+        self.table = table
+        self._pending: Optional[list] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            user_id, session_token = payload.split(':', 1)
+        except ValueError:
+            return
+        if self._pending is not None:
+            self._pending.append((user_id, session_token))
+            return
+        self._apply(user_id, session_token)
+
+    def _apply(self, user_id: str, session_token: str) -> None:
+        self.table.set(user_id, session_token)
+        token_cache.invalidate_user(user_id)
+
+    async def _listen_once(self):
+        conn = await asyncpg.connect(self._dsn, **self._connect_args)
+        try:
+            self._pending = []
+            await conn.add_listener(REVOCATION_CHANNEL, self._on_notify)
+            rows = await conn.fetch(
+                "SELECT id, session_token FROM users WHERE role = 'parent' AND session_token IS NOT NULL"
+            )
+            self.table.replace((r['id'], r['session_token']) for r in rows)
+            pending, self._pending = self._pending, None
+            for user_id, session_token in pending:
+                self._apply(user_id, session_token)
+            # cached principals may predate anything we missed while disconnected
+            token_cache.clear()
+            self.table.ready = True
+            logger.info('session revocation listener ready', extra={'parent_sessions': len(rows)})
+            while True:
+                await asyncio.sleep(LISTENER_KEEPALIVE_SECONDS)
+                await conn.execute('SELECT 1')
+        finally:
+            self.table.ready = False
+            self._pending = None
+            try:
+                await conn.close(timeout=5)
+            except Exception:
+                conn.terminate()
+
+    async def _run(self):
+        while True:
+            try:
+                await self._listen_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning('session revocation listener disconnected', extra={'error': f'{type(e).__name__}: {e}'})
+            await asyncio.sleep(LISTENER_RETRY_SECONDS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+revocation_listener = RevocationListener(session_revocations)
@@ -1,21 +1,29 @@
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import JSONResponse
 from auth import security
 from db.session import get_db
-from sqlalchemy.orm import Session
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.models import User
-from google.auth.transport import requests as google_requests
-from google.oauth2 import id_token
-import os
+from auth.oauth import verify_google_token
+from auth.token_cache import token_cache
+from api.rate_limit import rate_limit
+from api.response_cache import response_cache
+from auth.revocation import REVOCATION_CHANNEL, encode_revocation, session_revocations
+from db.replicas import mark_written
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
+# per-login debug events are sampled; they would otherwise dominate the log under load
+LOGIN_DEBUG_SAMPLE_RATE = 0.01
 
-# Get Google Client ID from environment
-GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
+router = APIRouter()
 
 
-@router.post('/token')
-async def token_exchange(payload: dict, db: Session = Depends(get_db)):
+# every call costs an RSA verification (and a key fetch on a cold cache) before any DB work
+@router.post('/token', dependencies=[Depends(rate_limit('login_ip', '20/60'))])
+async def token_exchange(payload: dict, db: AsyncSession = Depends(get_db)):
     """Accepts a Google id_token (from Android mobile) and returns our JWT.
     payload: {"id_token": "...", "role": "individual|parent|child"}
     """
@@ -28,21 +36,14 @@ async def token_exchange(payload: dict, db: Session = Depends(get_db)):
     if user_role not in ['individual', 'parent', 'child']:
         raise HTTPException(status_code=400, detail='invalid role. Must be individual, parent, or child')
 
-    # Verify id_token using Google's official library
+    # Verify id_token locally against Google's cached signing keys (no network hop when warm)
     try:
-        print(f"Attempting to verify id_token with CLIENT_ID: {GOOGLE_CLIENT_ID}")
-        # Verify the token
-        claims = id_token.verify_oauth2_token(
-            token_string, 
-            google_requests.Request(), 
-            GOOGLE_CLIENT_ID
-        )
-        print(f"Token verified successfully! Claims: {claims}")
+        claims = await verify_google_token(token_string)
     except ValueError as e:
-        print(f"Token verification failed: {str(e)}")
+        logger.info('id_token rejected', extra={'reason': str(e)})
         raise HTTPException(status_code=400, detail=f'invalid id_token: {str(e)}')
     except Exception as e:
-        print(f"Unexpected error: {type(e).__name__}: {str(e)}")
+        logger.exception('id_token verification error')
         raise HTTPException(status_code=400, detail=f'token verification error: {str(e)}')
 
     email = claims.get('email')
@@ -50,11 +51,11 @@ async def token_exchange(payload: dict, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail='email not present in token')
 
     # Check if user exists
-    user = db.query(User).filter(User.email == email).first()
+    result = await db.execute(select(User).where(User.email == email))
+    user = result.scalars().first()
     
     if not user:
         # New user - create account with requested role
-        print(f"Creating new user: {email} with role: {user_role}")
         user = User(
             email=email, 
             name=claims.get('name'), 
@@ -62,31 +63,48 @@ async def token_exchange(payload: dict, db: Session = Depends(get_db)):
             role=user_role
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
+        logger.info('user created', extra={'user_id': user.id, 'role': user_role})
+        # the new account's first reads must not go to a replica that hasn't seen it yet
+        mark_written(user.id)
     else:
         # Existing user - verify they're not trying to use same account for different role
         if user.role != user_role:
-            print(f"User {email} tried to sign in as {user_role} but is already registered as {user.role}")
+            logger.info('sign-in with wrong role', extra={
+                'user_id': user.id, 'role': user.role, 'requested_role': user_role,
+            })
             raise HTTPException(
                 status_code=403, 
                 detail=f'This Google account is already registered as {user.role}. Please use a different account for {user_role} role.'
             )
-        print(f"User already exists: {email} with role: {user.role}")
+        logger.debug('existing user signed in', extra={'user_id': user.id, 'sample_rate': LOGIN_DEBUG_SAMPLE_RATE})
 
     # For parent accounts: enforce single device session
     if user.role == 'parent':
         # Generate new session token and invalidate previous sessions
         new_session_token = security.create_session_token()
         user.session_token = new_session_token
-        db.commit()
-        db.refresh(user)
-        print(f"Parent {user.id} logged in - new session token generated, old sessions invalidated")
+        # NOTIFY is delivered on commit, so every worker drops the old session together
+        await db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {'channel': REVOCATION_CHANNEL, 'payload': encode_revocation(user.id, new_session_token)}
+        )
+        await db.commit()
+        await db.refresh(user)
+        # tokens carrying the old session_token must not be served from the cache
+        session_revocations.set(user.id, new_session_token)
+        token_cache.invalidate_user(user.id)
+        logger.info('parent session rotated', extra={'user_id': user.id})
+        mark_written(user.id)
+
+    # profile responses cached for this user (and the family views showing them) are stale
+    response_cache.invalidate_user(user.id, user.parent_id)
 
     # Create JWT token - include session_token for parents to enforce single device access
     token = security.create_access_token(
         user.id, 
         session_token=user.session_token if user.role == 'parent' else None
     )
-    print(f"Successfully created JWT for user {user.id}")
+    logger.debug('access token issued', extra={'user_id': user.id, 'sample_rate': LOGIN_DEBUG_SAMPLE_RATE})
     return JSONResponse({'access_token': token, 'token_type': 'bearer'})
@@ -1,17 +1,20 @@
 import hashlib
 import os
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import jwt, JWTError
 
 # Config via env
-from dotenv import load_dotenv
-load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+from config import load_env
+load_env()
 
 JWT_SECRET = os.getenv('JWT_SECRET', 'change-me')
 JWT_ALGORITHM = os.getenv('JWT_ALGORITHM', 'HS256')
 # Idle timeout in seconds; default 2 days
 JWT_IDLE_SECONDS = int(os.getenv('JWT_IDLE_SECONDS', str(2 * 24 * 3600)))
+# Share of the idle window that must pass before get_current_user re-signs a token
+JWT_REFRESH_FRACTION = float(os.getenv('JWT_REFRESH_FRACTION', '0.1'))
 
 
 def hash_password_sha256(password: str, salt: Optional[str] = None) -> str:
@@ -72,9 +75,13 @@ def verify_access_token(token: str) -> Optional[dict]:
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi import Response
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from db.session import get_db
 from models.models import User
+from auth.token_cache import Principal, token_cache
+from auth.revocation import session_revocations
+from db.replicas import bind_user
 
 http_bearer = HTTPBearer(auto_error=False)
 
@@ -82,40 +89,64 @@ http_bearer = HTTPBearer(auto_error=False)
 async def get_current_user(
     response: Response, 
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(http_bearer),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
     """Dependency to extract user from Bearer token, verify it, and refresh token expiry.
 
-    Sets header 'X-Access-Token' with a refreshed token. If token is missing/invalid raises 401.
-    Returns the User object from database.
+    Verified tokens are cached (see auth.token_cache), so hot clients skip both the JWT
+    decode and the User lookup. Sets header 'X-Access-Token' with a refreshed token once
+    JWT_REFRESH_FRACTION of the idle window has passed. If token is missing/invalid raises 401.
+    Returns a Principal snapshot of the user.
     
     For parent accounts: Also validates session token to ensure single device access.
     """
     if not credentials or not credentials.credentials:
         raise HTTPException(status_code=401, detail="Not authenticated")
     token = credentials.credentials
-    payload = verify_access_token(token)
-    if not payload:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    user_id = payload.get('sub')
-    
-    # Fetch user from database
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
-    
-    # For parent accounts: Validate session token to enforce single device access
-    # The session token is embedded in the JWT payload during login
-    if user.role == 'parent':
-        session_token_from_jwt = payload.get('session_token')
-        if not session_token_from_jwt or session_token_from_jwt != user.session_token:
-            raise HTTPException(
-                status_code=401, 
-                detail="Session expired. This account is logged in on another device."
-            )
+
+    cached = token_cache.get(token)
+    if cached is not None and cached[0].role == 'parent':
+        # A cached parent session is only trusted while the revocation table (fed by
+        # LISTEN/NOTIFY from every worker) agrees it is current; otherwise re-check the DB.
+        if not session_revocations.is_current(cached[0].id, cached[0].session_token):
+            cached = None
+    if cached is not None:
+        principal, issued_at = cached
+    else:
+        payload = verify_access_token(token)
+        if not payload:
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        user_id = payload.get('sub')
+        
+        # Fetch user from database
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalars().first()
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+        
+        # For parent accounts: Validate session token to enforce single device access
+        # The session token is embedded in the JWT payload during login
+        if user.role == 'parent':
+            session_token_from_jwt = payload.get('session_token')
+            if not session_token_from_jwt or session_token_from_jwt != user.session_token:
+                raise HTTPException(
+                    status_code=401, 
+                    detail="Session expired. This account is logged in on another device."
+                )
+
+        principal = Principal.from_user(user)
+        issued_at = payload.get('iat', 0)
+        token_cache.put(token, principal, issued_at, payload['exp'])
     
-    # create a new token with fresh idle window (and include session_token for parents)
-    new_token = create_access_token(user_id, session_token=user.session_token if user.role == 'parent' else None)
-    # set new token in response header so client can update
-    response.headers['X-Access-Token'] = new_token
-    return user
+    # Sliding window: only re-sign once enough of the idle window has passed, so most
+    # requests don't pay for a new signature. Include session_token for parents.
+    if time.time() - issued_at >= JWT_REFRESH_FRACTION * JWT_IDLE_SECONDS:
+        new_token = create_access_token(
+            principal.id,
+            session_token=principal.session_token if principal.role == 'parent' else None
+        )
+        # set new token in response header so client can update
+        response.headers['X-Access-Token'] = new_token
+    # read routing (db.replicas) keeps this user on the primary for a while after a write
+    bind_user(principal.id)
+    return principal
@@ -0,0 +1,121 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Tuple
+
+from models.models import RoleEnum
+
+# Bounded cache of verified access tokens so hot clients skip jwt.decode and the User lookup
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '10000'))
+# How long a cached principal may be served before the token is re-verified against the DB
+TOKEN_CACHE_TTL_SECONDS = int(os.getenv('TOKEN_CACHE_TTL_SECONDS', '60'))
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Snapshot of the authenticated user's row, safe to share across requests.
+
+    Handlers that need to modify the user must load the `User` row themselves.
+    """
+    id: str
+    email: str
+    name: Optional[str]
+    picture: Optional[str]
+    role: RoleEnum
+    parent_id: Optional[str]
+    session_token: Optional[str]
+    updated_at: Optional[datetime] = None
+
+    @classmethod
+    def from_user(cls, user) -> 'Principal':
+        return cls(
+            id=user.id,
+            email=user.email,
+            name=user.name,
+            picture=user.picture,
+            role=user.role,
+            parent_id=user.parent_id,
+            session_token=user.session_token,
+            updated_at=user.updated_at,
+        )
+
+
+class TokenCache:
+    """LRU cache of token -> (Principal, iat) with a per-entry TTL.
+
+    An entry never outlives the token's own `exp`. Entries for a user can be dropped
+    explicitly with `invalidate_user` (e.g. when a parent's session_token rotates).
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE, ttl_seconds: int = TOKEN_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        # token -> (principal, iat, expires_at)
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._by_user: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> Optional[Tuple[Principal, int]]:
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        principal, iat, expires_at = entry
+        if expires_at <= time.time():
+            self._remove(token)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return principal, iat
+
+    def peek_user_id(self, token: str) -> Optional[str]:
+        """User id of a cached, unexpired token, without counting a hit or touching LRU order."""
+        entry = self._entries.get(token)
+        if entry is None or entry[2] <= time.time():
+            return None
+        return entry[0].id
+
+    def put(self, token: str, principal: Principal, iat: int, exp: int) -> None:
+        if self.maxsize <= 0:
+            return
+        if token in self._entries:
+            self._remove(token)
+        self._entries[token] = (principal, iat, min(time.time() + self.ttl_seconds, exp))
+        self._by_user.setdefault(principal.id, set()).add(token)
+        while len(self._entries) > self.maxsize:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate_user(self, user_id: str) -> None:
+        for token in self._by_user.pop(user_id, ()):
+            self._entries.pop(token, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_user.clear()
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _remove(self, token: str) -> None:
+        principal, _, _ = self._entries.pop(token)
+        tokens = self._by_user.get(principal.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[principal.id]
+
+
+token_cache = TokenCache()
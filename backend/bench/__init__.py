@@ -0,0 +1,2 @@
+# Benchmarks; run from the backend folder, e.g. `python -m bench.serialization`
+# or `python -m bench.load --database-url <scratch db>`
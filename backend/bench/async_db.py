@@ -0,0 +1,141 @@
+"""
+Requests per second per worker with blocking vs awaited database calls.
+
+Serves the app in one uvicorn worker twice against the same scratch database and drives
+it with bench.load's scenarios each time:
+
+    blocking  get_db and get_read_db overridden with BlockingSession, which runs every
+              statement on a psycopg2 Session inside the coroutine. One slow round trip
+              stalls every request in the worker, as the sync `db.query(...)` calls in
+              `async def` handlers did before the handlers moved to AsyncSession.
+    async     the app as shipped: AsyncSession on asyncpg.
+
+Both runs use the same handlers and SQL, so the difference is the event loop being
+free (or not) while Postgres works. Each run gets a freshly seeded population, since
+verify-linking-code uses up the unlinked users. Run from the backend folder:
+
+    python -m bench.async_db --database-url postgresql://localhost/guilt_eater_bench \\
+        --concurrency 1 8 32 --requests 500
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import uuid
+from types import SimpleNamespace
+
+from bench.load import (
+    BENCH_CLIENT_ID, SCENARIOS, _serve, git_commit, make_signing_key, run_benchmark, seed, wait_until_up
+)
+
+MODES = ('blocking', 'async')
+
+# AsyncSession methods that are coroutines; the rest of its interface is synchronous
+_AWAITED = frozenset({'execute', 'scalar', 'scalars', 'get', 'commit', 'rollback', 'refresh', 'flush',
+                      'delete', 'merge', 'close'})
+
+
+class BlockingSession:
+    """AsyncSession's interface over a sync Session: every await blocks the event loop."""
+
+    def __init__(self, session):
+        self._session = session
+
+    def __getattr__(self, name):
+        attr = getattr(self._session, name)
+        if name not in _AWAITED:
+            return attr
+
+        async def call(*args, **kwargs):
+            return attr(*args, **kwargs)
+
+        return call
+
+
+def _serve_mode(port: int, env: dict, jwks: dict, mode: str):
+    """Child process: bench.load's server, with blocking sessions in blocking mode."""
+    os.environ.update(env)
+    if mode == 'blocking':
+        from sqlalchemy.orm import sessionmaker
+
+        import main
+        from db.replicas import get_read_db
+        from db.session import engine, get_db
+
+        # same session settings as AsyncSessionLocal
+        sessions = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+        async def blocking_db():
+            with sessions() as db:
+                yield BlockingSession(db)
+
+        main.app.dependency_overrides[get_db] = blocking_db
+        main.app.dependency_overrides[get_read_db] = blocking_db
+    _serve(port, env, jwks)
+
+
+def run_mode(args, mode: str, env: dict) -> list:
+    run_id = uuid.uuid4().hex[:8]
+    private_pem, jwks = make_signing_key()
+    population = seed(args, run_id)
+    print(f"{mode}: seeded run {run_id}: " + ', '.join(f'{len(v)} {k}' for k, v in population.items()))
+
+    base_url = f'http://127.0.0.1:{args.port}'
+    process = multiprocessing.get_context('spawn').Process(
+        target=_serve_mode, args=(args.port, env, jwks, mode), daemon=True
+    )
+    process.start()
+    try:
+        wait_until_up(base_url, process)
+        return asyncio.run(run_benchmark(args, base_url, private_pem, population))
+    finally:
+        process.terminate()
+        process.join(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench.async_db', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL'),
+                        help='scratch Postgres database (default: $BENCH_DATABASE_URL)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=500, help='requests per scenario and concurrency level')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=['me', 'my_children', 'verify_linking_code'])
+    parser.add_argument('--output', default=None, help='also write the results as JSON')
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('--database-url or BENCH_DATABASE_URL is required (use a scratch database)')
+    # bench.load's population, sized for one verify round per concurrency level and then some
+    population = SimpleNamespace(parents=50, children_per_parent=3, goals_per_child=2, violations_per_goal=20,
+                                 unlinked=max(1500, args.requests * len(args.concurrency)))
+    settings = SimpleNamespace(**vars(args), **vars(population))
+
+    env = {
+        'DATABASE_URL': args.database_url,
+        'GOOGLE_CLIENT_ID': BENCH_CLIENT_ID,
+        'SCHEDULER_ENABLED': 'false',
+    }
+    os.environ.update(env)
+    results = {mode: run_mode(settings, mode, env) for mode in MODES}
+
+    print(f"\n{'scenario':<22} {'c':>4} {'blocking rps':>13} {'async rps':>10} {'speedup':>8}")
+    rows = []
+    for before, after in zip(results['blocking'], results['async']):
+        speedup = round(after['rps'] / before['rps'], 2) if before['rps'] and after['rps'] else None
+        rows.append({'scenario': before['scenario'], 'concurrency': before['concurrency'],
+                     'blocking_rps': before['rps'], 'async_rps': after['rps'], 'speedup': speedup,
+                     'blocking_p95_ms': before['p95_ms'], 'async_p95_ms': after['p95_ms']})
+        print(f"{before['scenario']:<22} {before['concurrency']:>4} {before['rps'] or 0:>13} "
+              f"{after['rps'] or 0:>10} {speedup or 0:>7}x")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'git_commit': git_commit(), 'workers': 1, 'comparison': rows, 'runs': results}, f, indent=2)
+    errors = sum(r['errors'] for runs in results.values() for r in runs)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Memory benchmark for the streaming ledger export (GET /api/export/ledger).
+
+Seeds one user with a large history (generated server-side with generate_series, so a
+million rows take seconds), starts the app with uvicorn in a child process and
+downloads the export in every requested format, discarding the body as it arrives.
+The server's peak RSS (VmHWM from /proc, so Linux only) during each export is compared
+with its RSS after warm-up exports of a small user; the run fails if an export grew it
+by more than --max-growth-mb, i.e. if memory scaled with the size of the export.
+
+    python -m bench.export --database-url postgresql://localhost/guilt_eater_bench --rows 1000000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+
+from bench.load import git_commit, wait_until_up
+
+FORMATS = ('csv', 'ndjson', 'csv.gz')
+
+
+def _serve(port: int, env: dict):
+    os.environ.update(env)
+    import uvicorn
+
+    import main
+
+    uvicorn.run(main.app, host='127.0.0.1', port=port, log_level='warning')
+
+
+def seed(rows: int) -> str:
+    """A user with `rows` transactions and violations (half each); returns the user id."""
+    from sqlalchemy import insert, text
+
+    from db.migrate import upgrade
+    from db.session import SessionLocal
+    from models.models import Goal, GoalStatus, RoleEnum, User, gen_uuid
+
+    upgrade()
+    now = datetime.utcnow()
+    user_id, goal_id = gen_uuid(), gen_uuid()
+    params = {'user_id': user_id, 'goal_id': goal_id, 'start': now - timedelta(seconds=rows)}
+    with SessionLocal() as db:
+        db.execute(insert(User), [{'id': user_id, 'email': f'bench-export-{uuid.uuid4().hex[:8]}@example.com',
+                                   'name': 'Bench export', 'role': RoleEnum.individual,
+                                   'created_at': now, 'updated_at': now}])
+        db.execute(insert(Goal), [{'id': goal_id, 'user_id': user_id, 'app_name': 'com.bench.app',
+                                   'daily_limit_minutes': 60, 'start_date': now - timedelta(days=30),
+                                   'end_date': now + timedelta(days=30), 'max_warnings': 2,
+                                   'penalty_percent': 10.0, 'status': GoalStatus.active}])
+        db.execute(text("""
+            INSERT INTO transactions (id, user_id, goal_id, type, amount, status, timestamp)
+            SELECT md5(:user_id || 't' || g), :user_id, :goal_id, 'penalty', 100 + g % 900, 'success',
+                   CAST(:start AS TIMESTAMP) + g * interval '1 second'
+            FROM generate_series(1, :n) AS g
+        """), dict(params, n=rows // 2))
+        db.execute(text("""
+            INSERT INTO violations (id, user_id, goal_id, app_name, used_minutes, limit_minutes, warning_number,
+                                    penalty_applied, penalty_amount, event_type, timestamp, settled_at)
+            SELECT md5(:user_id || 'v' || g), :user_id, :goal_id, 'com.bench.app', 90, 60, g, true, 100,
+                   'limit_exceeded', CAST(:start AS TIMESTAMP) + g * interval '1 second', timezone('utc', now())
+            FROM generate_series(1, :n) AS g
+        """), dict(params, n=rows - rows // 2))
+        db.commit()
+    return user_id
+
+
+def memory_kb(pid: int) -> dict:
+    """Current (VmRSS) and peak (VmHWM) resident memory of a process, in kB."""
+    values = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'VmHWM'):
+                values[key] = int(value.split()[0])
+    return values
+
+
+def reset_peak(pid: int) -> None:
+    # writing 5 to clear_refs resets VmHWM to the current RSS (Linux 4.0+)
+    with open(f'/proc/{pid}/clear_refs', 'w') as f:
+        f.write('5')
+
+
+def download(client: httpx.Client, token: str, fmt: str) -> dict:
+    name, _, compress = fmt.partition('.')
+    params = {'format': name}
+    if compress:
+        params['compress'] = 'gzip'
+    started = time.perf_counter()
+    size = 0
+    with client.stream('GET', '/api/export/ledger', params=params,
+                       headers={'Authorization': f'Bearer {token}'}) as response:
+        response.raise_for_status()
+        for part in response.iter_raw():
+            size += len(part)
+    elapsed = time.perf_counter() - started
+    return {'bytes': size, 'seconds': round(elapsed, 2), 'mb_per_second': round(size / 1e6 / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench.export', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL'),
+                        help='scratch Postgres database (default: $BENCH_DATABASE_URL)')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--rows', type=int, default=1_000_000, help='transactions + violations to export')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(FORMATS))
+    parser.add_argument('--max-growth-mb', type=float, default=64.0,
+                        help='fail if an export raises peak RSS by more than this over the warm-up')
+    parser.add_argument('--output', default=None, help='also write the results as JSON')
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('--database-url or BENCH_DATABASE_URL is required (use a scratch database)')
+    if not os.path.exists('/proc/self/status'):
+        parser.error('needs /proc (Linux) to read the server RSS')
+
+    env = {'DATABASE_URL': args.database_url, 'SCHEDULER_ENABLED': 'false'}
+    os.environ.update(env)
+    user_id = seed(args.rows)
+    small_user_id = seed(100)
+    print(f'Seeded {args.rows} rows for user {user_id}')
+    from auth.security import create_access_token
+    token, small_token = create_access_token(user_id), create_access_token(small_user_id)
+
+    base_url = f'http://127.0.0.1:{args.port}'
+    process = multiprocessing.get_context('spawn').Process(target=_serve, args=(args.port, env), daemon=True)
+    process.start()
+    results = {}
+    failed = False
+    try:
+        wait_until_up(base_url, process)
+        with httpx.Client(base_url=base_url, timeout=None) as client:
+            # warm-up on a small export: imports, pools and caches settle before the baseline
+            for fmt in args.formats:
+                download(client, small_token, fmt)
+            baseline = memory_kb(process.pid)['VmRSS']
+            for fmt in args.formats:
+                reset_peak(process.pid)
+                result = download(client, token, fmt)
+                peak = memory_kb(process.pid)['VmHWM']
+                result.update(baseline_rss_mb=round(baseline / 1024, 1), peak_rss_mb=round(peak / 1024, 1),
+                              growth_mb=round((peak - baseline) / 1024, 1))
+                results[fmt] = result
+                ok = result['growth_mb'] <= args.max_growth_mb
+                failed = failed or not ok
+                print(f"{fmt:<7} {result['bytes'] / 1e6:>9.1f} MB in {result['seconds']:>6} s  "
+                      f"peak RSS {result['peak_rss_mb']} MB (+{result['growth_mb']} MB){'' if ok else '  FAIL'}")
+    finally:
+        process.terminate()
+        process.join(10)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'git_commit': git_commit(), 'rows': args.rows, 'max_growth_mb': args.max_growth_mb,
+                       'results': results}, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Cold- versus warm-cache benchmark of Google id_token verification (auth/oauth.py), the
+step of POST /auth/token that used to call Google on every login.
+
+Runs against the local JWKS stand-in (testing/google_jwks.py), which answers after
+--latency-ms to stand in for the round trip to Google. Cold: every login meets an empty
+GoogleKeyCache, as the first login after a worker starts does (and as every login did
+before the cache). Warm: logins share one cache, as they do once it is filled and kept
+fresh by the background refresh. The rest of /auth/token (the user upsert) costs the
+same either way; bench.load measures it end to end with a warm cache.
+
+    python -m bench.google_keys --logins 200 --latency-ms 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from bench.load import git_commit, percentile
+
+CLIENT_ID = 'bench-client.apps.googleusercontent.com'
+
+
+async def measure(server, logins: int, cold: bool) -> dict:
+    from auth import oauth
+
+    tokens = [server.mint_id_token(f'bench-{i}@example.com', CLIENT_ID) for i in range(logins)]
+    oauth.GOOGLE_CLIENT_ID = CLIENT_ID
+    oauth.google_keys = oauth.GoogleKeyCache(certs_url=server.url)
+    if not cold:
+        await oauth.google_keys.refresh()
+    requests_before = server.requests
+    latencies = []
+    for token in tokens:
+        if cold:
+            oauth.google_keys = oauth.GoogleKeyCache(certs_url=server.url)
+        started = time.perf_counter()
+        await oauth.verify_google_token(token)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        'cache': 'cold' if cold else 'warm',
+        'logins': logins,
+        'jwks_fetches': server.requests - requests_before,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench.google_keys', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--logins', type=int, default=200, help='id_tokens verified per cache state')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='simulated round trip to Google')
+    parser.add_argument('--output', default=None, help='also write the results as JSON')
+    args = parser.parse_args()
+
+    # auth.oauth registers the app's metrics collector, which imports db.session; nothing connects
+    os.environ.setdefault('DATABASE_URL', 'postgresql+psycopg2://localhost/unused')
+    from testing.google_jwks import JWKSServer
+
+    results = []
+    with JWKSServer(latency=args.latency_ms / 1000) as server:
+        for cold in (True, False):
+            result = asyncio.run(measure(server, args.logins, cold))
+            results.append(result)
+            print(f"{result['cache']:<5} {result['logins']} logins  mean {result['mean_ms']:>8} ms  "
+                  f"p50 {result['p50_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  JWKS fetches {result['jwks_fetches']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'git_commit': git_commit(), 'latency_ms': args.latency_ms, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Ingestion benchmark for POST /api/violations/batch, with an idempotency check.
+
+Seeds --users users, each with one active goal and a funded wallet, starts the app with
+uvicorn in a child process and posts --events violations (100k by default) spread over
+the users in batches of --batch-size from --concurrency clients, printing events per
+second and per-batch latency. Every batch is then sent a second time, as a client whose
+acknowledgement was lost would: the replay must insert nothing and charge nothing, so
+the users' violation and transaction counts and wallet balances must be exactly what
+the first pass left. The run fails otherwise.
+
+    python -m bench.ingest --database-url postgresql://localhost/guilt_eater_bench \\
+        --events 100000 --batch-size 1000 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+
+from bench.load import git_commit, percentile, wait_until_up
+
+
+def _serve(port: int, env: dict):
+    os.environ.update(env)
+    import uvicorn
+
+    import main
+
+    uvicorn.run(main.app, host='127.0.0.1', port=port, log_level='warning')
+
+
+def seed(users: int, balance: int) -> list:
+    """`users` users with one active goal and wallet each; returns (user_id, goal_id) pairs."""
+    from sqlalchemy import insert
+
+    from db.migrate import upgrade
+    from db.session import SessionLocal
+    from models.models import Goal, GoalStatus, RoleEnum, User, WalletLedger, gen_uuid
+
+    upgrade()
+    now = datetime.utcnow()
+    run_id = uuid.uuid4().hex[:8]
+    pairs = [(gen_uuid(), gen_uuid()) for _ in range(users)]
+    with SessionLocal() as db:
+        db.execute(insert(User), [{'id': user_id, 'email': f'bench-ingest-{run_id}-{i}@example.com',
+                                   'name': f'Bench ingest {i}', 'role': RoleEnum.individual,
+                                   'created_at': now, 'updated_at': now}
+                                  for i, (user_id, _) in enumerate(pairs)])
+        db.execute(insert(Goal), [{'id': goal_id, 'user_id': user_id, 'app_name': 'com.bench.app',
+                                   'daily_limit_minutes': 60, 'start_date': now - timedelta(days=1),
+                                   'end_date': now + timedelta(days=30), 'max_warnings': 2,
+                                   'penalty_percent': 10.0, 'status': GoalStatus.active}
+                                  for user_id, goal_id in pairs])
+        db.execute(insert(WalletLedger), [{'id': gen_uuid(), 'user_id': user_id, 'goal_id': goal_id,
+                                           'deposit_amount': balance, 'current_balance': balance,
+                                           'total_penalty': 0, 'total_warnings': 0, 'created_at': now}
+                                          for user_id, goal_id in pairs])
+        db.commit()
+    return pairs
+
+
+def snapshot(user_ids: list) -> dict:
+    """Violations, transactions and wallet balance totals of the seeded users."""
+    from sqlalchemy import func, select
+
+    from db.session import SessionLocal
+    from models.models import Transaction, Violation, WalletLedger
+
+    with SessionLocal() as db:
+        return {
+            'violations': db.scalar(select(func.count()).select_from(Violation)
+                                    .where(Violation.user_id.in_(user_ids))),
+            'transactions': db.scalar(select(func.count()).select_from(Transaction)
+                                      .where(Transaction.user_id.in_(user_ids))),
+            'balance': int(db.scalar(select(func.coalesce(func.sum(WalletLedger.current_balance), 0))
+                                     .where(WalletLedger.user_id.in_(user_ids)))),
+            'total_penalty': int(db.scalar(select(func.coalesce(func.sum(WalletLedger.total_penalty), 0))
+                                           .where(WalletLedger.user_id.in_(user_ids)))),
+        }
+
+
+def make_batches(pairs: list, events: int, batch_size: int) -> list:
+    """(auth headers, events) per batch; each user's events are spread over its own batches."""
+    from auth.security import create_access_token
+
+    per_user, extra = divmod(events, len(pairs))
+    start = datetime.utcnow() - timedelta(seconds=per_user + 1)
+    batches = []
+    for n, (user_id, goal_id) in enumerate(pairs):
+        headers = {'Authorization': f'Bearer {create_access_token(user_id)}'}
+        count = per_user + (n < extra)
+        user_events = [{'client_event_id': f'{user_id}-{i}', 'goal_id': goal_id, 'app_name': 'com.bench.app',
+                        'used_minutes': 90, 'limit_minutes': 60,
+                        'timestamp': (start + timedelta(seconds=i)).isoformat()}
+                       for i in range(count)]
+        batches += [(headers, user_events[i:i + batch_size]) for i in range(0, len(user_events), batch_size)]
+    return batches
+
+
+async def send(base_url: str, batches: list, concurrency: int) -> dict:
+    """Post every batch with `concurrency` clients; sums the responses' counters."""
+    totals = {'received': 0, 'inserted': 0, 'duplicates': 0, 'penalty_total': 0}
+    latencies, errors = [], 0
+    queue = iter(batches)
+
+    async def worker(client):
+        nonlocal errors
+        for headers, events in queue:
+            started = time.perf_counter()
+            try:
+                resp = await client.post('/api/violations/batch', json=events, headers=headers)
+                resp.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            finally:
+                latencies.append(time.perf_counter() - started)
+            for key in totals:
+                totals[key] += resp.json()[key]
+
+    limits = httpx.Limits(max_connections=concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return dict(totals, batches=len(latencies), errors=errors, seconds=round(elapsed, 2),
+                events_per_second=round(totals['received'] / elapsed, 1),
+                mean_ms=round(statistics.fmean(latencies) * 1000, 2),
+                p50_ms=round(percentile(latencies, 0.50) * 1000, 2),
+                p95_ms=round(percentile(latencies, 0.95) * 1000, 2),
+                p99_ms=round(percentile(latencies, 0.99) * 1000, 2))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench.ingest', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL'),
+                        help='scratch Postgres database (default: $BENCH_DATABASE_URL)')
+    parser.add_argument('--port', type=int, default=8767)
+    parser.add_argument('--events', type=int, default=100_000, help='violations ingested in the first pass')
+    parser.add_argument('--users', type=int, default=100, help='users the events are spread over')
+    parser.add_argument('--batch-size', type=int, default=1000, help='events per request (VIOLATION_BATCH_MAX caps it)')
+    parser.add_argument('--concurrency', type=int, default=8, help='clients posting batches at once')
+    parser.add_argument('--balance', type=int, default=10_000_000, help='opening wallet balance per user, in paise')
+    parser.add_argument('--output', default=None, help='also write the results as JSON')
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('--database-url or BENCH_DATABASE_URL is required (use a scratch database)')
+
+    env = {'DATABASE_URL': args.database_url, 'SCHEDULER_ENABLED': 'false'}
+    os.environ.update(env)
+    pairs = seed(args.users, args.balance)
+    user_ids = [user_id for user_id, _ in pairs]
+    batches = make_batches(pairs, args.events, args.batch_size)
+    print(f'Seeded {args.users} users; {args.events} events in {len(batches)} batches')
+
+    base_url = f'http://127.0.0.1:{args.port}'
+    process = multiprocessing.get_context('spawn').Process(target=_serve, args=(args.port, env), daemon=True)
+    process.start()
+    try:
+        wait_until_up(base_url, process)
+        first = asyncio.run(send(base_url, batches, args.concurrency))
+        after_first = snapshot(user_ids)
+        replay = asyncio.run(send(base_url, batches, args.concurrency))
+        after_replay = snapshot(user_ids)
+    finally:
+        process.terminate()
+        process.join(10)
+
+    for name, result in (('first', first), ('replay', replay)):
+        print(f"{name:<6} {result['received']} events in {result['seconds']:>7} s  "
+              f"{result['events_per_second']:>9} events/s  batch p50 {result['p50_ms']} ms  "
+              f"p99 {result['p99_ms']} ms  inserted {result['inserted']}  errors {result['errors']}")
+    problems = []
+    if first['errors'] or replay['errors']:
+        problems.append(f"{first['errors'] + replay['errors']} batches failed")
+    if first['inserted'] != after_first['violations']:
+        problems.append(f"first pass reported {first['inserted']} inserts, found {after_first['violations']}")
+    if replay['inserted'] or replay['penalty_total']:
+        problems.append(f"replay inserted {replay['inserted']} and charged {replay['penalty_total']}")
+    if after_replay != after_first:
+        problems.append(f'replay changed the ledger: {after_first} -> {after_replay}')
+    for problem in problems:
+        print(f'FAIL: {problem}')
+    if not problems:
+        print(f"OK: replay added no violations, transactions or charges ({after_first})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'git_commit': git_commit(), 'events': args.events, 'users': args.users,
+                       'batch_size': args.batch_size, 'concurrency': args.concurrency,
+                       'first': first, 'replay': replay, 'ledger': after_replay, 'problems': problems}, f, indent=2)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
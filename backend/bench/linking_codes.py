@@ -0,0 +1,101 @@
+"""
+Occupancy benchmark for the linking-code allocator (services/linking_codes.py).
+
+Fills a fresh allocator's bitmap to each requested occupancy (10%, 50% and 90% of the
+6-digit space by default) with random live codes, then times --allocations calls of
+`allocate`, printing the mean and tail latency per code and the candidates scanned per
+code. The allocator's own work is what this measures: the session only accepts the
+upsert, since its cost (one statement on the unique code index) does not depend on
+occupancy. Latency should stay flat as occupancy grows; retry-until-free allocation
+would need 1 / (1 - occupancy) round trips, ten at 90%.
+
+    python -m bench.linking_codes --occupancy 0.1 0.5 0.9 --allocations 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from bench.load import git_commit, percentile
+
+
+class _Accepted:
+    def first(self):
+        return ('linking-code-id',)
+
+
+class AcceptingSession:
+    """Stands in for the AsyncSession: every upsert wins and nothing is stored."""
+
+    def __init__(self):
+        self.statements = 0
+
+    async def execute(self, stmt):
+        self.statements += 1
+        return _Accepted()
+
+
+async def measure(occupancy: float, allocations: int, space: int) -> dict:
+    from services.linking_codes import LinkingCodeAllocator
+
+    allocator = LinkingCodeAllocator(space)
+    allocator._build_order()
+    expires_at = datetime.utcnow() + timedelta(hours=24)
+    for n in random.sample(range(space), int(occupancy * space)):
+        allocator._mark(n, expires_at)
+    allocator._loaded = True
+
+    session = AcceptingSession()
+    scanned_before = allocator._cursor
+    latencies = []
+    for _ in range(allocations):
+        started = time.perf_counter()
+        await allocator.allocate(session, 'bench-parent', expires_at)
+        latencies.append(time.perf_counter() - started)
+    scanned = (allocator._cursor - scanned_before) % space
+    latencies.sort()
+    return {
+        'occupancy': occupancy,
+        'allocations': allocations,
+        'statements': session.statements,
+        'candidates_per_code': round(scanned / allocations, 2),
+        'mean_us': round(statistics.fmean(latencies) * 1e6, 2),
+        'p50_us': round(percentile(latencies, 0.50) * 1e6, 2),
+        'p99_us': round(percentile(latencies, 0.99) * 1e6, 2),
+        'max_us': round(latencies[-1] * 1e6, 2),
+    }
+
+
+def main():
+    # the allocator imports the models and with them db.session, which wants a URL; nothing connects
+    os.environ.setdefault('DATABASE_URL', 'postgresql+psycopg2://localhost/unused')
+    from services.linking_codes import CODE_SPACE
+
+    parser = argparse.ArgumentParser(prog='python -m bench.linking_codes', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--occupancy', type=float, nargs='+', default=[0.1, 0.5, 0.9],
+                        help='fractions of the code space already in use')
+    parser.add_argument('--allocations', type=int, default=20_000, help='codes allocated at each occupancy')
+    parser.add_argument('--space', type=int, default=CODE_SPACE)
+    parser.add_argument('--output', default=None, help='also write the results as JSON')
+    args = parser.parse_args()
+    if any(not 0 <= o < 1 for o in args.occupancy):
+        parser.error('--occupancy values must be in [0, 1)')
+
+    results = []
+    for occupancy in args.occupancy:
+        result = asyncio.run(measure(occupancy, args.allocations, args.space))
+        results.append(result)
+        print(f"occupancy {occupancy:>4.0%}  mean {result['mean_us']:>7} us  p50 {result['p50_us']:>7} us  "
+              f"p99 {result['p99_us']:>7} us  candidates/code {result['candidates_per_code']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'git_commit': git_commit(), 'space': args.space, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
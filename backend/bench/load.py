@@ -0,0 +1,360 @@
+"""
+Load benchmark for the auth, profile and linking endpoints.
+
+Starts the app with uvicorn in a child process against a local Postgres, seeds
+parents, children (with goals and violations) and unlinked users, and swaps Google
+id_token verification onto a locally generated RSA key: the real verifier runs, but
+its key cache is preloaded with our JWKS and never refreshed from Google. Each
+scenario is then driven at every requested concurrency level:
+
+    auth_token             POST /auth/token (children signing in)
+    me                     GET  /api/me
+    generate_linking_code  POST /api/linking/generate-linking-code (parents)
+    verify_linking_code    POST /api/linking/verify-linking-code (unlinked users)
+    my_children            GET  /api/linking/my-children (parents)
+
+Latency percentiles, throughput and SQL statements per request (read from /metrics)
+are written as JSON so runs can be compared over time. The database is written to, so
+point it at a scratch database. Run from the backend folder:
+
+    python -m bench.load --database-url postgresql://localhost/guilt_eater_bench \\
+        --concurrency 1 8 32 --requests 500
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import re
+import statistics
+import subprocess
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+
+BENCH_CLIENT_ID = 'bench-client.apps.googleusercontent.com'
+BENCH_KID = 'bench-key'
+SCENARIOS = ('auth_token', 'me', 'generate_linking_code', 'verify_linking_code', 'my_children')
+ROUTES = {
+    'auth_token': ('POST', '/auth/token'),
+    'me': ('GET', '/api/me'),
+    'generate_linking_code': ('POST', '/api/linking/generate-linking-code'),
+    'verify_linking_code': ('POST', '/api/linking/verify-linking-code'),
+    'my_children': ('GET', '/api/linking/my-children'),
+}
+
+
+def make_signing_key():
+    """A fresh RSA key as (private PEM, JWKS document)."""
+    from testing.google_jwks import rsa_key
+
+    private_pem, public_jwk = rsa_key(BENCH_KID)
+    return private_pem, {'keys': [public_jwk]}
+
+
+def mint_id_token(private_pem: str, email: str, name: str) -> str:
+    from jose import jwt
+
+    now = int(time.time())
+    claims = {
+        'iss': 'https://accounts.google.com',
+        'aud': BENCH_CLIENT_ID,
+        'sub': uuid.uuid5(uuid.NAMESPACE_DNS, email).hex,
+        'email': email,
+        'email_verified': True,
+        'name': name,
+        'iat': now,
+        'exp': now + 3600,
+    }
+    return jwt.encode(claims, private_pem, algorithm='RS256', headers={'kid': BENCH_KID})
+
+
+def _serve(port: int, env: dict, jwks: dict):
+    """Child process: run the app with Google keys pinned to the bench JWKS."""
+    os.environ.update(env)
+    import uvicorn
+
+    import main
+    from auth.oauth import google_keys
+
+    google_keys.load_jwks(jwks, max_age=10 ** 9)
+    google_keys.start = lambda: None  # never replace the bench keys with Google's
+    uvicorn.run(main.app, host='127.0.0.1', port=port, log_level='warning')
+
+
+def seed(args, run_id: str) -> dict:
+    """Insert the bench population; returns the users by kind as (id, email, name)."""
+    from sqlalchemy import insert
+
+    from db.migrate import upgrade
+    from db.session import SessionLocal
+    from models.models import Goal, GoalStatus, RoleEnum, User, Violation, WalletLedger, gen_uuid
+
+    upgrade()
+    now = datetime.utcnow()
+    users, goals, wallets, violations = [], [], [], []
+    population = {'parents': [], 'children': [], 'unlinked': []}
+
+    def add_user(kind, role, parent_id=None):
+        user_id = gen_uuid()
+        email = f'bench-{run_id}-{kind}-{len(population[kind])}@example.com'
+        name = f'Bench {kind} {len(population[kind])}'
+        users.append({'id': user_id, 'email': email, 'name': name, 'role': role, 'parent_id': parent_id,
+                      'created_at': now, 'updated_at': now})
+        population[kind].append((user_id, email, name))
+        return user_id
+
+    for _ in range(args.parents):
+        parent_id = add_user('parents', RoleEnum.parent)
+        for _ in range(args.children_per_parent):
+            child_id = add_user('children', RoleEnum.child, parent_id)
+            for g in range(args.goals_per_child):
+                goal_id = gen_uuid()
+                goals.append({'id': goal_id, 'user_id': child_id, 'app_name': f'com.bench.app{g}',
+                              'daily_limit_minutes': 60, 'start_date': now - timedelta(days=30),
+                              'end_date': now + timedelta(days=30), 'max_warnings': 2,
+                              'penalty_percent': 10.0, 'status': GoalStatus.active})
+                wallets.append({'id': gen_uuid(), 'user_id': child_id, 'goal_id': goal_id,
+                                'deposit_amount': 50_000, 'current_balance': 50_000, 'total_penalty': 0,
+                                'total_warnings': 0, 'created_at': now})
+                for v in range(args.violations_per_goal):
+                    violations.append({'id': gen_uuid(), 'user_id': child_id, 'goal_id': goal_id,
+                                       'app_name': f'com.bench.app{g}', 'used_minutes': 90,
+                                       'limit_minutes': 60, 'warning_number': v + 1,
+                                       'timestamp': now - timedelta(hours=v), 'settled_at': now})
+    for _ in range(args.unlinked):
+        add_user('unlinked', RoleEnum.individual)
+
+    with SessionLocal() as db:
+        for model, rows in ((User, users), (Goal, goals), (WalletLedger, wallets), (Violation, violations)):
+            for i in range(0, len(rows), 5000):
+                db.execute(insert(model), rows[i:i + 5000])
+        db.commit()
+    return population
+
+
+def parse_route_queries(metrics_text: str) -> dict:
+    """(method, route) -> (sum of statements, request count) from http_request_db_queries."""
+    totals = {}
+    pattern = re.compile(r'^http_request_db_queries_(sum|count)\{(.*)\} (\S+)$')
+    for line in metrics_text.splitlines():
+        match = pattern.match(line)
+        if not match:
+            continue
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', match.group(2)))
+        key = (labels.get('method'), labels.get('route'))
+        total, count = totals.get(key, (0.0, 0.0))
+        if match.group(1) == 'sum':
+            total = float(match.group(3))
+        else:
+            count = float(match.group(3))
+        totals[key] = (total, count)
+    return totals
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def drive(client: httpx.AsyncClient, requests: list, concurrency: int) -> dict:
+    """Send `requests` ((method, path, kwargs) tuples) with `concurrency` workers."""
+    latencies, errors = [], 0
+    queue = iter(requests)
+
+    async def worker():
+        nonlocal errors
+        for method, path, kwargs in queue:
+            started = time.perf_counter()
+            try:
+                resp = await client.request(method, path, **kwargs)
+                ok = resp.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+async def run_benchmark(args, base_url: str, private_pem: str, population: dict) -> list:
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def sign_in(user, role):
+            resp = await client.post('/auth/token', json={'id_token': mint_id_token(private_pem, user[1], user[2]), 'role': role})
+            resp.raise_for_status()
+            return {'Authorization': f"Bearer {resp.json()['access_token']}"}
+
+        # one sign-in per user up front (parents rotate their session here, once)
+        parent_auth = [await sign_in(u, 'parent') for u in population['parents']]
+        child_auth = [await sign_in(u, 'child') for u in population['children']]
+        unlinked = list(population['unlinked'])
+        unlinked_auth = [await sign_in(u, 'individual') for u in unlinked]
+
+        def pick(pool, n):
+            return [random.choice(pool) for _ in range(n)]
+
+        results = []
+        for scenario in args.scenarios:
+            method, route = ROUTES[scenario]
+            for concurrency in args.concurrency:
+                before = parse_route_queries((await client.get('/metrics')).text)
+                if scenario == 'auth_token':
+                    users = pick(population['children'], args.requests)
+                    reqs = [(method, route, {'json': {'id_token': mint_id_token(private_pem, u[1], u[2]), 'role': 'child'}})
+                            for u in users]
+                    stats = await drive(client, reqs, concurrency)
+                elif scenario == 'me':
+                    stats = await drive(client, [(method, route, {'headers': h}) for h in pick(child_auth + parent_auth, args.requests)], concurrency)
+                elif scenario == 'generate_linking_code':
+                    stats = await drive(client, [(method, route, {'headers': h}) for h in pick(parent_auth, args.requests)], concurrency)
+                elif scenario == 'my_children':
+                    stats = await drive(client, [(method, route, {'headers': h}) for h in pick(parent_auth, args.requests)], concurrency)
+                else:
+                    # each verify consumes one parent's code and one unlinked user, so go
+                    # in rounds of (one fresh code per parent, then the verifies)
+                    stats_rounds = []
+                    while unlinked_auth and sum(s['requests'] for s in stats_rounds) < args.requests:
+                        codes = []
+                        for h in parent_auth:
+                            resp = await client.post('/api/linking/generate-linking-code', headers=h)
+                            codes.append(resp.json()['code'])
+                        batch = []
+                        for code in codes:
+                            if not unlinked_auth:
+                                break
+                            batch.append((method, route, {'headers': unlinked_auth.pop(), 'json': {'code': code}}))
+                        stats_rounds.append(await drive(client, batch, concurrency))
+                    stats = _merge_rounds(stats_rounds)
+                after = parse_route_queries((await client.get('/metrics')).text)
+                total_before, count_before = before.get((method, route), (0.0, 0.0))
+                total_after, count_after = after.get((method, route), (0.0, 0.0))
+                counted = count_after - count_before
+                stats['queries_per_request'] = round((total_after - total_before) / counted, 2) if counted else None
+                results.append({'scenario': scenario, 'method': method, 'route': route, 'concurrency': concurrency, **stats})
+                print(f"{scenario:<22} c={concurrency:<4} {stats['rps'] or 0:>8} rps  "
+                      f"p50 {stats['p50_ms']:>7} ms  p95 {stats['p95_ms']:>7} ms  p99 {stats['p99_ms']:>7} ms  "
+                      f"queries {stats['queries_per_request']}  errors {stats['errors']}")
+        return results
+
+
+def _merge_rounds(rounds: list) -> dict:
+    """Combine verify rounds; percentiles are request-weighted averages of the rounds'."""
+    requests = sum(r['requests'] for r in rounds)
+    if not requests:
+        return {'requests': 0, 'errors': 0, 'seconds': 0.0, 'rps': None, 'mean_ms': None,
+                'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0}
+    seconds = sum(r['seconds'] for r in rounds)
+
+    def weighted(key):
+        return round(sum(r[key] * r['requests'] for r in rounds) / requests, 2)
+
+    return {
+        'requests': requests,
+        'errors': sum(r['errors'] for r in rounds),
+        'seconds': round(seconds, 3),
+        'rps': round(requests / seconds, 1) if seconds else None,
+        'mean_ms': weighted('mean_ms'),
+        'p50_ms': weighted('p50_ms'),
+        'p95_ms': weighted('p95_ms'),
+        'p99_ms': weighted('p99_ms'),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def wait_until_up(base_url: str, process, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not process.is_alive():
+            raise RuntimeError('app process exited during startup')
+        try:
+            if httpx.get(f'{base_url}/api/health', timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'app did not come up within {timeout}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench.load', description='Load benchmark for the Guilt Eater backend.')
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL'),
+                        help='scratch Postgres database (default: $BENCH_DATABASE_URL)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=500, help='requests per scenario and concurrency level')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--parents', type=int, default=50)
+    parser.add_argument('--children-per-parent', type=int, default=3)
+    parser.add_argument('--goals-per-child', type=int, default=2)
+    parser.add_argument('--violations-per-goal', type=int, default=20)
+    parser.add_argument('--unlinked', type=int, default=1500, help='users available for verify-linking-code')
+    parser.add_argument('--output', default=None, help='JSON results path (default: bench/results/<timestamp>.json)')
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('--database-url or BENCH_DATABASE_URL is required (use a scratch database)')
+
+    env = {
+        'DATABASE_URL': args.database_url,
+        'GOOGLE_CLIENT_ID': BENCH_CLIENT_ID,
+        'SCHEDULER_ENABLED': 'false',
+    }
+    os.environ.update(env)
+    run_id = uuid.uuid4().hex[:8]
+    private_pem, jwks = make_signing_key()
+    population = seed(args, run_id)
+    print(f"Seeded run {run_id}: " + ', '.join(f'{len(v)} {k}' for k, v in population.items()))
+
+    base_url = f'http://127.0.0.1:{args.port}'
+    process = multiprocessing.get_context('spawn').Process(target=_serve, args=(args.port, env, jwks), daemon=True)
+    process.start()
+    try:
+        wait_until_up(base_url, process)
+        results = asyncio.run(run_benchmark(args, base_url, private_pem, population))
+    finally:
+        process.terminate()
+        process.join(10)
+
+    report = {
+        'run_id': run_id,
+        'started_at': datetime.utcnow().isoformat(),
+        'git_commit': git_commit(),
+        'settings': {k: v for k, v in vars(args).items() if k not in ('database_url', 'output')},
+        'population': {k: len(v) for k, v in population.items()},
+        'results': results,
+    }
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), 'results', f"{datetime.utcnow():%Y%m%dT%H%M%S}-{run_id}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+Benchmark of the nightly penalty engine (services/penalty_engine.py) at a million goals.
+
+Builds --goals synthetic goals (1M by default) with mixed warning allowances, penalty
+percentages (some unset, so the deposit tier applies) and balances, and a Poisson
+number of violations each (--violations-per-goal on average, with a sprinkling of
+uninstall, permission-revoke and safe-mode events). `compute_penalties` is timed over
+the whole population in --chunk-size chunks, as the engine feeds it, next to the
+event-by-event loop immediate-mode ingestion runs, over a --loop-goals sample; the
+two must agree to the paisa.
+
+With --database-url the same population shape is also seeded server-side with
+generate_series and `run_penalty_engine` settles it end to end, reporting the wall time
+including the reads, wallet locks and bulk writes. Point it at a scratch database.
+
+    python -m bench.penalty --goals 1000000 [--database-url postgresql://localhost/guilt_eater_bench]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from bench.load import git_commit
+
+# share of violations that are bypass events instead of limit_exceeded
+BYPASS_SHARE = {'uninstall_attempt': 0.01, 'permission_revoke': 0.01, 'safe_mode': 0.002}
+
+
+def build(goals: int, per_goal: float, seed: int) -> dict:
+    """The synthetic population as engine-shaped arrays, violations sorted by goal."""
+    from models.models import ViolationType
+    from services.penalty_engine import _EVENT_CODES, tier_percents
+
+    rng = np.random.default_rng(seed)
+    deposit = rng.integers(5_000, 200_000, goals)
+    percent = rng.choice([5.0, 10.0, 15.0, 20.0, np.nan], goals)
+    percent = np.where(np.isnan(percent), tier_percents(deposit), percent)
+    counts = rng.poisson(per_goal, goals)
+    goal_index = np.repeat(np.arange(goals), counts)
+    starts = np.cumsum(counts) - counts
+    warning_number = np.arange(len(goal_index)) - np.repeat(starts, counts) + 1
+    codes = [_EVENT_CODES[ViolationType.limit_exceeded]] + [_EVENT_CODES[ViolationType(t)] for t in BYPASS_SHARE]
+    shares = [1 - sum(BYPASS_SHARE.values())] + list(BYPASS_SHARE.values())
+    return {
+        'goal_index': goal_index,
+        'warning_number': warning_number,
+        'event_code': rng.choice(codes, len(goal_index), p=shares),
+        'max_warnings': rng.integers(0, 4, goals),
+        'percent': percent,
+        'balance': deposit,
+        'counts': counts,
+        'starts': starts,
+    }
+
+
+def chunked(population: dict, chunk_size: int):
+    """compute_penalties over the population chunk by chunk; returns (penalties, seconds)."""
+    from services.penalty_engine import compute_penalties
+
+    goals = len(population['balance'])
+    penalties, elapsed = [], 0.0
+    for first in range(0, goals, chunk_size):
+        last = min(first + chunk_size, goals)
+        lo = population['starts'][first]
+        hi = population['starts'][last - 1] + population['counts'][last - 1]
+        started = time.perf_counter()
+        penalty, *_ = compute_penalties(
+            population['goal_index'][lo:hi] - first,
+            population['warning_number'][lo:hi],
+            population['event_code'][lo:hi],
+            population['max_warnings'][first:last],
+            population['percent'][first:last],
+            population['balance'][first:last],
+        )
+        elapsed += time.perf_counter() - started
+        penalties.append(penalty)
+    return np.concatenate(penalties), elapsed
+
+
+def event_loop(population: dict, goals: int):
+    """Penalties for the first `goals` goals charged one event at a time, as in immediate mode."""
+    from models.models import ViolationType
+    from services.penalty_rules import penalty_fraction
+
+    types = list(ViolationType)
+    started = time.perf_counter()
+    penalties = []
+    for g in range(goals):
+        balance = int(population['balance'][g])
+        lo = population['starts'][g]
+        for i in range(lo, lo + population['counts'][g]):
+            fraction = penalty_fraction(types[population['event_code'][i]], int(population['warning_number'][i]),
+                                        int(population['max_warnings'][g]), float(population['percent'][g]), 0)
+            penalty = min(int(balance * fraction), balance)
+            balance -= penalty
+            penalties.append(penalty)
+    return np.array(penalties, dtype=np.int64), time.perf_counter() - started
+
+
+def seed_database(goals: int, per_goal: int, day: date) -> None:
+    """The population shape in the database: a user, an active goal and wallet per goal, and
+    `per_goal` unsettled violations each (every 50th a bypass event) on `day`."""
+    from sqlalchemy import text
+
+    from db.migrate import upgrade
+    from db.session import SessionLocal
+
+    upgrade()
+    params = {'run': f'bench-penalty-{uuid.uuid4().hex[:8]}', 'n': goals, 'per': per_goal,
+              'now': datetime.utcnow(), 'at': datetime.combine(day, datetime.min.time()) + timedelta(hours=12)}
+    with SessionLocal() as db:
+        db.execute(text("""
+            INSERT INTO users (id, email, name, role, created_at, updated_at)
+            SELECT :run || '-' || g, :run || '-' || g || '@example.com', 'Bench penalty', 'individual', :now, :now
+            FROM generate_series(1, :n) AS g
+        """), params)
+        db.execute(text("""
+            INSERT INTO goals (id, user_id, app_name, daily_limit_minutes, start_date, end_date,
+                               max_warnings, penalty_percent, status)
+            SELECT :run || '-' || g, :run || '-' || g, 'com.bench.app', 60, :now - interval '30 days',
+                   :now + interval '30 days', g % 4, CASE WHEN g % 5 = 0 THEN NULL ELSE 5 * (1 + g % 4) END, 'active'
+            FROM generate_series(1, :n) AS g
+        """), params)
+        db.execute(text("""
+            INSERT INTO wallet_ledger (id, user_id, goal_id, deposit_amount, current_balance, total_penalty,
+                                       total_warnings, status, created_at)
+            SELECT :run || '-' || g, :run || '-' || g, :run || '-' || g, 5000 + g * 7919 % 195000,
+                   5000 + g * 7919 % 195000, 0, 0, 'active', :now
+            FROM generate_series(1, :n) AS g
+        """), params)
+        db.execute(text("""
+            INSERT INTO violations (id, user_id, goal_id, app_name, used_minutes, limit_minutes, warning_number,
+                                    penalty_applied, penalty_amount, event_type, timestamp)
+            SELECT :run || '-' || g || '-' || k, :run || '-' || g, :run || '-' || g, 'com.bench.app', 90, 60, k,
+                   false, 0, CASE WHEN (g + k) % 50 = 0 THEN 'uninstall_attempt' ELSE 'limit_exceeded' END,
+                   CAST(:at AS TIMESTAMP) + k * interval '1 second'
+            FROM generate_series(1, :n) AS g, generate_series(1, :per) AS k
+        """), params)
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench.penalty', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--goals', type=int, default=1_000_000)
+    parser.add_argument('--violations-per-goal', type=float, default=3.0, help='mean unsettled violations per goal')
+    parser.add_argument('--chunk-size', type=int, default=None, help='goals per chunk (default: the engine default)')
+    parser.add_argument('--loop-goals', type=int, default=50_000, help='goals the event-by-event loop is timed on')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL'),
+                        help='also settle the goals end to end in this scratch database (default: $BENCH_DATABASE_URL)')
+    parser.add_argument('--output', default=None, help='also write the results as JSON')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        # the engine imports the models and with them db.session, which wants a URL; nothing connects
+        os.environ.setdefault('DATABASE_URL', 'postgresql+psycopg2://localhost/unused')
+    from services.penalty_engine import DEFAULT_CHUNK_SIZE, run_penalty_engine
+
+    chunk_size = args.chunk_size or DEFAULT_CHUNK_SIZE
+    population = build(args.goals, args.violations_per_goal, args.seed)
+    violations = len(population['goal_index'])
+    penalties, seconds = chunked(population, chunk_size)
+    loop_goals = min(args.loop_goals, args.goals)
+    loop_penalties, loop_seconds = event_loop(population, loop_goals)
+    agree = bool(np.array_equal(penalties[:len(loop_penalties)], loop_penalties))
+    loop_violations = len(loop_penalties)
+    results = {
+        'goals': args.goals,
+        'violations': violations,
+        'chunk_size': chunk_size,
+        'compute_seconds': round(seconds, 3),
+        'compute_violations_per_second': round(violations / seconds),
+        'loop_goals': loop_goals,
+        'loop_violations_per_second': round(loop_violations / loop_seconds) if loop_seconds else None,
+        'loop_agrees': agree,
+        'penalty_total': int(penalties.sum()),
+    }
+    print(f"compute_penalties  {args.goals} goals, {violations} violations in {seconds:.2f} s "
+          f"({results['compute_violations_per_second']:,} violations/s, chunks of {chunk_size})")
+    print(f"event loop         {loop_violations} violations in {loop_seconds:.2f} s "
+          f"({results['loop_violations_per_second']:,} violations/s)  "
+          f"{'same paise' if agree else 'MISMATCH with compute_penalties'}")
+
+    if args.database_url:
+        day = date.today() - timedelta(days=1)
+        per_goal = max(round(args.violations_per_goal), 1)
+        started = time.perf_counter()
+        seed_database(args.goals, per_goal, day)
+        seeded = time.perf_counter() - started
+        started = time.perf_counter()
+        totals = run_penalty_engine(day, chunk_size=chunk_size)
+        elapsed = time.perf_counter() - started
+        results['database'] = dict(totals, seed_seconds=round(seeded, 1), engine_seconds=round(elapsed, 1),
+                                   goals_per_second=round(totals['goals'] / elapsed))
+        print(f"run_penalty_engine {totals['goals']} goals, {totals['violations']} violations settled in "
+              f"{elapsed:.1f} s ({results['database']['goals_per_second']:,} goals/s; seeding took {seeded:.1f} s)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'git_commit': git_commit(), **results}, f, indent=2)
+    sys.exit(0 if agree else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Serialisation cost of list responses, before and after the fast path.
+
+Compares, for 1k and 10k violations/transactions:
+
+  before   ad-hoc dicts with .isoformat() -> jsonable_encoder -> json.dumps (FastAPI default)
+  orjson   the same dicts -> jsonable_encoder -> ORJSONResponse (the app's default class)
+  adapter  ORM rows -> precompiled TypeAdapter.dump_json (what the list endpoints return)
+
+No database is needed; rows are transient ORM objects. Run from the backend folder:
+
+    python -m bench.serialization [--sizes 1000 10000] [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+
+# models import db.session, which only needs a URL to build (not connect) its engines
+os.environ.setdefault('DATABASE_URL', 'postgresql+psycopg2://bench@localhost/bench')
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from api.responses import ORJSONResponse  # noqa: E402
+from models.models import (  # noqa: E402
+    Transaction, TransactionStatus, TransactionType, Violation, ViolationType, gen_uuid
+)
+from schemas.schemas import dump_list, transaction_list_adapter, violation_list_adapter  # noqa: E402
+
+
+def make_violations(n: int) -> list:
+    start = datetime(2026, 1, 1)
+    user_id, goal_id = gen_uuid(), gen_uuid()
+    return [
+        Violation(
+            id=gen_uuid(), user_id=user_id, goal_id=goal_id, app_name='com.example.app',
+            used_minutes=90 + i % 30, limit_minutes=60, warning_number=i + 1,
+            penalty_applied=i > 2, penalty_amount=(i % 7) * 500, event_type=ViolationType.limit_exceeded,
+            timestamp=start + timedelta(minutes=i),
+        )
+        for i in range(n)
+    ]
+
+
+def make_transactions(n: int) -> list:
+    start = datetime(2026, 1, 1)
+    user_id, goal_id, wallet_id = gen_uuid(), gen_uuid(), gen_uuid()
+    return [
+        Transaction(
+            id=gen_uuid(), user_id=user_id, goal_id=goal_id, wallet_id=wallet_id, razorpay_payment_id=None,
+            type=TransactionType.penalty, amount=(i % 7) * 500, status=TransactionStatus.success,
+            timestamp=start + timedelta(minutes=i),
+        )
+        for i in range(n)
+    ]
+
+
+def violation_dict(v: Violation) -> dict:
+    return {
+        'id': v.id, 'user_id': v.user_id, 'goal_id': v.goal_id, 'app_name': v.app_name,
+        'used_minutes': v.used_minutes, 'limit_minutes': v.limit_minutes,
+        'warning_number': v.warning_number, 'penalty_applied': v.penalty_applied,
+        'penalty_amount': v.penalty_amount, 'event_type': v.event_type.value,
+        'timestamp': v.timestamp.isoformat(),
+    }
+
+
+def transaction_dict(t: Transaction) -> dict:
+    return {
+        'id': t.id, 'user_id': t.user_id, 'goal_id': t.goal_id, 'wallet_id': t.wallet_id,
+        'razorpay_payment_id': t.razorpay_payment_id, 'type': t.type.value, 'amount': t.amount,
+        'status': t.status.value, 'timestamp': t.timestamp.isoformat(),
+    }
+
+
+def timed(func, repeat: int) -> float:
+    func()  # warm up
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark list response serialisation.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    cases = [
+        ('violations', make_violations, violation_dict, violation_list_adapter),
+        ('transactions', make_transactions, transaction_dict, transaction_list_adapter),
+    ]
+    print(f"{'list':<14}{'items':>8}{'before ms':>12}{'orjson ms':>12}{'adapter ms':>12}{'speedup':>9}")
+    for name, make, to_dict, adapter in cases:
+        for size in args.sizes:
+            rows = make(size)
+            before = timed(lambda: JSONResponse(jsonable_encoder({'items': [to_dict(r) for r in rows]})).body, args.repeat)
+            fast_class = timed(lambda: ORJSONResponse(jsonable_encoder({'items': [to_dict(r) for r in rows]})).body, args.repeat)
+            after = timed(lambda: dump_list(adapter, rows), args.repeat)
+            print(f"{name:<14}{size:>8}{before:>12.2f}{fast_class:>12.2f}{after:>12.2f}{before / after:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Import-time and startup-time measurements for the app.
+
+Each sample runs in a fresh interpreter so nothing is cached between runs:
+
+- import: `python -X importtime -c "import main"`; reports the total and the slowest
+  modules by cumulative time (our own modules and the third-party packages they pull in).
+- startup: imports main, then runs the app's startup handlers (schema check, key cache,
+  revocation listener, scheduler) through the ASGI lifespan and times them. Needs a
+  reachable database, so it only runs with --database-url.
+
+Run from the backend folder:
+
+    python -m bench.startup --runs 5
+    python -m bench.startup --runs 5 --database-url postgresql://localhost/guilt_eater_bench
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# any syntactically valid URL will do for import timing: engines don't connect at import
+PLACEHOLDER_DATABASE_URL = 'postgresql+psycopg2://bench@localhost/bench'
+
+_STARTUP_PROBE = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+events = {}
+
+async def lifespan():
+    # drive the ASGI lifespan protocol: startup, then shut down as soon as it finishes
+    queue = asyncio.Queue()
+    queue.put_nowait({'type': 'lifespan.startup'})
+    async def send(message):
+        events[message['type']] = (time.perf_counter(), message.get('message'))
+        if message['type'].startswith('lifespan.startup'):
+            queue.put_nowait({'type': 'lifespan.shutdown'})
+    await main.app({'type': 'lifespan', 'asgi': {'version': '3.0'}, 'state': {}}, queue.get, send)
+
+try:
+    asyncio.run(lifespan())
+except Exception:
+    pass  # the failure was already reported as lifespan.startup.failed
+finished_at, error = events.get('lifespan.startup.complete') or events.get('lifespan.startup.failed', (None, None))
+print(json.dumps({'import': imported - started,
+                  'startup': None if finished_at is None else finished_at - imported,
+                  'result': 'complete' if 'lifespan.startup.complete' in events else 'failed',
+                  'error': error}))
+"""
+
+
+def _env(database_url):
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, SCHEDULER_ENABLED='false')
+    env['DATABASE_URL'] = database_url or env.get('DATABASE_URL') or PLACEHOLDER_DATABASE_URL
+    return env
+
+
+def measure_import(database_url=None):
+    """(total seconds, {module: cumulative seconds}) for one cold `import main`."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=BACKEND_DIR, env=_env(database_url), capture_output=True, text=True, check=True,
+    )
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative) / 1e6
+    return modules.get('main', 0.0), modules
+
+
+def measure_startup(database_url):
+    proc = subprocess.run(
+        [sys.executable, '-c', _STARTUP_PROBE],
+        cwd=BACKEND_DIR, env=_env(database_url), capture_output=True, text=True, check=True,
+    )
+    sample = json.loads(proc.stdout.strip().splitlines()[-1])
+    if sample['result'] != 'complete':
+        raise RuntimeError(f"startup failed: {sample['error']}")
+    return sample
+
+
+def _summary(values):
+    return {
+        'median_ms': round(statistics.median(values) * 1000, 1),
+        'min_ms': round(min(values) * 1000, 1),
+        'max_ms': round(max(values) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench.startup', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='slowest top-level imports to list')
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL'),
+                        help='database for the startup measurement (skipped without one)')
+    parser.add_argument('--output', default=None, help='also write the results as JSON')
+    args = parser.parse_args()
+
+    totals, per_module = [], {}
+    for _ in range(args.runs):
+        total, modules = measure_import(args.database_url)
+        totals.append(total)
+        for name, seconds in modules.items():
+            per_module.setdefault(name, []).append(seconds)
+    report = {'import': _summary(totals), 'slowest_imports': {}}
+    print(f"import main: median {report['import']['median_ms']} ms over {args.runs} runs")
+    # top-level packages only, so a package and its submodules aren't listed twice
+    top_level = {n: v for n, v in per_module.items() if '.' not in n and n != 'main'}
+    for name, values in sorted(top_level.items(), key=lambda kv: -statistics.median(kv[1]))[:args.top]:
+        median_ms = round(statistics.median(values) * 1000, 1)
+        report['slowest_imports'][name] = median_ms
+        print(f"  {name:<28} {median_ms:>8} ms")
+
+    if args.database_url:
+        samples = [measure_startup(args.database_url) for _ in range(args.runs)]
+        report['startup'] = _summary([s['startup'] for s in samples])
+        print(f"startup handlers: median {report['startup']['median_ms']} ms over {args.runs} runs")
+    else:
+        print("startup handlers: skipped (no --database-url)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Microbenchmark of auth.security.get_current_user with the token cache hit and missed.
+
+Seeds an individual and a parent, then calls the dependency directly (no HTTP) --calls
+times per case, each call with its own session as get_db gives a request:
+
+    hit           the token is cached: no jwt.decode, no query
+    hit_parent    the same, plus the revocation table check parent sessions get
+    miss          the cache is emptied before every call: jwt.decode and the User lookup
+    miss_parent   the same for the parent, whose session token is also compared
+
+The revocation table is filled directly, as the listener would after its reload, so no
+LISTEN connection is opened. Misses pay a round trip to --database-url, so point it at
+a local scratch database to measure the cache rather than the network.
+
+    python -m bench.token_cache --database-url postgresql://localhost/guilt_eater_bench --calls 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import uuid
+from datetime import datetime
+
+from bench.load import git_commit, percentile
+
+CASES = ('hit', 'hit_parent', 'miss', 'miss_parent')
+
+
+def seed() -> dict:
+    """An individual and a parent with a session; returns their access tokens by role."""
+    from sqlalchemy import insert
+
+    from auth.security import create_access_token, create_session_token
+    from db.migrate import upgrade
+    from db.session import SessionLocal
+    from models.models import RoleEnum, User, gen_uuid
+
+    upgrade()
+    now = datetime.utcnow()
+    run_id = uuid.uuid4().hex[:8]
+    users = {role: (gen_uuid(), create_session_token() if role == RoleEnum.parent else None)
+             for role in (RoleEnum.individual, RoleEnum.parent)}
+    with SessionLocal() as db:
+        db.execute(insert(User), [{'id': user_id, 'email': f'bench-token-{run_id}-{role.value}@example.com',
+                                   'name': f'Bench {role.value}', 'role': role, 'session_token': session_token,
+                                   'created_at': now, 'updated_at': now}
+                                  for role, (user_id, session_token) in users.items()])
+        db.commit()
+    return {role.value: (user_id, session_token, create_access_token(user_id, session_token=session_token))
+            for role, (user_id, session_token) in users.items()}
+
+
+async def measure(case: str, token: str, calls: int) -> dict:
+    from fastapi import Response
+    from fastapi.security import HTTPAuthorizationCredentials
+
+    from auth.security import get_current_user
+    from auth.token_cache import token_cache
+    from db.session import AsyncSessionLocal
+
+    credentials = HTTPAuthorizationCredentials(scheme='Bearer', credentials=token)
+    hit = case.startswith('hit')
+
+    async def call():
+        async with AsyncSessionLocal() as db:
+            return await get_current_user(Response(), credentials, db)
+
+    await call()  # warms the pool, and the cache for the hit cases
+    hits_before = token_cache.hits
+    latencies = []
+    for _ in range(calls):
+        if not hit:
+            token_cache.clear()
+        started = time.perf_counter()
+        await call()
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        'case': case,
+        'calls': calls,
+        'cache_hits': token_cache.hits - hits_before,
+        'mean_us': round(statistics.fmean(latencies) * 1e6, 1),
+        'p50_us': round(percentile(latencies, 0.50) * 1e6, 1),
+        'p99_us': round(percentile(latencies, 0.99) * 1e6, 1),
+    }
+
+
+async def run(tokens: dict, cases: list, calls: int) -> list:
+    from auth.revocation import session_revocations
+    from db.session import async_engine
+
+    parent_id, session_token, _ = tokens['parent']
+    session_revocations.set(parent_id, session_token)
+    session_revocations.ready = True
+    try:
+        return [await measure(case, tokens['parent' if case.endswith('parent') else 'individual'][2], calls)
+                for case in cases]
+    finally:
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench.token_cache', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL'),
+                        help='scratch Postgres database (default: $BENCH_DATABASE_URL)')
+    parser.add_argument('--calls', type=int, default=5000, help='get_current_user calls per case')
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=list(CASES))
+    parser.add_argument('--output', default=None, help='also write the results as JSON')
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('--database-url or BENCH_DATABASE_URL is required (use a scratch database)')
+
+    os.environ['DATABASE_URL'] = args.database_url
+    tokens = seed()
+    results = asyncio.run(run(tokens, args.cases, args.calls))
+    for result in results:
+        print(f"{result['case']:<12} mean {result['mean_us']:>8} us  p50 {result['p50_us']:>8} us  "
+              f"p99 {result['p99_us']:>8} us  cache hits {result['cache_hits']}/{result['calls']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'git_commit': git_commit(), 'calls': args.calls, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Concurrency stress test for the wallet service (services/wallet.py).
+
+Seeds one funded wallet and hammers it from --workers concurrent sessions with a random
+mix of deposit, apply_penalty and withdraw calls, each committed on its own. Afterwards
+the wallet's balance must equal its opening balance plus the sum of the successful
+transactions recorded against it (deposits in, penalties and withdrawals out) and must
+never have gone negative; a lost update or a double-applied one fails the run.
+Throughput and per-call latency percentiles are printed and optionally written as JSON.
+
+    python -m bench.wallet --database-url postgresql://localhost/guilt_eater_bench \\
+        --workers 32 --operations 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from bench.load import git_commit, percentile
+
+OPERATIONS = ('deposit', 'apply_penalty', 'withdraw')
+
+
+def seed(opening_balance: int) -> str:
+    """A user with one active goal and wallet holding `opening_balance` paise; returns the wallet id."""
+    from sqlalchemy import insert
+
+    from db.migrate import upgrade
+    from db.session import SessionLocal
+    from models.models import Goal, GoalStatus, RoleEnum, User, WalletLedger, gen_uuid
+
+    upgrade()
+    now = datetime.utcnow()
+    user_id, goal_id, wallet_id = gen_uuid(), gen_uuid(), gen_uuid()
+    with SessionLocal() as db:
+        db.execute(insert(User), [{'id': user_id, 'email': f'bench-wallet-{uuid.uuid4().hex[:8]}@example.com',
+                                   'name': 'Bench wallet', 'role': RoleEnum.individual,
+                                   'created_at': now, 'updated_at': now}])
+        db.execute(insert(Goal), [{'id': goal_id, 'user_id': user_id, 'app_name': 'com.bench.app',
+                                   'daily_limit_minutes': 60, 'start_date': now - timedelta(days=1),
+                                   'end_date': now + timedelta(days=30), 'max_warnings': 2,
+                                   'penalty_percent': 10.0, 'status': GoalStatus.active}])
+        db.execute(insert(WalletLedger), [{'id': wallet_id, 'user_id': user_id, 'goal_id': goal_id,
+                                           'deposit_amount': opening_balance, 'current_balance': opening_balance,
+                                           'total_penalty': 0, 'total_warnings': 0, 'created_at': now}])
+        db.commit()
+    return wallet_id
+
+
+async def hammer(wallet_id: str, workers: int, operations: int, max_amount: int) -> dict:
+    from db.session import AsyncSessionLocal, async_engine
+    from services import wallet
+
+    calls = iter(range(operations))
+    latencies = {name: [] for name in OPERATIONS}
+    outcomes = Counter()
+
+    async def worker():
+        for _ in calls:
+            name = random.choice(OPERATIONS)
+            amount = random.randint(1, max_amount)
+            started = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                try:
+                    await getattr(wallet, name)(db, wallet_id, amount)
+                    await db.commit()
+                    outcomes[name] += 1
+                except wallet.InsufficientFundsError:
+                    await db.rollback()
+                    outcomes['withdraw_refused'] += 1
+            latencies[name].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    elapsed = time.perf_counter() - started
+    await async_engine.dispose()
+
+    def summary(values: list) -> dict:
+        values = sorted(values)
+        return {
+            'calls': len(values),
+            'mean_ms': round(statistics.fmean(values) * 1000, 2) if values else None,
+            'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+        }
+
+    return {
+        'operations': operations,
+        'seconds': round(elapsed, 3),
+        'ops_per_second': round(operations / elapsed, 1) if elapsed else None,
+        'outcomes': dict(outcomes),
+        'latency': {name: summary(values) for name, values in latencies.items()},
+    }
+
+
+def reconcile(wallet_id: str, opening_balance: int) -> dict:
+    """Compare the wallet's balance with its opening balance plus its successful transactions."""
+    from sqlalchemy import case, func, select
+
+    from db.session import SessionLocal
+    from models.models import Transaction, TransactionStatus, TransactionType, WalletLedger
+
+    signed = case((Transaction.type == TransactionType.deposit, Transaction.amount), else_=-Transaction.amount)
+    with SessionLocal() as db:
+        balance, deposited = db.execute(
+            select(WalletLedger.current_balance, WalletLedger.deposit_amount).where(WalletLedger.id == wallet_id)
+        ).one()
+        net, deposits, count = db.execute(
+            select(func.coalesce(func.sum(signed), 0),
+                   func.coalesce(func.sum(Transaction.amount).filter(Transaction.type == TransactionType.deposit), 0),
+                   func.count())
+            .where(Transaction.wallet_id == wallet_id, Transaction.status == TransactionStatus.success)
+        ).one()
+    expected = opening_balance + int(net)
+    return {
+        'balance': balance,
+        'expected_balance': expected,
+        'deposit_amount': deposited,
+        'expected_deposit_amount': opening_balance + int(deposits),
+        'transactions': count,
+        'ok': balance == expected and deposited == opening_balance + int(deposits) and balance >= 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench.wallet', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL'),
+                        help='scratch Postgres database (default: $BENCH_DATABASE_URL)')
+    parser.add_argument('--workers', type=int, default=32, help='concurrent sessions on the one wallet')
+    parser.add_argument('--operations', type=int, default=20_000, help='wallet calls in total')
+    parser.add_argument('--opening-balance', type=int, default=1_000_000, help='paise in the wallet at the start')
+    parser.add_argument('--max-amount', type=int, default=5_000, help='largest amount per call, in paise')
+    parser.add_argument('--output', default=None, help='also write the results as JSON')
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('--database-url or BENCH_DATABASE_URL is required (use a scratch database)')
+
+    os.environ.update({'DATABASE_URL': args.database_url, 'DB_POOL_SIZE': str(args.workers)})
+    wallet_id = seed(args.opening_balance)
+    results = asyncio.run(hammer(wallet_id, args.workers, args.operations, args.max_amount))
+    check = reconcile(wallet_id, args.opening_balance)
+
+    print(f"{args.operations} calls from {args.workers} workers in {results['seconds']} s: "
+          f"{results['ops_per_second']} ops/s  {results['outcomes']}")
+    for name, stats in results['latency'].items():
+        print(f"  {name:<14} p50 {stats['p50_ms']:>7} ms  p95 {stats['p95_ms']:>7} ms  p99 {stats['p99_ms']:>7} ms")
+    print(f"balance {check['balance']} paise, opening + transactions = {check['expected_balance']} "
+          f"({check['transactions']} transactions): {'OK' if check['ok'] else 'MISMATCH'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'git_commit': git_commit(), 'settings': {k: v for k, v in vars(args).items()
+                                                                if k not in ('database_url', 'output')},
+                       'results': results, 'reconcile': check}, f, indent=2)
+    sys.exit(0 if check['ok'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+"""
+Single place that loads backend/.env.
+
+Modules keep reading their settings with os.getenv at import time; they just call
+`load_env()` first instead of each running load_dotenv themselves. The file is parsed
+once per process, and variables already set in the real environment win over it.
+"""
+import os
+
+from dotenv import load_dotenv
+
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+
+_loaded = False
+
+
+def load_env() -> None:
+    global _loaded
+    if not _loaded:
+        load_dotenv(ENV_PATH)
+        _loaded = True
@@ -0,0 +1,193 @@
+"""
+Versioned schema migrations.
+
+Each migration is a numbered script in backend/migrations (`0001_initial_schema.py`,
+`0002_add_session_token.py`, ...) defining `upgrade(conn)`. The runner applies pending
+scripts in order, each in its own transaction together with its row in the
+`schema_version` table, while holding an advisory lock so concurrently starting workers
+never migrate twice. Startup only compares the newest recorded version with the newest
+script (`check_schema`): one indexed query instead of create_all reflecting every table.
+
+Run from the backend folder:
+
+    python -m db.migrate            # apply pending migrations
+    python -m db.migrate status     # list applied and pending migrations
+
+Set MIGRATE_ON_STARTUP=false to have the app refuse to start on an out-of-date schema
+instead of upgrading it (e.g. when migrations are run as a separate deploy step).
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import re
+import sys
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.pool import NullPool
+
+from db.session import DATABASE_DIRECT_URL, async_engine, to_sync_url
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+MIGRATE_ON_STARTUP = os.getenv('MIGRATE_ON_STARTUP', 'true').lower() in ('1', 'true', 'yes')
+# pg_advisory_lock key; any constant that no other lock in the app uses
+MIGRATION_LOCK_ID = 7_310_001
+
+logger = logging.getLogger(__name__)
+
+_FILENAME = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    path: str
+
+    def load(self):
+        spec = importlib.util.spec_from_file_location(f'migrations.m{self.version:04d}', self.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+
+def discover() -> List[Migration]:
+    """All migration scripts, oldest first."""
+    migrations = {}
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = _FILENAME.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise RuntimeError(f'two migrations share version {version:04d}: {migrations[version].name}, {match.group(2)}')
+        migrations[version] = Migration(version, match.group(2), os.path.join(MIGRATIONS_DIR, filename))
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def latest_version() -> int:
+    migrations = discover()
+    return migrations[-1].version if migrations else 0
+
+
+def _ensure_version_table(conn) -> None:
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT timezone('utc', now())
+        )
+    """))
+
+
+def applied_versions(conn) -> set:
+    _ensure_version_table(conn)
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_version"))}
+
+
+def upgrade(target: Optional[int] = None, database_url: Optional[str] = None) -> List[Migration]:
+    """Apply pending migrations up to `target` (default: all); returns the ones applied.
+
+    Uses its own connection to the direct (non-pooled) endpoint: the advisory lock is
+    session-level and DDL should not go through a transaction pooler.
+    """
+    engine = create_engine(to_sync_url(database_url or DATABASE_DIRECT_URL), poolclass=NullPool)
+    applied = []
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK_ID})
+            conn.commit()
+            try:
+                done = applied_versions(conn)
+                conn.commit()
+                for migration in discover():
+                    if migration.version in done or (target is not None and migration.version > target):
+                        continue
+                    module = migration.load()
+                    with conn.begin():
+                        module.upgrade(conn)
+                        conn.execute(
+                            text("INSERT INTO schema_version (version, name) VALUES (:version, :name)"),
+                            {'version': migration.version, 'name': migration.name},
+                        )
+                    logger.info('migration applied', extra={'version': migration.version, 'migration': migration.name})
+                    applied.append(migration)
+            finally:
+                conn.rollback()
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_ID})
+                conn.commit()
+    finally:
+        engine.dispose()
+    return applied
+
+
+async def current_version() -> int:
+    """Newest applied version, or 0 for a database the runner has never touched."""
+    async with async_engine.connect() as conn:
+        try:
+            return (await conn.execute(text("SELECT max(version) FROM schema_version"))).scalar() or 0
+        except exc.ProgrammingError:
+            # no schema_version table yet
+            return 0
+
+
+async def check_schema() -> int:
+    """Startup check: upgrade (or, with MIGRATE_ON_STARTUP=false, refuse) if the schema is behind.
+
+    Returns the schema version the app runs against. Also opens the first pooled
+    connection, so the first request doesn't pay for it.
+    """
+    current, latest = await current_version(), latest_version()
+    if current >= latest:
+        if current > latest:
+            logger.warning('database schema is newer than this build', extra={'schema_version': current, 'latest': latest})
+        return current
+    if not MIGRATE_ON_STARTUP:
+        raise SchemaOutOfDate(
+            f'database schema is at version {current}, this build needs {latest}; run `python -m db.migrate`'
+        )
+    # the runner is synchronous (psycopg2); keep the event loop free while it works
+    await asyncio.to_thread(upgrade)
+    return latest
+
+
+def status(database_url: Optional[str] = None) -> None:
+    engine = create_engine(to_sync_url(database_url or DATABASE_DIRECT_URL), poolclass=NullPool)
+    try:
+        with engine.connect() as conn:
+            done = applied_versions(conn)
+            conn.commit()
+    finally:
+        engine.dispose()
+    for migration in discover():
+        state = 'applied' if migration.version in done else 'pending'
+        print(f"{migration.version:04d}  {state:<8} {migration.name}")
+
+
+def main(argv: List[str]) -> None:
+    command = argv[0] if argv else 'upgrade'
+    if command == 'status':
+        status()
+    elif command == 'upgrade':
+        target = int(argv[1]) if len(argv) > 1 else None
+        applied = upgrade(target)
+        for migration in applied:
+            print(f"✓ Applied {migration.version:04d} {migration.name}")
+        print("✓ Database schema is up to date" if not applied else "\nMigration completed successfully!")
+    else:
+        print("usage: python -m db.migrate [upgrade [VERSION] | status]")
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    try:
+        main(sys.argv[1:])
+    except Exception as e:
+        print(f"ERROR during migration: {e}")
+        sys.exit(1)
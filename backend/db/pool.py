@@ -0,0 +1,182 @@
+"""
+Connection pool settings and instrumentation for the engines in db.session.
+
+Everything is configured from the environment:
+
+    DB_POOL_MODE             direct | pooler. `pooler` is for PgBouncer-style transaction
+                             pooling (Neon's `-pooler` hosts): asyncpg's statement caches
+                             are disabled and prepared statements get unique names, since
+                             consecutive transactions may land on different server
+                             connections. Defaults to pooler for `-pooler` hosts.
+    DB_POOL_SIZE             persistent connections per engine (default 5)
+    DB_MAX_OVERFLOW          extra connections allowed under load (default 10)
+    DB_POOL_TIMEOUT          seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE          replace connections older than this many seconds (default 1800)
+    DB_PRE_PING              always | idle | never (default idle): `idle` only pings
+                             connections that sat in the pool longer than
+                             DB_PRE_PING_IDLE_SECONDS, so hot checkouts skip the round trip
+    DB_STATEMENT_CACHE_SIZE  asyncpg prepared statement cache per connection (default 100,
+                             forced to 0 in pooler mode)
+"""
+import os
+import time
+from dataclasses import asdict, dataclass
+from uuid import uuid4
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+def _default_mode(url: str) -> str:
+    host = make_url(url).host or ''
+    return 'pooler' if '-pooler' in host else 'direct'
+
+
+DATABASE_URL = os.getenv('DATABASE_URL') or ''
+DB_POOL_MODE = (os.getenv('DB_POOL_MODE') or _default_mode(DATABASE_URL)).lower() if DATABASE_URL else 'direct'
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_PRE_PING = os.getenv('DB_PRE_PING', 'idle').lower()
+DB_PRE_PING_IDLE_SECONDS = float(os.getenv('DB_PRE_PING_IDLE_SECONDS', '30'))
+DB_STATEMENT_CACHE_SIZE = 0 if DB_POOL_MODE == 'pooler' else int(os.getenv('DB_STATEMENT_CACHE_SIZE', '100'))
+
+if DB_POOL_MODE not in ('direct', 'pooler'):
+    raise RuntimeError(f"DB_POOL_MODE must be 'direct' or 'pooler', got {DB_POOL_MODE!r}")
+if DB_PRE_PING not in ('always', 'idle', 'never'):
+    raise RuntimeError(f"DB_PRE_PING must be 'always', 'idle' or 'never', got {DB_PRE_PING!r}")
+
+
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+    connects: int = 0  # new DB connections opened
+    waits: int = 0  # checkouts that found the pool exhausted and had to wait
+    wait_seconds: float = 0.0
+    timeouts: int = 0  # waits that gave up after DB_POOL_TIMEOUT
+    pings: int = 0
+    stale: int = 0  # connections found dead by a pre-ping and replaced
+
+
+class _InstrumentedPool:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self):
+        self.stats.checkouts += 1
+        return super().connect()
+
+    def _create_connection(self):
+        self.stats.connects += 1
+        return super()._create_connection()
+
+    def _do_get(self):
+        if self._max_overflow > -1 and self._overflow >= self._max_overflow and self.checkedin() == 0:
+            self.stats.waits += 1
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                self.stats.timeouts += 1
+                raise
+            finally:
+                self.stats.wait_seconds += time.perf_counter() - started
+        return super()._do_get()
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(async_driver: bool = False) -> dict:
+    """Keyword arguments for create_engine / create_async_engine."""
+    return {
+        'poolclass': InstrumentedAsyncQueuePool if async_driver else InstrumentedQueuePool,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_PRE_PING == 'always',
+    }
+
+
+def asyncpg_connect_args() -> dict:
+    """asyncpg connect() arguments for the configured statement cache / pooler mode."""
+    args = {
+        # asyncpg's own cache, and SQLAlchemy's adapter-level cache on top of it
+        'statement_cache_size': DB_STATEMENT_CACHE_SIZE,
+        'prepared_statement_cache_size': DB_STATEMENT_CACHE_SIZE,
+    }
+    if DB_POOL_MODE == 'pooler':
+        args['prepared_statement_name_func'] = lambda: f'__asyncpg_{uuid4()}__'
+    return args
+
+
+def install_idle_ping(engine) -> None:
+    """Ping connections on checkout only if they sat idle longer than DB_PRE_PING_IDLE_SECONDS.
+
+    `engine` is a sync Engine (for an AsyncEngine pass `.sync_engine`). A failed ping
+    raises DisconnectionError, which makes the pool discard the connection and retry
+    with a fresh one, the same as pool_pre_ping.
+    """
+    if DB_PRE_PING != 'idle':
+        return
+
+    @event.listens_for(engine, 'checkin')
+    def _checkin(dbapi_connection, record):
+        record.info['checked_in_at'] = time.monotonic()
+
+    @event.listens_for(engine, 'checkout')
+    def _checkout(dbapi_connection, record, proxy):
+        checked_in_at = record.info.get('checked_in_at')
+        if checked_in_at is None or time.monotonic() - checked_in_at < DB_PRE_PING_IDLE_SECONDS:
+            return
+        stats = getattr(engine.pool, 'stats', None)
+        if stats is not None:
+            stats.pings += 1
+        try:
+            alive = engine.dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            alive = False
+            cause = e
+        else:
+            cause = None
+        if not alive:
+            if stats is not None:
+                stats.stale += 1
+            raise exc.DisconnectionError('connection failed idle pre-ping') from cause
+
+
+def pool_status(engine) -> dict:
+    pool = engine.pool
+    status = {
+        'size': pool.size(),
+        'checked_in': pool.checkedin(),
+        'checked_out': pool.checkedout(),
+        'overflow': max(pool.overflow(), 0),
+        'max_overflow': DB_MAX_OVERFLOW,
+    }
+    stats = getattr(pool, 'stats', None)
+    if stats is not None:
+        status.update(asdict(stats))
+        status['wait_seconds'] = round(stats.wait_seconds, 3)
+    return status
+
+
+def pool_settings() -> dict:
+    return {
+        'mode': DB_POOL_MODE,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pre_ping': DB_PRE_PING,
+        'statement_cache_size': DB_STATEMENT_CACHE_SIZE,
+    }
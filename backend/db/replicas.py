@@ -0,0 +1,324 @@
+"""
+Read replicas for read-only request handlers.
+
+DATABASE_READ_URL names one or more replicas (comma-separated). Handlers that only read
+declare `db: AsyncSession = Depends(get_read_db)` (after `get_current_user`) instead of
+get_db, and get a session on a healthy replica, picked round robin. They get the
+primary instead when:
+
+- no replica is configured or none is healthy. A background task checks every replica
+  each REPLICA_CHECK_INTERVAL_SECONDS and takes it out of rotation while it is
+  unreachable or its replay lag is above REPLICA_MAX_LAG_SECONDS. A replica whose
+  connection fails during a request is taken out straight away, until its next good
+  check, and that request carries on against the primary (see ReadSession).
+- the user wrote recently (read-your-writes). Any INSERT/UPDATE/DELETE sent to the
+  primary while handling a user's request keeps that user's reads on the primary for
+  READ_YOUR_WRITES_SECONDS. Handlers whose writes change what *other* users read call
+  `mark_written` for them (e.g. linking a child marks the parent).
+
+Stickiness is tracked per worker: a request served by another worker right after a
+write can still read from a replica, at most REPLICA_MAX_LAG_SECONDS behind. Without
+DATABASE_READ_URL, get_read_db is get_db.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from db.pool import asyncpg_connect_args, engine_options, install_idle_ping
+from db.session import AsyncSessionLocal, async_engine, to_async_url
+
+DATABASE_READ_URLS = [url.strip() for url in os.getenv('DATABASE_READ_URL', '').split(',') if url.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '5'))
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv('REPLICA_CHECK_INTERVAL_SECONDS', '5'))
+REPLICA_CHECK_TIMEOUT_SECONDS = float(os.getenv('REPLICA_CHECK_TIMEOUT_SECONDS', '2'))
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', '10'))
+READ_YOUR_WRITES_MAX_USERS = int(os.getenv('READ_YOUR_WRITES_MAX_USERS', '100000'))
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind. A standby that has replayed everything it received
+# counts as current (pg_last_xact_replay_timestamp alone would grow while the primary
+# is idle); a plain database standing in for a replica is always current.
+_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+# what a replica that went away mid-request raises
+_REPLICA_ERRORS = (OperationalError, InterfaceError, OSError)
+
+_WRITE = re.compile(r'\s*(INSERT|UPDATE|DELETE|MERGE)\b|\s*WITH\b.*\b(INSERT|UPDATE|DELETE)\b', re.IGNORECASE | re.DOTALL)
+
+_request_user: ContextVar[Optional[str]] = ContextVar('read_routing_user', default=None)
+
+
+class RecentWrites:
+    """Users who wrote in the last `window` seconds, as an LRU of deadlines capped at max_users."""
+
+    def __init__(self, window: float = READ_YOUR_WRITES_SECONDS, max_users: int = READ_YOUR_WRITES_MAX_USERS):
+        self.window = window
+        self.max_users = max_users
+        self._until = OrderedDict()
+
+    def mark(self, user_id: str) -> None:
+        self._until[user_id] = time.monotonic() + self.window
+        self._until.move_to_end(user_id)
+        if len(self._until) > self.max_users:
+            self._until.popitem(last=False)
+
+    def is_recent(self, user_id: str) -> bool:
+        deadline = self._until.get(user_id)
+        if deadline is None:
+            return False
+        if deadline < time.monotonic():
+            del self._until[user_id]
+            return False
+        return True
+
+    def __len__(self) -> int:
+        return len(self._until)
+
+
+recent_writes = RecentWrites()
+
+
+def bind_user(user_id: str) -> None:
+    """Attribute this request's statements to `user_id` (called by get_current_user)."""
+    _request_user.set(user_id)
+
+
+def mark_written(*user_ids: Optional[str]) -> None:
+    """Keep these users' reads on the primary for a while (None ids are ignored)."""
+    for user_id in user_ids:
+        if user_id is not None:
+            recent_writes.mark(user_id)
+
+
+@dataclass
+class Replica:
+    name: str  # host/database, for logs and metrics (no credentials)
+    engine: AsyncEngine
+    sessionmaker: sessionmaker
+    healthy: bool = False  # out of rotation until the first check passes
+    lag_seconds: Optional[float] = None
+    last_error: Optional[str] = None
+    reads: int = 0
+    failures: int = 0
+
+    def stats(self) -> dict:
+        return {
+            'healthy': self.healthy,
+            'lag_seconds': None if self.lag_seconds is None else round(self.lag_seconds, 3),
+            'last_error': self.last_error,
+            'reads': self.reads,
+            'failures': self.failures,
+        }
+
+
+class ReplicaSet:
+    def __init__(self, urls: List[str]):
+        self.replicas = [self._connect(url) for url in urls]
+        self._next = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _connect(url: str) -> Replica:
+        async_url, connect_args = to_async_url(url)
+        engine = create_async_engine(
+            async_url, connect_args={**connect_args, **asyncpg_connect_args()}, **engine_options(async_driver=True)
+        )
+        install_idle_ping(engine.sync_engine)
+        parsed = make_url(url)
+        return Replica(
+            name=f'{parsed.host}/{parsed.database}',
+            engine=engine,
+            sessionmaker=sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False),
+        )
+
+    def pick(self) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        self._next = (self._next + 1) % len(healthy)
+        return healthy[self._next]
+
+    def _set_health(self, replica: Replica, healthy: bool, error: Optional[str] = None) -> None:
+        if healthy != replica.healthy:
+            if healthy:
+                logger.info('replica back in rotation', extra={'replica': replica.name, 'lag_seconds': replica.lag_seconds})
+            else:
+                logger.warning('replica out of rotation', extra={
+                    'replica': replica.name, 'lag_seconds': replica.lag_seconds, 'error': error,
+                })
+        replica.healthy = healthy
+        replica.last_error = error
+
+    async def check(self, replica: Replica) -> None:
+        async def measure():
+            async with replica.engine.connect() as conn:
+                return float(await conn.scalar(_LAG_QUERY))
+
+        try:
+            replica.lag_seconds = await asyncio.wait_for(measure(), REPLICA_CHECK_TIMEOUT_SECONDS)
+        except Exception as e:
+            self._set_health(replica, False, f'{type(e).__name__}: {e}')
+            return
+        if replica.lag_seconds > REPLICA_MAX_LAG_SECONDS:
+            self._set_health(replica, False, f'lag {replica.lag_seconds:.1f}s over {REPLICA_MAX_LAG_SECONDS}s')
+        else:
+            self._set_health(replica, True)
+
+    def report_failure(self, replica: Replica, error: Exception) -> None:
+        replica.failures += 1
+        self._set_health(replica, False, f'{type(error).__name__}: {error}')
+
+    async def _run(self):
+        while True:
+            await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+            await asyncio.sleep(REPLICA_CHECK_INTERVAL_SECONDS)
+
+    def start(self):
+        if self.replicas and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def stats(self) -> dict:
+        return {replica.name: replica.stats() for replica in self.replicas}
+
+
+replica_set = ReplicaSet(DATABASE_READ_URLS)
+
+
+def install_write_tracking(engine) -> None:
+    """Mark the request's user as a recent writer whenever a write goes to `engine`."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _track(conn, cursor, statement, parameters, context, executemany):
+        user_id = _request_user.get()
+        if user_id is not None and _WRITE.match(statement):
+            recent_writes.mark(user_id)
+
+
+if replica_set.replicas:
+    install_write_tracking(async_engine.sync_engine)
+
+
+def replica_for(user_id: Optional[str]) -> Optional[Replica]:
+    """The replica to read from for `user_id`, or None for the primary."""
+    if user_id is None or recent_writes.is_recent(user_id):
+        return None
+    return replica_set.pick()
+
+
+def read_sessionmaker(user_id: Optional[str]) -> sessionmaker:
+    """Session factory for reads on behalf of `user_id` (for work outside get_read_db)."""
+    replica = replica_for(user_id)
+    return replica.sessionmaker if replica else AsyncSessionLocal
+
+
+class ReadSession:
+    """A replica session that moves the rest of the request to the primary if the replica fails.
+
+    Reads are safe to repeat, so a statement that fails with a connection error is
+    taken off the replica (reported to the replica set) and re-run on a fresh primary
+    session, which then serves the remainder of the request. A stream that fails after
+    it started yielding rows cannot be replayed and raises as before. Anything else is
+    passed through to the current session.
+    """
+
+    def __init__(self, replica: Replica, session: AsyncSession):
+        self.replica: Optional[Replica] = replica
+        self._session = session
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    async def _fall_back(self, error: Exception) -> None:
+        replica, self.replica = self.replica, None
+        replica_set.report_failure(replica, error)
+        logger.warning('replica failed mid-request, reading from the primary', extra={
+            'replica': replica.name, 'error': f'{type(error).__name__}: {error}',
+        })
+        try:
+            await self._session.close()
+        except Exception:
+            pass  # the connection is gone already
+        self._session = AsyncSessionLocal()
+
+    async def _run(self, method: str, *args, **kwargs):
+        try:
+            return await getattr(self._session, method)(*args, **kwargs)
+        except _REPLICA_ERRORS as e:
+            if self.replica is None:
+                raise
+            await self._fall_back(e)
+        return await getattr(self._session, method)(*args, **kwargs)
+
+    async def execute(self, *args, **kwargs):
+        return await self._run('execute', *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await self._run('scalar', *args, **kwargs)
+
+    async def scalars(self, *args, **kwargs):
+        return await self._run('scalars', *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await self._run('get', *args, **kwargs)
+
+    async def stream(self, *args, **kwargs):
+        return await self._run('stream', *args, **kwargs)
+
+    async def connection(self, *args, **kwargs):
+        return await self._run('connection', *args, **kwargs)
+
+    async def close(self) -> None:
+        await self._session.close()
+
+
+async def get_read_db():
+    """get_db for read-only handlers: a replica session, or the primary (see module docstring).
+
+    Declare it after get_current_user: until the user is known, reads go to the primary.
+    """
+    replica = replica_for(_request_user.get())
+    if replica is None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    replica.reads += 1
+    db = ReadSession(replica, replica.sessionmaker())
+    try:
+        yield db
+    except _REPLICA_ERRORS as e:
+        # failed where the statement could not be re-run (e.g. mid-stream)
+        if db.replica is not None:
+            replica_set.report_failure(db.replica, e)
+        raise
+    finally:
+        await db.close()
@@ -0,0 +1,206 @@
+"""
+Structured logging that never blocks the event loop.
+
+Modules log through the standard library (`logger = logging.getLogger(__name__)`).
+`setup_logging()` routes every record through a bounded in-memory queue to a background
+thread that formats it as one JSON object per line and writes it to stdout, so a log
+call on the request path costs a dict copy and a queue put. If the queue is full the
+record is dropped and counted rather than waiting on stdout.
+
+Every record carries the id of the request it was logged under (see
+`RequestIdMiddleware`); anything passed via `extra=` becomes a field of its own.
+
+Settings (env):
+
+    LOG_LEVEL               root level (default INFO)
+    LOG_LEVELS              per-logger overrides, e.g. "auth=DEBUG,sqlalchemy.engine=INFO"
+    LOG_FORMAT              json | text (default json; text is easier to read locally)
+    LOG_DEBUG_SAMPLE_RATE   share of DEBUG records kept (default 1.0). A record can set its
+                            own rate with extra={'sample_rate': 0.01}, for high-volume events
+    LOG_QUEUE_SIZE          records buffered for the writer thread (default 10000)
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+import orjson
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '1.0'))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+_request_id: ContextVar[Optional[str]] = ContextVar('request_id', default=None)
+
+# attributes every LogRecord has; anything else on a record came from `extra=`
+_STANDARD_ATTRS = set(logging.LogRecord('', 0, '', 0, '', None, None).__dict__) | {
+    'message', 'asctime', 'request_id', 'sample_rate', 'taskName',
+}
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+class RequestIdMiddleware:
+    """Tags each HTTP request with an id (the caller's X-Request-ID, or a new one).
+
+    The id is attached to every log record written while handling the request and
+    echoed in the X-Request-ID response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope['headers']:
+            if name == b'x-request-id':
+                request_id = value.decode('latin-1')[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = _request_id.set(request_id)
+
+        async def send_with_id(message):
+            if message['type'] == 'http.response.start':
+                headers = list(message.get('headers', []))
+                headers.append((b'x-request-id', request_id.encode('latin-1')))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _request_id.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extra = {k: v for k, v in record.__dict__.items() if k not in _STANDARD_ATTRS}
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            extra = {'request_id': request_id, **extra}
+        if extra:
+            line += ' ' + ' '.join(f'{k}={v}' for k, v in extra.items())
+        return line
+
+
+class QueueingHandler(logging.handlers.QueueHandler):
+    """Samples, stamps the request id and enqueues without ever blocking."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.sampled_out = 0
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.DEBUG:
+            rate = getattr(record, 'sample_rate', LOG_DEBUG_SAMPLE_RATE)
+            if rate < 1.0 and random.random() >= rate:
+                self.sampled_out += 1
+                return False
+        return super().handle(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # runs in the calling thread: resolve everything that depends on the caller's
+        # context (request id, message args, the live traceback) before handing it over
+        record = logging.makeLogRecord(record.__dict__)
+        record.request_id = _request_id.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler: Optional[QueueingHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _apply_levels() -> None:
+    logging.getLogger().setLevel(LOG_LEVEL)
+    for item in filter(None, (part.strip() for part in LOG_LEVELS.split(','))):
+        name, _, level = item.partition('=')
+        logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+
+def setup_logging() -> None:
+    """Install the queue handler on the root logger and start the writer thread (idempotent)."""
+    global _handler, _listener
+    if _listener is not None:
+        return
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if LOG_FORMAT == 'text' else JsonFormatter())
+    _handler = QueueingHandler(log_queue)
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_handler)
+    # uvicorn installs its own (synchronous) handlers before loading the app; send its
+    # error and access logs through the queue as well
+    for name in ('uvicorn', 'uvicorn.error', 'uvicorn.access'):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+    _apply_levels()
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats() -> dict:
+    if _handler is None:
+        return {'queued': 0, 'dropped': 0, 'sampled_out': 0}
+    return {'queued': _handler.queue.qsize(), 'dropped': _handler.dropped, 'sampled_out': _handler.sampled_out}
@@ -2,12 +2,30 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 # Use package-style imports without leading dot so the module can be run as a script from the
 # backend directory (python main.py) without triggering relative-import-with-no-parent errors.
-from db.session import engine, Base
+from db.migrate import check_schema
+from api.responses import ORJSONResponse
 from api.router import router as api_router
 from auth.router import router as auth_router
 from api.linking import router as linking_router
+from api.violations import router as violations_router
+from api.usage import router as usage_router
+from api.parent import router as parent_router
+from api.transactions import router as transactions_router
+from api.payments import router as payments_router
+from api.export import router as export_router
+from api.sync import router as sync_router
+from auth.oauth import google_keys
+from auth.revocation import revocation_listener
+from db.replicas import replica_set
+from services.scheduler import maintenance_scheduler
+from services.metrics import MetricsMiddleware, install_query_hooks, metrics_endpoint, register_routes
+from services.profiler import SQL_PROFILER_ENABLED, ProfilerMiddleware
+from logs import RequestIdMiddleware, setup_logging
 
-app = FastAPI(title="Guilt Eater Backend")
+# JSON logs written by a background thread; levels and sampling come from LOG_* env vars
+setup_logging()
+
+app = FastAPI(title="Guilt Eater Backend", default_response_class=ORJSONResponse)
 
 # minimal CORS for frontend during oauth redirect
 app.add_middleware(
@@ -17,16 +35,54 @@ app.add_middleware(
 	allow_methods=["*"],
 	allow_headers=["*"],
 )
+# per-route latency and per-request SQL counts, scraped from /metrics
+app.add_middleware(MetricsMiddleware)
+install_query_hooks()
+if SQL_PROFILER_ENABLED:
+	# dev only: per-request statement log, N+1 hints and Server-Timing headers
+	app.add_middleware(ProfilerMiddleware)
+# outermost, so every log record and profile of a request shares its X-Request-ID
+app.add_middleware(RequestIdMiddleware)
+
+@app.on_event("startup")
+async def on_startup():
+	# one query against schema_version; applies pending migrations (db/migrate.py) if behind
+	await check_schema()
 
 @app.on_event("startup")
-def on_startup():
-	# create DB tables
-	Base.metadata.create_all(bind=engine)
+async def start_background_tasks():
+	# keep Google's id_token signing keys warm so /auth/token verifies without a network hop
+	google_keys.start()
+	# follow parent session rotations published by every worker (single-device enforcement)
+	revocation_listener.start()
+	# housekeeping jobs (expired linking codes, finished goals, ...); one worker runs each interval
+	maintenance_scheduler.start()
+	# health and lag checks that put read replicas (DATABASE_READ_URL) in and out of rotation
+	replica_set.start()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+	await google_keys.stop()
+	await revocation_listener.stop()
+	await maintenance_scheduler.stop()
+	await replica_set.stop()
 
 app.include_router(api_router, prefix="/api")
 app.include_router(auth_router, prefix="/auth")
 app.include_router(linking_router, prefix="/api/linking")
+app.include_router(violations_router, prefix="/api/violations")
+app.include_router(usage_router, prefix="/api/usage")
+app.include_router(parent_router, prefix="/api/parent")
+app.include_router(transactions_router, prefix="/api/transactions")
+app.include_router(payments_router, prefix="/api/payments")
+app.include_router(export_router, prefix="/api/export")
+app.include_router(sync_router, prefix="/api/sync")
+
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
 
 @app.get("/")
 def root():
 	return {"message": "Guilt Eater Backend - schema initialized"}
+
+# create the per-route metric label sets up front (keep this after the last route)
+register_routes(app)
@@ -0,0 +1,137 @@
+"""
+Initial schema: users, goals, linking_codes, wallet_ledger, violations, transactions.
+
+This is the schema the app used to create with `create_all` on startup, frozen as
+plain DDL. Every statement is IF NOT EXISTS so databases created that way are adopted
+as they are; the later migrations bring them (and fresh databases) up to date.
+"""
+from sqlalchemy import text
+
+ENUMS = {
+    'roleenum': ('parent', 'child', 'individual'),
+    'goalstatus': ('active', 'completed', 'cancelled'),
+    'walletstatus': ('active', 'completed', 'withdrawn'),
+    'transactiontype': ('deposit', 'penalty', 'withdrawal'),
+    'transactionstatus': ('success', 'failed', 'pending'),
+}
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id VARCHAR NOT NULL,
+        email VARCHAR NOT NULL,
+        name VARCHAR,
+        picture VARCHAR,
+        role roleenum NOT NULL,
+        parent_id VARCHAR,
+        session_token VARCHAR,
+        created_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (id),
+        FOREIGN KEY (parent_id) REFERENCES users (id)
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+    """
+    CREATE TABLE IF NOT EXISTS goals (
+        id VARCHAR NOT NULL,
+        user_id VARCHAR NOT NULL,
+        app_name VARCHAR NOT NULL,
+        daily_limit_minutes INTEGER NOT NULL,
+        start_date TIMESTAMP WITHOUT TIME ZONE,
+        end_date TIMESTAMP WITHOUT TIME ZONE,
+        max_warnings INTEGER,
+        penalty_percent FLOAT,
+        status goalstatus,
+        PRIMARY KEY (id),
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_goals_user_id ON goals (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS linking_codes (
+        id VARCHAR NOT NULL,
+        parent_id VARCHAR NOT NULL,
+        code VARCHAR(6) NOT NULL,
+        is_used BOOLEAN,
+        used_by_user_id VARCHAR,
+        created_at TIMESTAMP WITHOUT TIME ZONE,
+        expires_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        used_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (id),
+        FOREIGN KEY (parent_id) REFERENCES users (id),
+        FOREIGN KEY (used_by_user_id) REFERENCES users (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_linking_codes_parent_id ON linking_codes (parent_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_linking_codes_code ON linking_codes (code)",
+    """
+    CREATE TABLE IF NOT EXISTS violations (
+        id VARCHAR NOT NULL,
+        user_id VARCHAR NOT NULL,
+        goal_id VARCHAR NOT NULL,
+        app_name VARCHAR NOT NULL,
+        used_minutes INTEGER NOT NULL,
+        limit_minutes INTEGER NOT NULL,
+        warning_number INTEGER NOT NULL,
+        penalty_applied BOOLEAN,
+        penalty_amount FLOAT,
+        timestamp TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (id),
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (goal_id) REFERENCES goals (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_violations_user_id ON violations (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_violations_goal_id ON violations (goal_id)",
+    """
+    CREATE TABLE IF NOT EXISTS wallet_ledger (
+        id VARCHAR NOT NULL,
+        user_id VARCHAR NOT NULL,
+        goal_id VARCHAR NOT NULL,
+        deposit_amount FLOAT NOT NULL,
+        current_balance FLOAT NOT NULL,
+        total_penalty FLOAT,
+        total_warnings INTEGER,
+        status walletstatus,
+        created_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (id),
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (goal_id) REFERENCES goals (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_wallet_ledger_user_id ON wallet_ledger (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_wallet_ledger_goal_id ON wallet_ledger (goal_id)",
+    """
+    CREATE TABLE IF NOT EXISTS transactions (
+        id VARCHAR NOT NULL,
+        user_id VARCHAR NOT NULL,
+        goal_id VARCHAR,
+        wallet_id VARCHAR,
+        razorpay_payment_id VARCHAR,
+        type transactiontype NOT NULL,
+        amount FLOAT NOT NULL,
+        status transactionstatus,
+        timestamp TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (id),
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (goal_id) REFERENCES goals (id),
+        FOREIGN KEY (wallet_id) REFERENCES wallet_ledger (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_transactions_user_id ON transactions (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_goal_id ON transactions (goal_id)",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_wallet_id ON transactions (wallet_id)",
+]
+
+
+def upgrade(conn):
+    for name, values in ENUMS.items():
+        labels = ', '.join(f"'{v}'" for v in values)
+        conn.execute(text(f"""
+            DO $$ BEGIN
+                CREATE TYPE {name} AS ENUM ({labels});
+            EXCEPTION WHEN duplicate_object THEN NULL;
+            END $$
+        """))
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
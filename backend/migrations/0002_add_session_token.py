@@ -0,0 +1,9 @@
+"""
+Add the session_token column to users.
+Parent accounts are limited to a single signed-in device; the token identifies it.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS session_token VARCHAR"))
@@ -0,0 +1,22 @@
+"""
+Add client_event_id to the violations table.
+Devices send a client_event_id with every violation so re-sent batches to
+POST /api/violations/batch are idempotent.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("""
+        ALTER TABLE violations
+        ADD COLUMN IF NOT EXISTS client_event_id VARCHAR
+    """))
+
+    result = conn.execute(text("""
+        SELECT 1 FROM pg_constraint WHERE conname = 'uq_violations_user_client_event'
+    """))
+    if not result.fetchone():
+        conn.execute(text("""
+            ALTER TABLE violations
+            ADD CONSTRAINT uq_violations_user_client_event UNIQUE (user_id, client_event_id)
+        """))
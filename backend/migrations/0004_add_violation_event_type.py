@@ -0,0 +1,31 @@
+"""
+Add event_type and settled_at to the violations table.
+event_type distinguishes bypass events (uninstall, permission revoke, safe mode)
+from ordinary limit violations; settled_at marks violations whose warnings and
+penalties have been applied, so the nightly penalty engine skips them.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("""
+        DO $$ BEGIN
+            CREATE TYPE violationtype AS ENUM
+                ('limit_exceeded', 'uninstall_attempt', 'permission_revoke', 'safe_mode');
+        EXCEPTION WHEN duplicate_object THEN NULL;
+        END $$
+    """))
+    conn.execute(text("""
+        ALTER TABLE violations
+        ADD COLUMN IF NOT EXISTS event_type violationtype NOT NULL DEFAULT 'limit_exceeded'
+    """))
+
+    result = conn.execute(text("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_name='violations' AND column_name='settled_at'
+    """))
+    if not result.fetchone():
+        conn.execute(text("ALTER TABLE violations ADD COLUMN settled_at TIMESTAMP"))
+        # everything recorded so far was settled when it was written
+        conn.execute(text("UPDATE violations SET settled_at = timestamp"))
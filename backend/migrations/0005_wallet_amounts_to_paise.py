@@ -0,0 +1,40 @@
+"""
+Store money as integer paise.
+Converts wallet_ledger.deposit_amount/current_balance/total_penalty,
+transactions.amount and violations.penalty_amount from rupee floats to BIGINT
+paise (₹1 = 100), and adds a non-negative balance check on wallet_ledger.
+"""
+from sqlalchemy import text
+
+COLUMNS = [
+    ('wallet_ledger', 'deposit_amount'),
+    ('wallet_ledger', 'current_balance'),
+    ('wallet_ledger', 'total_penalty'),
+    ('transactions', 'amount'),
+    ('violations', 'penalty_amount'),
+]
+
+
+def upgrade(conn):
+    for table, column in COLUMNS:
+        result = conn.execute(text("""
+            SELECT data_type
+            FROM information_schema.columns
+            WHERE table_name = :table AND column_name = :column
+        """), {'table': table, 'column': column})
+        row = result.fetchone()
+        if row is None or row[0] == 'bigint':
+            continue
+        conn.execute(text(f"""
+            ALTER TABLE {table}
+            ALTER COLUMN {column} TYPE BIGINT USING round({column} * 100)::BIGINT
+        """))
+
+    result = conn.execute(text("""
+        SELECT 1 FROM pg_constraint WHERE conname = 'ck_wallet_ledger_balance_non_negative'
+    """))
+    if not result.fetchone():
+        conn.execute(text("""
+            ALTER TABLE wallet_ledger
+            ADD CONSTRAINT ck_wallet_ledger_balance_non_negative CHECK (current_balance >= 0)
+        """))
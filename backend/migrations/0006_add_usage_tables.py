@@ -0,0 +1,80 @@
+"""
+Create the usage time-series tables: daily_usage (partitioned by month, with a default
+partition) and usage_rollups, plus the trigger that keeps weekly/monthly rollups
+current through inserts, updates and deletes. Monthly partitions are created by the
+ensure_usage_partitions scheduler job.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS usage_rollups (
+        user_id VARCHAR NOT NULL,
+        app_name VARCHAR NOT NULL,
+        period VARCHAR(5) NOT NULL,
+        period_start DATE NOT NULL,
+        minutes BIGINT NOT NULL,
+        PRIMARY KEY (user_id, app_name, period, period_start),
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS daily_usage (
+        user_id VARCHAR NOT NULL,
+        app_name VARCHAR NOT NULL,
+        day DATE NOT NULL,
+        goal_id VARCHAR,
+        minutes INTEGER NOT NULL,
+        updated_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (user_id, app_name, day),
+        CONSTRAINT ck_daily_usage_minutes_non_negative CHECK (minutes >= 0),
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (goal_id) REFERENCES goals (id)
+    ) PARTITION BY RANGE (day)
+    """,
+    "CREATE TABLE IF NOT EXISTS daily_usage_default PARTITION OF daily_usage DEFAULT",
+    # Every write to a daily row adds its change in minutes to its week and month, so
+    # rollups stay exact under concurrent uploads without ever re-aggregating. A delete
+    # takes the row's minutes back out; an update that moves the row to another user,
+    # app or day (or partition, which Postgres runs as a delete and an insert) moves them.
+    """
+    CREATE OR REPLACE FUNCTION usage_rollup_add(p_user_id varchar, p_app_name varchar, p_day date, p_delta bigint)
+    RETURNS void AS $$
+    BEGIN
+        IF p_delta <> 0 THEN
+            INSERT INTO usage_rollups (user_id, app_name, period, period_start, minutes)
+            VALUES (p_user_id, p_app_name, 'week', CAST(date_trunc('week', p_day) AS date), p_delta),
+                   (p_user_id, p_app_name, 'month', CAST(date_trunc('month', p_day) AS date), p_delta)
+            ON CONFLICT (user_id, app_name, period, period_start)
+            DO UPDATE SET minutes = usage_rollups.minutes + EXCLUDED.minutes;
+        END IF;
+    END $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION usage_rollup_apply() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND (NEW.user_id, NEW.app_name, NEW.day) = (OLD.user_id, OLD.app_name, OLD.day) THEN
+            PERFORM usage_rollup_add(NEW.user_id, NEW.app_name, NEW.day, NEW.minutes - OLD.minutes);
+            RETURN NULL;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM usage_rollup_add(OLD.user_id, OLD.app_name, OLD.day, -OLD.minutes);
+        END IF;
+        IF TG_OP IN ('UPDATE', 'INSERT') THEN
+            PERFORM usage_rollup_add(NEW.user_id, NEW.app_name, NEW.day, NEW.minutes);
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS daily_usage_rollup ON daily_usage",
+    """
+    CREATE TRIGGER daily_usage_rollup
+        AFTER INSERT OR DELETE OR UPDATE OF minutes, user_id, app_name, day ON daily_usage
+        FOR EACH ROW EXECUTE FUNCTION usage_rollup_apply()
+    """,
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
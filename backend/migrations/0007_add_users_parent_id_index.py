@@ -0,0 +1,9 @@
+"""
+Index users.parent_id.
+The parent dashboard and my-children look children up by parent_id.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_parent_id ON users (parent_id)"))
@@ -0,0 +1,16 @@
+"""
+Add updated_at to the users table.
+Profile and family endpoints derive their ETags from it.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    result = conn.execute(text("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_name='users' AND column_name='updated_at'
+    """))
+    if not result.fetchone():
+        conn.execute(text("ALTER TABLE users ADD COLUMN updated_at TIMESTAMP"))
+        conn.execute(text("UPDATE users SET updated_at = COALESCE(created_at, timezone('utc', now()))"))
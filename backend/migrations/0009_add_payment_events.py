@@ -0,0 +1,41 @@
+"""
+Create payment_events, the inbox the Razorpay webhook writes to, with a partial index
+over the events still waiting to be applied and one over the events that failed and
+need manual handling (such as a captured payment for a missing or inactive wallet).
+Also makes transactions.razorpay_payment_id unique (where set) so a payment can only be
+credited once.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS payment_events (
+        id VARCHAR NOT NULL,
+        event VARCHAR NOT NULL,
+        payload TEXT NOT NULL,
+        received_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        processed_at TIMESTAMP WITHOUT TIME ZONE,
+        failed_at TIMESTAMP WITHOUT TIME ZONE,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error VARCHAR,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_payment_events_pending
+    ON payment_events (received_at) WHERE processed_at IS NULL AND failed_at IS NULL
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_payment_events_failed
+    ON payment_events (failed_at) WHERE failed_at IS NOT NULL
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_transactions_razorpay_payment_id
+    ON transactions (razorpay_payment_id) WHERE razorpay_payment_id IS NOT NULL
+    """,
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,23 @@
+"""
+Replace the single-column user_id/goal_id indexes on transactions and violations with
+composite (user_id, timestamp, id) and (goal_id, timestamp, id) indexes, so the keyset
+paginated history lists read each page straight off an index however deep the cursor
+is. The composites also serve every lookup the old indexes did (same leading column).
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS ix_transactions_user_timestamp_id ON transactions (user_id, timestamp, id)",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_goal_timestamp_id ON transactions (goal_id, timestamp, id)",
+    "CREATE INDEX IF NOT EXISTS ix_violations_user_timestamp_id ON violations (user_id, timestamp, id)",
+    "CREATE INDEX IF NOT EXISTS ix_violations_goal_timestamp_id ON violations (goal_id, timestamp, id)",
+    "DROP INDEX IF EXISTS ix_transactions_user_id",
+    "DROP INDEX IF EXISTS ix_transactions_goal_id",
+    "DROP INDEX IF EXISTS ix_violations_user_id",
+    "DROP INDEX IF EXISTS ix_violations_goal_id",
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,80 @@
+"""
+Change versions for delta sync (GET /api/sync).
+
+Every insert or (real) update of a goal or wallet stamps the row's version column with
+the writing transaction's id, pg_current_xact_id() (64-bit, never wraps), and every
+delete records a sync_tombstones row with it, all from triggers so no write path can
+forget. Stamping takes no lock, so wallet writes of one user never queue behind each
+other. Transactions can commit out of xid order, so GET /api/sync hands out the xmin of
+its snapshot as the next cursor: every transaction below it has finished, so nothing can
+still appear below the cursor. A transaction can delete several rows of one user, so
+tombstones share versions and are keyed by (user_id, version, entity, entity_id).
+
+goals and wallet_ledger get (user_id, version) indexes, which replace their plain
+user_id indexes. Existing rows keep version 0 and reach devices through a full sync.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    "ALTER TABLE goals ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0",
+    "ALTER TABLE wallet_ledger ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0",
+    """
+    CREATE TABLE IF NOT EXISTS sync_tombstones (
+        user_id VARCHAR NOT NULL,
+        version BIGINT NOT NULL,
+        entity VARCHAR NOT NULL,
+        entity_id VARCHAR NOT NULL,
+        deleted_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (user_id, version, entity, entity_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_goals_user_version ON goals (user_id, version)",
+    "CREATE INDEX IF NOT EXISTS ix_wallet_ledger_user_version ON wallet_ledger (user_id, version)",
+    "DROP INDEX IF EXISTS ix_goals_user_id",
+    "DROP INDEX IF EXISTS ix_wallet_ledger_user_id",
+    """
+    CREATE OR REPLACE FUNCTION sync_stamp_version() RETURNS trigger AS $$
+    BEGIN
+        NEW.version := pg_current_xact_id()::text::bigint;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION sync_record_tombstone() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO sync_tombstones (user_id, version, entity, entity_id, deleted_at)
+        VALUES (OLD.user_id, pg_current_xact_id()::text::bigint, TG_ARGV[0], OLD.id, timezone('utc', now()))
+        ON CONFLICT DO NOTHING;
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+]
+for table, entity in (('goals', 'goal'), ('wallet_ledger', 'wallet')):
+    STATEMENTS += [
+        f"DROP TRIGGER IF EXISTS {table}_sync_insert ON {table}",
+        f"""
+        CREATE TRIGGER {table}_sync_insert
+            BEFORE INSERT ON {table}
+            FOR EACH ROW EXECUTE FUNCTION sync_stamp_version()
+        """,
+        f"DROP TRIGGER IF EXISTS {table}_sync_update ON {table}",
+        # no-op updates (e.g. a warning counter rewritten with the same value) keep their version
+        f"""
+        CREATE TRIGGER {table}_sync_update
+            BEFORE UPDATE ON {table}
+            FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*) EXECUTE FUNCTION sync_stamp_version()
+        """,
+        f"DROP TRIGGER IF EXISTS {table}_sync_delete ON {table}",
+        f"""
+        CREATE TRIGGER {table}_sync_delete
+            AFTER DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION sync_record_tombstone('{entity}')
+        """,
+    ]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,22 @@
+"""
+Create job_runs: when each maintenance job last started, on any worker. The scheduler
+claims a run by moving started_at forward only if the previous run is at least most of
+an interval old, so workers whose ticks are offset don't each run the job once per
+interval.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS job_runs (
+        name VARCHAR NOT NULL,
+        started_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (name)
+    )
+    """,
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
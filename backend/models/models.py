@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Enum, ForeignKey, Integer, Boolean, Float
+from sqlalchemy import Column, String, Date, DateTime, Enum, ForeignKey, Integer, BigInteger, Boolean, Float, UniqueConstraint, CheckConstraint, Text, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -37,6 +37,13 @@ class TransactionStatus(str, enum.Enum):
     pending = "pending"
 
 
+class ViolationType(str, enum.Enum):
+    limit_exceeded = "limit_exceeded"
+    uninstall_attempt = "uninstall_attempt"
+    permission_revoke = "permission_revoke"
+    safe_mode = "safe_mode"  # Safe mode boot or factory reset
+
+
 def gen_uuid():
     return str(uuid.uuid4())
 
@@ -48,9 +55,10 @@ class User(Base):
     name = Column(String, nullable=True)
     picture = Column(String, nullable=True)
     role = Column(Enum(RoleEnum), nullable=False, default=RoleEnum.individual)
-    parent_id = Column(String, ForeignKey("users.id"), nullable=True)
+    parent_id = Column(String, ForeignKey("users.id"), nullable=True, index=True)
     session_token = Column(String, nullable=True)  # For single device session enforcement (parents only)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # ETag version for profile endpoints
 
     children = relationship("User", backref="parent", remote_side=[id])
     goals = relationship("Goal", back_populates="user")
@@ -77,7 +85,7 @@ class LinkingCode(Base):
 class Goal(Base):
     __tablename__ = "goals"
     id = Column(String, primary_key=True, default=gen_uuid)
-    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
     app_name = Column(String, nullable=False)
     daily_limit_minutes = Column(Integer, nullable=False)
     start_date = Column(DateTime, nullable=True)
@@ -85,59 +93,158 @@ class Goal(Base):
     max_warnings = Column(Integer, default=2)
     penalty_percent = Column(Float, default=10.0)
     status = Column(Enum(GoalStatus), default=GoalStatus.active)
+    version = Column(BigInteger, nullable=False, server_default=text("0"))  # stamped by a trigger on every write
 
     user = relationship("User", back_populates="goals")
     wallets = relationship("WalletLedger", back_populates="goal")
     violations = relationship("Violation", back_populates="goal")
     transactions = relationship("Transaction", back_populates="goal")
 
+    __table_args__ = (
+        Index("ix_goals_user_version", "user_id", "version"),
+    )
+
 
 class WalletLedger(Base):
     __tablename__ = "wallet_ledger"
     id = Column(String, primary_key=True, default=gen_uuid)
-    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
     goal_id = Column(String, ForeignKey("goals.id"), nullable=False, index=True)
-    deposit_amount = Column(Float, nullable=False)
-    current_balance = Column(Float, nullable=False)
-    total_penalty = Column(Float, default=0.0)
+    # Amounts are integer paise (₹1 = 100); update balances through services.wallet
+    deposit_amount = Column(BigInteger, nullable=False)
+    current_balance = Column(BigInteger, nullable=False)
+    total_penalty = Column(BigInteger, default=0)
     total_warnings = Column(Integer, default=0)
     status = Column(Enum(WalletStatus), default=WalletStatus.active)
     created_at = Column(DateTime, default=datetime.utcnow)
+    version = Column(BigInteger, nullable=False, server_default=text("0"))  # stamped by a trigger on every write
 
     user = relationship("User", back_populates="wallets")
     goal = relationship("Goal", back_populates="wallets")
     transactions = relationship("Transaction", back_populates="wallet")
 
+    __table_args__ = (
+        CheckConstraint("current_balance >= 0", name="ck_wallet_ledger_balance_non_negative"),
+        Index("ix_wallet_ledger_user_version", "user_id", "version"),
+    )
+
 
 class Violation(Base):
     __tablename__ = "violations"
     id = Column(String, primary_key=True, default=gen_uuid)
-    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
-    goal_id = Column(String, ForeignKey("goals.id"), nullable=False, index=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    goal_id = Column(String, ForeignKey("goals.id"), nullable=False)
     app_name = Column(String, nullable=False)
     used_minutes = Column(Integer, nullable=False)
     limit_minutes = Column(Integer, nullable=False)
     warning_number = Column(Integer, nullable=False)
     penalty_applied = Column(Boolean, default=False)
-    penalty_amount = Column(Float, default=0.0)
+    penalty_amount = Column(BigInteger, default=0)  # paise
+    event_type = Column(Enum(ViolationType), nullable=False, default=ViolationType.limit_exceeded)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    settled_at = Column(DateTime, nullable=True)  # Set once warnings/penalties for this violation are applied
+    client_event_id = Column(String, nullable=True)  # Device-assigned id; makes re-sent batches idempotent
 
     user = relationship("User")
     goal = relationship("Goal", back_populates="violations")
 
+    __table_args__ = (
+        UniqueConstraint("user_id", "client_event_id", name="uq_violations_user_client_event"),
+        # newest-first history pages (keyset on timestamp, id); see api/pagination.py
+        Index("ix_violations_user_timestamp_id", "user_id", "timestamp", "id"),
+        Index("ix_violations_goal_timestamp_id", "goal_id", "timestamp", "id"),
+    )
+
 
 class Transaction(Base):
     __tablename__ = "transactions"
     id = Column(String, primary_key=True, default=gen_uuid)
-    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
-    goal_id = Column(String, ForeignKey("goals.id"), nullable=True, index=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    goal_id = Column(String, ForeignKey("goals.id"), nullable=True)
     wallet_id = Column(String, ForeignKey("wallet_ledger.id"), nullable=True, index=True)
     razorpay_payment_id = Column(String, nullable=True)
     type = Column(Enum(TransactionType), nullable=False)
-    amount = Column(Float, nullable=False)
+    amount = Column(BigInteger, nullable=False)  # paise
     status = Column(Enum(TransactionStatus), default=TransactionStatus.pending)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="transactions")
     goal = relationship("Goal", back_populates="transactions")
     wallet = relationship("WalletLedger", back_populates="transactions")
+
+    __table_args__ = (
+        # a Razorpay payment is credited at most once, however often its webhook is delivered
+        Index("uq_transactions_razorpay_payment_id", "razorpay_payment_id", unique=True,
+              postgresql_where=text("razorpay_payment_id IS NOT NULL")),
+        Index("ix_transactions_user_timestamp_id", "user_id", "timestamp", "id"),
+        Index("ix_transactions_goal_timestamp_id", "goal_id", "timestamp", "id"),
+    )
+
+
+class DailyUsage(Base):
+    """Minutes of screen time per user, app and day, as last reported by the device.
+
+    Range-partitioned by day (monthly partitions, see services.usage); rows that fall
+    outside the created partitions land in daily_usage_default. The partitioning and the
+    rollup trigger are created by migrations/0006_add_usage_tables.py.
+    """
+    __tablename__ = "daily_usage"
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    app_name = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    goal_id = Column(String, ForeignKey("goals.id"), nullable=True)
+    minutes = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        CheckConstraint("minutes >= 0", name="ck_daily_usage_minutes_non_negative"),
+        {"postgresql_partition_by": "RANGE (day)"},
+    )
+
+
+class UsageRollup(Base):
+    """Weekly (ISO, Monday start) and monthly usage totals, maintained by a trigger on daily_usage."""
+    __tablename__ = "usage_rollups"
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    app_name = Column(String, primary_key=True)
+    period = Column(String(5), primary_key=True)  # 'week' or 'month'
+    period_start = Column(Date, primary_key=True)
+    minutes = Column(BigInteger, nullable=False, default=0)
+
+
+
+class PaymentEvent(Base):
+    """Razorpay webhook deliveries as received, keyed by Razorpay's event id.
+
+    The webhook only inserts here (a redelivery of the same event is a no-op);
+    services.payments applies the events to wallets and transactions in batches.
+    """
+    __tablename__ = "payment_events"
+    id = Column(String, primary_key=True)  # X-Razorpay-Event-Id
+    event = Column(String, nullable=False)  # e.g. payment.captured
+    payload = Column(Text, nullable=False)  # raw request body, as signed
+    received_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = Column(DateTime, nullable=True)
+    failed_at = Column(DateTime, nullable=True)  # needs manual handling (e.g. money captured for an unknown wallet)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_payment_events_pending", "received_at",
+              postgresql_where=text("processed_at IS NULL AND failed_at IS NULL")),
+        Index("ix_payment_events_failed", "failed_at", postgresql_where=text("failed_at IS NOT NULL")),
+    )
+
+
+class SyncTombstone(Base):
+    """A deleted goal or wallet, kept so delta syncs can tell devices to drop it.
+
+    Written by a trigger on delete (migrations/0011_add_sync_versions.py), with the id
+    of the deleting transaction as its version.
+    """
+    __tablename__ = "sync_tombstones"
+    user_id = Column(String, primary_key=True)
+    version = Column(BigInteger, primary_key=True)
+    entity = Column(String, primary_key=True)  # 'goal' or 'wallet'
+    entity_id = Column(String, primary_key=True)
+    deleted_at = Column(DateTime, nullable=False)
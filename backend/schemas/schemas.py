@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, TypeAdapter
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
 
 
 class UserBase(BaseModel):
@@ -19,8 +19,7 @@ class UserRead(UserBase):
     id: str
     created_at: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class GoalBase(BaseModel):
@@ -41,14 +40,14 @@ class GoalRead(GoalBase):
     id: str
     user_id: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class WalletBase(BaseModel):
-    deposit_amount: float
-    current_balance: float
-    total_penalty: Optional[float] = 0.0
+    # amounts in paise
+    deposit_amount: int
+    current_balance: int
+    total_penalty: Optional[int] = 0
     total_warnings: Optional[int] = 0
     status: Optional[str] = "active"
 
@@ -64,8 +63,7 @@ class WalletRead(WalletBase):
     goal_id: str
     created_at: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ViolationBase(BaseModel):
@@ -74,7 +72,7 @@ class ViolationBase(BaseModel):
     limit_minutes: int
     warning_number: int
     penalty_applied: bool = False
-    penalty_amount: float = 0.0
+    penalty_amount: int = 0  # paise
 
 
 class ViolationCreate(ViolationBase):
@@ -82,20 +80,31 @@ class ViolationCreate(ViolationBase):
     goal_id: str
 
 
+class ViolationEvent(BaseModel):
+    """A violation as reported by a device; warning_number and penalty are assigned server-side."""
+    client_event_id: str
+    goal_id: str
+    app_name: str
+    used_minutes: int
+    limit_minutes: int
+    event_type: str = "limit_exceeded"
+    timestamp: Optional[datetime] = None
+
+
 class ViolationRead(ViolationBase):
     id: str
     user_id: str
     goal_id: str
+    event_type: str = "limit_exceeded"
     timestamp: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class TransactionBase(BaseModel):
     razorpay_payment_id: Optional[str]
     type: str
-    amount: float
+    amount: int  # paise
     status: Optional[str] = "pending"
 
 
@@ -112,5 +121,52 @@ class TransactionRead(TransactionBase):
     wallet_id: Optional[str]
     timestamp: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class UsageReport(BaseModel):
+    """A device's running total of minutes spent in one app on one (local) day."""
+    app_name: str
+    day: date
+    minutes: int = Field(..., ge=0, le=1440)
+    goal_id: Optional[str] = None
+
+
+class SyncGoal(GoalRead):
+    version: int
+
+
+class SyncWallet(WalletRead):
+    version: int
+
+
+class SyncTombstoneRead(BaseModel):
+    entity: str  # 'goal' or 'wallet'
+    entity_id: str
+    version: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SyncResponse(BaseModel):
+    """Goals and wallets changed after the client's version, plus deletions.
+
+    With full=True the lists are the complete current state and the client should
+    replace what it has; `version` is what to send as `since` next time.
+    """
+    version: int
+    full: bool
+    goals: List[SyncGoal]
+    wallets: List[SyncWallet]
+    deleted: List[SyncTombstoneRead]
+
+
+# Validators/serializers built once at import; dump_json encodes whole lists in pydantic-core
+violation_list_adapter = TypeAdapter(List[ViolationRead])
+transaction_list_adapter = TypeAdapter(List[TransactionRead])
+sync_response_adapter = TypeAdapter(SyncResponse)
+
+
+def dump_list(adapter: TypeAdapter, rows) -> bytes:
+    """Serialize ORM rows straight to JSON bytes through a precompiled list adapter."""
+    return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
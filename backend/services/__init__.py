@@ -0,0 +1 @@
+# services package: domain logic shared by API handlers and background jobs
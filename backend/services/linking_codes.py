@@ -0,0 +1,161 @@
+"""
+Linking-code allocation.
+
+Instead of guessing random codes and querying the DB until one is free, each worker
+walks a randomly shuffled permutation of the whole 6-digit code space and keeps a
+bitmap of codes it knows are taken, so picking a free code is O(1) in memory
+regardless of occupancy. Codes are freed when they expire unused. A used code keeps
+its row, and with it who used it and when, until purge_linking_codes deletes it after
+LINKING_CODE_RETENTION_DAYS; the bitmap holds it for that long.
+
+The bitmap is only this worker's view, so the INSERT is an upsert on the unique `code`
+column: it succeeds for a new code or one whose previous row expired unused (the row
+is recycled), and returns nothing if another worker holds the code or its row is a
+used one still kept for the record, in which case the next candidate is tried.
+
+Expiries sit in a heap. A code can be released and handed out again before its old
+entry comes up, so every mark bumps the code's generation and heap entries from an
+older generation are skipped instead of freeing the newer allocation.
+"""
+import asyncio
+import heapq
+import os
+from array import array
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.models import LinkingCode, gen_uuid
+
+CODE_SPACE = 1_000_000
+CODE_DIGITS = 6
+# Codes tried per request before giving up (each miss is one DB round trip)
+MAX_ALLOCATION_ATTEMPTS = 20
+# Used/expired linking codes are kept this long (for support questions) before being purged
+LINKING_CODE_RETENTION_DAYS = int(os.getenv('LINKING_CODE_RETENTION_DAYS', '7'))
+
+
+class CodeSpaceExhausted(RuntimeError):
+    pass
+
+
+class LinkingCodeAllocator:
+    def __init__(self, space: int = CODE_SPACE):
+        self.space = space
+        self._order = None  # shuffled permutation of range(space), built on first use
+        self._cursor = 0
+        self._active = bytearray((space + 7) // 8)
+        self._active_count = 0
+        self._expiry: list = []  # heap of (expires_at, code, generation)
+        self._generation = array('I', bytes(4 * space))  # per code, bumped on every mark
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    def _build_order(self):
+        import numpy as np
+        rng = np.random.default_rng(secrets.randbits(128))
+        self._order = rng.permutation(self.space).astype(np.uint32)
+
+    def _is_active(self, n: int) -> bool:
+        return bool(self._active[n >> 3] & (1 << (n & 7)))
+
+    def _mark(self, n: int, expires_at: datetime) -> None:
+        if not self._is_active(n):
+            self._active[n >> 3] |= 1 << (n & 7)
+            self._active_count += 1
+        generation = (self._generation[n] + 1) & 0xFFFFFFFF
+        self._generation[n] = generation
+        heapq.heappush(self._expiry, (expires_at, n, generation))
+
+    def _clear(self, n: int) -> None:
+        if self._is_active(n):
+            self._active[n >> 3] &= ~(1 << (n & 7)) & 0xFF
+            self._active_count -= 1
+
+    def mark_used(self, code: str, used_at: datetime) -> None:
+        """Hold a used code until its row is purged (expired codes are freed automatically)."""
+        self._mark(int(code), used_at + timedelta(days=LINKING_CODE_RETENTION_DAYS))
+
+    def _expire(self, now: datetime) -> None:
+        while self._expiry and self._expiry[0][0] <= now:
+            _, n, generation = heapq.heappop(self._expiry)
+            # a stale entry: the code was released and marked again since
+            if generation == self._generation[n]:
+                self._clear(n)
+
+    def _next_candidate(self) -> int:
+        if self._active_count >= self.space:
+            raise CodeSpaceExhausted('all linking codes are in use')
+        while True:
+            n = int(self._order[self._cursor])
+            self._cursor = (self._cursor + 1) % self.space
+            if not self._is_active(n):
+                return n
+
+    @property
+    def occupancy(self) -> float:
+        return self._active_count / self.space
+
+    async def load(self, db: AsyncSession) -> None:
+        """Seed the bitmap with the codes that are active or used (and not yet purged) in the DB."""
+        async with self._load_lock:
+            if self._loaded:
+                return
+            if self._order is None:
+                self._build_order()
+            result = await db.execute(
+                select(LinkingCode.code, LinkingCode.expires_at, LinkingCode.used_at).where(
+                    or_(LinkingCode.is_used == True, LinkingCode.expires_at > datetime.utcnow())
+                )
+            )
+            for code, expires_at, used_at in result.all():
+                if used_at is not None:
+                    self.mark_used(code, used_at)
+                else:
+                    self._mark(int(code), expires_at)
+            self._loaded = True
+
+    async def allocate(self, db: AsyncSession, parent_id: str, expires_at: datetime) -> str:
+        """Reserve a free code for `parent_id` and return it; the caller commits."""
+        if not self._loaded:
+            await self.load(db)
+        now = datetime.utcnow()
+        self._expire(now)
+
+        for _ in range(MAX_ALLOCATION_ATTEMPTS):
+            n = self._next_candidate()
+            # reserve locally before awaiting so concurrent requests skip this code
+            self._mark(n, expires_at)
+            code = str(n).zfill(CODE_DIGITS)
+            stmt = pg_insert(LinkingCode).values(
+                id=gen_uuid(),
+                parent_id=parent_id,
+                code=code,
+                is_used=False,
+                created_at=now,
+                expires_at=expires_at,
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[LinkingCode.code],
+                set_={
+                    'id': stmt.excluded.id,
+                    'parent_id': stmt.excluded.parent_id,
+                    'created_at': stmt.excluded.created_at,
+                    'expires_at': stmt.excluded.expires_at,
+                },
+                # only take over rows that expired unused; used ones are the record of a link
+                where=(LinkingCode.is_used == False) & (LinkingCode.expires_at <= now),
+            ).returning(LinkingCode.id)
+            result = await db.execute(stmt)
+            if result.first() is not None:
+                return code
+            # another worker holds this code, or it was used; it stays marked until its expiry passes
+
+        raise CodeSpaceExhausted(f'no free linking code after {MAX_ALLOCATION_ATTEMPTS} attempts')
+
+
+linking_code_allocator = LinkingCodeAllocator()
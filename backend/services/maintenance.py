@@ -0,0 +1,85 @@
+"""Housekeeping jobs run by services.scheduler. Each processes at most `batch_size` rows per call."""
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.models import Goal, GoalStatus, LinkingCode, WalletLedger, WalletStatus
+from services.linking_codes import LINKING_CODE_RETENTION_DAYS
+from services.payments import apply_payment_events
+from services.penalty_rules import PENALTY_SETTLEMENT
+from services.scheduler import register_job
+from services.usage import ensure_partitions
+
+# Hour (UTC) at which the nightly penalty engine runs when PENALTY_SETTLEMENT=nightly
+PENALTY_ENGINE_HOUR = int(os.getenv('PENALTY_ENGINE_HOUR', '0'))
+
+
+async def purge_linking_codes(db: AsyncSession, batch_size: int) -> int:
+    """Delete used or expired linking codes older than the retention window.
+
+    Keeps the unique `code` index small for verify-linking-code lookups.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=LINKING_CODE_RETENTION_DAYS)
+    doomed = (
+        select(LinkingCode.id)
+        .where(
+            or_(LinkingCode.is_used == True, LinkingCode.expires_at <= now),
+            func.coalesce(LinkingCode.used_at, LinkingCode.expires_at) < cutoff,
+        )
+        .limit(batch_size)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        delete(LinkingCode).where(LinkingCode.id.in_(doomed)).execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+async def close_expired_goals(db: AsyncSession, batch_size: int) -> int:
+    """Mark active goals past their end_date completed, along with their active wallets."""
+    now = datetime.utcnow()
+    expired = (
+        select(Goal.id)
+        .where(Goal.status == GoalStatus.active, Goal.end_date < now)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(Goal)
+        .where(Goal.id.in_(expired))
+        .values(status=GoalStatus.completed)
+        .returning(Goal.id)
+        .execution_options(synchronize_session=False)
+    )
+    closed = result.scalars().all()
+    if closed:
+        await db.execute(
+            update(WalletLedger)
+            .where(WalletLedger.goal_id.in_(closed), WalletLedger.status == WalletStatus.active)
+            .values(status=WalletStatus.completed)
+            .execution_options(synchronize_session=False)
+        )
+    return len(closed)
+
+
+async def settle_penalties(db: AsyncSession, batch_size: int) -> int:
+    """Run the nightly penalty engine for yesterday (it chunks and commits on its own)."""
+    from services.penalty_engine import run_penalty_engine
+    totals = await asyncio.to_thread(run_penalty_engine)
+    return totals['violations']
+
+
+register_job('purge_linking_codes', purge_linking_codes, seconds=3600)
+register_job('close_expired_goals', close_expired_goals, seconds=900)
+# webhook deliveries wait in the inbox until this runs; small batches keep wallet row locks short
+register_job('apply_payment_events', apply_payment_events, seconds=5, batch_size=100)
+# also runs right at startup so a fresh database gets this month's usage partition
+register_job('ensure_usage_partitions', ensure_partitions, chunked=False, seconds=6 * 3600,
+             next_run_time=datetime.now(timezone.utc))
+if PENALTY_SETTLEMENT == 'nightly':
+    register_job('settle_penalties', settle_penalties, trigger='cron', chunked=False, hour=PENALTY_ENGINE_HOUR, minute=30)
@@ -0,0 +1,262 @@
+"""
+Prometheus metrics, exposed at /metrics.
+
+- MetricsMiddleware (pure ASGI) times every HTTP request and records, per route
+  template and method, latency plus the number of SQL queries and DB time it caused.
+- SQLAlchemy before/after_cursor_execute hooks (installed on every Engine) count
+  queries and their time globally, and add them to the current request's totals via a
+  context variable (SQLAlchemy's async greenlets inherit the request's context).
+- Google id_token verification and JWKS fetches are timed in auth.oauth.
+- Token cache, response cache, connection pool, scheduler job, rate limiter and log queue
+  stats are read at scrape time by a custom collector, so they cost nothing per request.
+
+Label children for every (route, method) are created once at startup by
+`register_routes`, so a request only does a dict lookup and a few observe() calls.
+"""
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match
+
+UNMATCHED_ROUTE = '<unmatched>'
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency', ['route', 'method', 'status'],
+    buckets=_LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL statements executed per HTTP request', ['route', 'method'],
+    buckets=_QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    'http_request_db_seconds', 'Time spent in SQL per HTTP request', ['route', 'method'],
+    buckets=_LATENCY_BUCKETS,
+)
+DB_QUERIES = Counter('db_queries', 'SQL statements executed (requests and background jobs)')
+DB_QUERY_SECONDS = Histogram('db_query_duration_seconds', 'SQL statement latency', buckets=_LATENCY_BUCKETS)
+GOOGLE_VERIFY_SECONDS = Histogram(
+    'google_id_token_verify_seconds', 'Google id_token verification time', ['outcome'],
+    buckets=_LATENCY_BUCKETS,
+)
+GOOGLE_JWKS_FETCH_SECONDS = Histogram(
+    'google_jwks_fetch_seconds', 'Time to fetch Google signing keys', buckets=_LATENCY_BUCKETS,
+)
+GOOGLE_VERIFY_OK = GOOGLE_VERIFY_SECONDS.labels('ok')
+GOOGLE_VERIFY_INVALID = GOOGLE_VERIFY_SECONDS.labels('invalid')
+
+
+class RequestDBStats:
+    __slots__ = ('queries', 'seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+_request_db: ContextVar[Optional[RequestDBStats]] = ContextVar('request_db', default=None)
+
+
+def current_db_stats() -> Optional[RequestDBStats]:
+    """SQL totals of the request being handled (None outside a request)."""
+    return _request_db.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started
+    DB_QUERIES.inc()
+    DB_QUERY_SECONDS.observe(elapsed)
+    stats = _request_db.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += elapsed
+
+
+def install_query_hooks() -> None:
+    """Time every cursor execution on every engine (sync and the async engines' sync side)."""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+# (route template, method) -> (latency child per status class, queries child, db time child)
+_route_children: dict = {}
+# id(route object) -> full path template, for routers that keep included routes nested
+_route_paths: dict = {}
+
+
+def _children(route: str, method: str):
+    children = _route_children.get((route, method))
+    if children is None:
+        children = (
+            {cls: REQUEST_LATENCY.labels(route, method, cls) for cls in STATUS_CLASSES},
+            REQUEST_QUERIES.labels(route, method),
+            REQUEST_DB_SECONDS.labels(route, method),
+        )
+        _route_children[(route, method)] = children
+    return children
+
+
+def _iter_routes(routes):
+    for route in routes:
+        contexts = getattr(route, 'effective_route_contexts', None)
+        if contexts is not None:
+            # newer FastAPI keeps included routers nested; the prefix lives on the context
+            for context in contexts():
+                yield context.original_route, context.path_format
+        else:
+            yield route, getattr(route, 'path_format', None) or getattr(route, 'path', None)
+
+
+def register_routes(app) -> None:
+    """Pre-create label children for every route and method of `app`."""
+    for route, path in _iter_routes(app.routes):
+        _route_paths[id(route)] = path
+        for method in getattr(route, 'methods', None) or ():
+            _children(path, method)
+
+
+def _route_template(scope) -> str:
+    route = scope.get('route')
+    if route is None:
+        # older Starlette versions don't record the matched route in the scope
+        app = scope.get('app')
+        for candidate in getattr(app, 'routes', ()):
+            if candidate.matches(scope)[0] == Match.FULL:
+                route = candidate
+                break
+    if route is None:
+        return UNMATCHED_ROUTE
+    return _route_paths.get(id(route)) or getattr(route, 'path_format', None) or route.path
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDBStats()
+        token = _request_db.set(stats)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_db.reset(token)
+            by_status, queries, db_seconds = _children(_route_template(scope), scope['method'])
+            by_status[STATUS_CLASSES[min(max(status // 100, 1), 5) - 1]].observe(elapsed)
+            queries.observe(stats.queries)
+            db_seconds.observe(stats.seconds)
+
+
+class AppStatsCollector:
+    """Exports the in-process caches', pools' and jobs' own counters at scrape time."""
+
+    def collect(self):
+        from api.rate_limit import rate_limit_stats
+        from api.response_cache import response_cache
+        from auth.token_cache import token_cache
+        from db.pool import pool_status
+        from db.replicas import recent_writes, replica_set
+        from db.session import async_engine, engine
+        from logs import logging_stats
+        from services.scheduler import job_stats
+
+        for prefix, stats in (('token_cache', token_cache.stats()), ('response_cache', response_cache.stats())):
+            gauge = GaugeMetricFamily(f'{prefix}_entries', f'Entries in the {prefix.replace("_", " ")}')
+            gauge.add_metric([], stats['size'])
+            yield gauge
+            for key in ('hits', 'misses', 'evictions', 'not_modified'):
+                if key in stats:
+                    counter = CounterMetricFamily(f'{prefix}_{key}', f'{prefix.replace("_", " ")} {key}')
+                    counter.add_metric([], stats[key])
+                    yield counter
+
+        pools = {'async': pool_status(async_engine), 'sync': pool_status(engine)}
+        pools.update({f'replica:{r.name}': pool_status(r.engine) for r in replica_set.replicas})
+        for key in ('size', 'checked_in', 'checked_out', 'overflow'):
+            gauge = GaugeMetricFamily(f'db_pool_{key}', f'Connection pool {key.replace("_", " ")}', labels=['pool'])
+            for name, status in pools.items():
+                gauge.add_metric([name], status[key])
+            yield gauge
+        for key in ('checkouts', 'connects', 'waits', 'wait_seconds', 'timeouts', 'stale'):
+            counter = CounterMetricFamily(f'db_pool_{key}', f'Connection pool {key.replace("_", " ")}', labels=['pool'])
+            for name, status in pools.items():
+                counter.add_metric([name], status.get(key, 0))
+            yield counter
+
+        replicas = replica_set.stats()
+        for key, help_text in (('healthy', 'Read replica in rotation (1) or not (0)'),
+                               ('lag_seconds', 'Read replica replay lag at the last check')):
+            gauge = GaugeMetricFamily(f'db_replica_{key}', help_text, labels=['replica'])
+            for name, stats in replicas.items():
+                if stats[key] is not None:
+                    gauge.add_metric([name], float(stats[key]))
+            yield gauge
+        for key in ('reads', 'failures'):
+            counter = CounterMetricFamily(f'db_replica_{key}', f'Read replica {key}', labels=['replica'])
+            for name, stats in replicas.items():
+                counter.add_metric([name], stats[key])
+            yield counter
+        gauge = GaugeMetricFamily('read_your_writes_users', 'Users whose reads stick to the primary after a write')
+        gauge.add_metric([], len(recent_writes))
+        yield gauge
+
+        jobs = job_stats()
+        for key in ('runs', 'skipped', 'failures', 'rows', 'total_seconds'):
+            counter = CounterMetricFamily(f'scheduler_job_{key}', f'Maintenance job {key.replace("_", " ")}', labels=['job'])
+            for name, metrics in jobs.items():
+                counter.add_metric([name], metrics[key])
+            yield counter
+
+        limits = rate_limit_stats()
+        gauge = GaugeMetricFamily('rate_limit_keys', 'Clients tracked by each rate limiter', labels=['limiter'])
+        for name, stats in limits.items():
+            gauge.add_metric([name], stats['keys'])
+        yield gauge
+        for key in ('allowed', 'rejected', 'evictions'):
+            counter = CounterMetricFamily(f'rate_limit_{key}', f'Rate limiter {key}', labels=['limiter'])
+            for name, stats in limits.items():
+                counter.add_metric([name], stats[key])
+            yield counter
+
+        logs = logging_stats()
+        gauge = GaugeMetricFamily('log_queue_records', 'Log records waiting for the writer thread')
+        gauge.add_metric([], logs['queued'])
+        yield gauge
+        for key in ('dropped', 'sampled_out'):
+            counter = CounterMetricFamily(f'log_records_{key}', f'Log records {key.replace("_", " ")}')
+            counter.add_metric([], logs[key])
+            yield counter
+
+
+REGISTRY.register(AppStatsCollector())
+
+
+def metrics_endpoint(request: Request) -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,205 @@
+"""
+Razorpay webhook ingestion.
+
+The webhook does as little as possible before acknowledging: it checks the signature
+(HMAC-SHA256 of the raw body with RAZORPAY_WEBHOOK_SECRET) and inserts the body into
+the payment_events inbox under Razorpay's event id, ignoring redeliveries. One INSERT,
+then 200; Razorpay retries deliveries that are slow or fail, so the ack has to be quick
+and the inbox has to be idempotent.
+
+The apply_payment_events job (registered in services.maintenance) drains the inbox in
+batches: it credits wallets for captured payments and records declined ones as failed
+deposits. A payment is credited at most once (transactions.razorpay_payment_id is
+unique), so payment.captured and order.paid for the same payment are both safe to
+apply. Checkout must put the wallet id in the payment notes (`notes.wallet_id`).
+
+Events that fail unexpectedly stay in the inbox and are retried on later runs, up to
+PAYMENT_EVENT_MAX_ATTEMPTS times. Captured money that cannot be credited (unknown or
+inactive wallet, no wallet id) and events out of retries are marked failed (failed_at,
+with the reason in last_error) and logged as errors for manual handling; the job no
+longer picks them up. Events with nothing to apply (other event types, a declined
+payment for an unknown wallet) are marked processed with the reason in last_error.
+"""
+import hashlib
+import hmac
+import logging
+import os
+from datetime import datetime
+from typing import Optional
+
+import orjson
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import load_env
+from models.models import PaymentEvent, Transaction, TransactionStatus
+from services import wallet
+
+load_env()
+
+RAZORPAY_WEBHOOK_SECRET = os.getenv('RAZORPAY_WEBHOOK_SECRET', '')
+PAYMENT_EVENT_MAX_ATTEMPTS = int(os.getenv('PAYMENT_EVENT_MAX_ATTEMPTS', '10'))
+
+# events carrying a payment entity that credit the wallet once the money is ours
+CREDIT_EVENTS = ('payment.captured', 'order.paid')
+FAILED_EVENTS = ('payment.failed',)
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidWebhook(ValueError):
+    pass
+
+
+class UncreditedPayment(Exception):
+    """Money was captured but cannot be credited to a wallet; needs manual handling."""
+
+
+def sign(body: bytes, secret: str = RAZORPAY_WEBHOOK_SECRET) -> str:
+    """Hex HMAC-SHA256 of the body, as Razorpay sends it in X-Razorpay-Signature."""
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body: bytes, signature: Optional[str], secret: str = RAZORPAY_WEBHOOK_SECRET) -> bool:
+    if not secret or not signature:
+        return False
+    return hmac.compare_digest(sign(body, secret), signature)
+
+
+async def record_event(db: AsyncSession, body: bytes, event_id: Optional[str]) -> bool:
+    """Store a verified webhook body in the inbox; False if this event was already received.
+
+    The caller owns the transaction and commits.
+    """
+    try:
+        event_type = orjson.loads(body)['event']
+    except (orjson.JSONDecodeError, KeyError, TypeError):
+        raise InvalidWebhook('body is not a Razorpay event')
+    # Razorpay always sends the header; identical bodies are the same event otherwise
+    event_id = event_id or 'sha256:' + hashlib.sha256(body).hexdigest()
+    result = await db.execute(
+        insert(PaymentEvent)
+        .values(id=event_id, event=event_type, payload=body.decode(), received_at=datetime.utcnow(), attempts=0)
+        .on_conflict_do_nothing(index_elements=[PaymentEvent.id])
+    )
+    return result.rowcount == 1
+
+
+def _payment_entity(payload: dict) -> dict:
+    return ((payload.get('payload') or {}).get('payment') or {}).get('entity') or {}
+
+
+async def _apply_event(db: AsyncSession, event_type: str, payment: dict, seen: dict) -> Optional[str]:
+    """Apply one event; returns why it was skipped, or None when it changed something."""
+    if event_type not in CREDIT_EVENTS + FAILED_EVENTS:
+        return f'ignored {event_type}'
+    def skip(reason: str) -> str:
+        # a declined payment took no money, so skipping it is final; captured money is not
+        if event_type in CREDIT_EVENTS:
+            raise UncreditedPayment(reason)
+        return reason
+
+    payment_id = payment.get('id')
+    wallet_id = (payment.get('notes') or {}).get('wallet_id')
+    amount = payment.get('amount')
+    if not payment_id or not isinstance(amount, int):
+        return skip('no payment entity')
+    if not wallet_id:
+        return skip('no wallet_id in payment notes')
+    if payment.get('currency', 'INR') != 'INR':
+        return skip(f"unsupported currency {payment.get('currency')}")
+
+    status = seen.get(payment_id)
+    if event_type in FAILED_EVENTS:
+        if status is not None:
+            return 'payment already recorded'
+        if await wallet.record_failed_deposit(db, wallet_id, amount, payment_id) is None:
+            return f'no wallet {wallet_id}'
+        seen[payment_id] = TransactionStatus.failed
+        return None
+
+    if status == TransactionStatus.success:
+        return 'payment already credited'
+    if status is not None:
+        # declined first, captured later (late authorisation): replace the failed record
+        await db.execute(
+            Transaction.__table__.delete().where(Transaction.razorpay_payment_id == payment_id)
+        )
+    try:
+        await wallet.deposit(db, wallet_id, amount, razorpay_payment_id=payment_id)
+    except wallet.WalletError as e:  # missing or inactive wallet
+        raise UncreditedPayment(str(e))
+    seen[payment_id] = TransactionStatus.success
+    return None
+
+
+async def apply_payment_events(db: AsyncSession, batch_size: int) -> int:
+    """Apply up to `batch_size` inbox events, oldest first; returns how many were completed.
+
+    Each event runs in its own savepoint, so one bad event doesn't hold back the batch.
+    Events that failed and will be retried are not counted, which ends the scheduler's
+    chunk loop instead of retrying them straight away.
+    """
+    rows = (await db.execute(
+        select(PaymentEvent.id, PaymentEvent.event, PaymentEvent.payload, PaymentEvent.attempts)
+        .where(PaymentEvent.processed_at.is_(None), PaymentEvent.failed_at.is_(None))
+        .order_by(PaymentEvent.received_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )).all()
+    if not rows:
+        return 0
+
+    payments = {}
+    for row in rows:
+        try:
+            payments[row.id] = _payment_entity(orjson.loads(row.payload))
+        except orjson.JSONDecodeError:
+            payments[row.id] = {}
+    # one lookup for every payment in the batch instead of one per event
+    payment_ids = {p['id'] for p in payments.values() if p.get('id')}
+    seen = {}
+    if payment_ids:
+        result = await db.execute(
+            select(Transaction.razorpay_payment_id, Transaction.status)
+            .where(Transaction.razorpay_payment_id.in_(payment_ids))
+        )
+        seen = dict(result.all())
+
+    now = datetime.utcnow()
+    changes = []
+    completed = 0
+    for row in rows:
+        change = {'id': row.id, 'attempts': row.attempts + 1, 'processed_at': now, 'failed_at': None,
+                  'last_error': None}
+        payment = payments[row.id]
+        try:
+            async with db.begin_nested():
+                change['last_error'] = await _apply_event(db, row.event, payment, seen)
+        except UncreditedPayment as e:
+            change.update(processed_at=None, failed_at=now, last_error=str(e))
+            logger.error('captured payment not credited, needs manual handling', extra={
+                'event_id': row.id, 'payment_id': payment.get('id'), 'amount': payment.get('amount'),
+                'wallet_id': (payment.get('notes') or {}).get('wallet_id'), 'reason': str(e),
+            })
+        except IntegrityError:
+            # credited concurrently (e.g. by a manual fix); nothing left to do
+            change['last_error'] = 'payment already credited'
+        except Exception as e:
+            change.update(processed_at=None, last_error=f'{type(e).__name__}: {e}')
+            if change['attempts'] < PAYMENT_EVENT_MAX_ATTEMPTS:
+                logger.warning('payment event failed, will retry', exc_info=True,
+                               extra={'event_id': row.id, 'attempts': change['attempts']})
+            else:
+                change['failed_at'] = now
+                logger.error('payment event out of retries, needs manual handling', exc_info=True,
+                             extra={'event_id': row.id, 'payment_id': payment.get('id'),
+                                    'attempts': change['attempts']})
+        if change['processed_at'] is not None or change['failed_at'] is not None:
+            completed += 1
+        changes.append(change)
+
+    await db.execute(update(PaymentEvent), changes)
+    return completed
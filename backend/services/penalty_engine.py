@@ -0,0 +1,286 @@
+"""
+Nightly penalty engine.
+
+Walks every active goal in keyset-ordered chunks, loads each chunk's unsettled
+violations up to the end of the given day, and computes warnings, deductions and new
+wallet balances with NumPy array ops instead of per-row ORM work. Results are written
+back per chunk with one UPDATE ... FROM (VALUES ...) for violations, one for wallets and
+a bulk insert of Transaction(type=penalty) rows. The chunk's wallets are row-locked and
+re-read before anything is computed, so concurrent withdrawals and penalties are seen.
+
+Run from the backend folder:
+
+    python -m services.penalty_engine --date 2026-01-31 [--dry-run]
+"""
+import argparse
+import logging
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import BigInteger, Boolean, Integer, String, column, func, insert, select, update, values
+from sqlalchemy.orm import Session
+
+from db.session import SessionLocal
+from logs import setup_logging
+from models.models import (
+    Goal, GoalStatus, Transaction, TransactionStatus, TransactionType, Violation, ViolationType,
+    WalletLedger, WalletStatus
+)
+from services.penalty_rules import BYPASS_PENALTY_FRACTION, PENALTY_TIERS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# ViolationType -> small int code, and code -> bypass fraction (0 for ordinary limit violations)
+_EVENT_CODES = {t: i for i, t in enumerate(ViolationType)}
+_BYPASS_BY_CODE = np.array([BYPASS_PENALTY_FRACTION.get(t, 0.0) for t in ViolationType])
+_TIER_MINIMUMS = np.array([m for m, _ in PENALTY_TIERS], dtype=np.float64)
+_TIER_PERCENTS = np.array([p for _, p in PENALTY_TIERS], dtype=np.float64)
+
+
+def tier_percents(deposit: np.ndarray) -> np.ndarray:
+    """Vectorised services.penalty_rules.tier_percent."""
+    percents = np.zeros(len(deposit))
+    # tiers are highest first: fill from the lowest so higher tiers overwrite
+    for minimum, percent in zip(_TIER_MINIMUMS[::-1], _TIER_PERCENTS[::-1]):
+        percents[deposit >= minimum] = percent
+    return percents
+
+
+def compute_penalties(
+    goal_index: np.ndarray,
+    warning_number: np.ndarray,
+    event_code: np.ndarray,
+    max_warnings: np.ndarray,
+    percent: np.ndarray,
+    balance: np.ndarray,
+):
+    """Apply the penalty rules to one chunk.
+
+    Violation arrays must be sorted by (goal_index, warning_number); goal arrays are
+    indexed by goal_index and balances are integer paise. Each violation deducts a
+    fraction of the balance its goal's earlier violations left, rounded down to whole
+    paise (a 100% deduction takes exactly what is left), which is what immediate-mode
+    ingestion charges event by event. The chunk is walked one position at a time: step k
+    settles the k-th violation of every goal that has one, as array ops, so a chunk
+    costs as many steps as its busiest goal has violations.
+
+    Returns (penalty per violation, is_warning per violation, total penalty per goal,
+    warnings per goal).
+    """
+    n_goals = len(balance)
+    bypass = _BYPASS_BY_CODE[event_code]
+    is_warning = (bypass == 0) & (warning_number <= max_warnings[goal_index])
+    fraction = np.where(bypass > 0, bypass, np.where(is_warning, 0.0, percent[goal_index] / 100.0))
+
+    starts = np.flatnonzero(np.r_[True, goal_index[1:] != goal_index[:-1]]) if len(goal_index) else np.array([], dtype=np.int64)
+    sizes = np.diff(np.r_[starts, len(goal_index)])
+    remaining = np.asarray(balance, dtype=np.int64).copy()
+    penalty = np.zeros(len(goal_index), dtype=np.int64)
+    for k in range(int(sizes.max()) if len(sizes) else 0):
+        at = starts[sizes > k] + k
+        goals = goal_index[at]
+        left = remaining[goals]
+        taken = np.minimum(np.floor(left * fraction[at]).astype(np.int64), left)
+        penalty[at] = taken
+        remaining[goals] = left - taken
+    goal_penalty = np.bincount(goal_index, weights=penalty, minlength=n_goals).astype(np.int64)
+    goal_warnings = np.bincount(goal_index, weights=is_warning, minlength=n_goals).astype(np.int64)
+    return penalty, is_warning, goal_penalty, goal_warnings
+
+
+def _load_goals(db: Session, after_id: str, limit: int):
+    # one active wallet per goal (the oldest if there are several)
+    stmt = (
+        select(
+            Goal.id, Goal.user_id, Goal.max_warnings, Goal.penalty_percent,
+            WalletLedger.id, WalletLedger.deposit_amount, WalletLedger.current_balance,
+        )
+        .outerjoin(
+            WalletLedger,
+            (WalletLedger.goal_id == Goal.id) & (WalletLedger.status == WalletStatus.active)
+        )
+        .where(Goal.status == GoalStatus.active, Goal.id > after_id)
+        .order_by(Goal.id, WalletLedger.created_at)
+        .distinct(Goal.id)
+        .limit(limit)
+    )
+    return db.execute(stmt).all()
+
+
+def _lock_wallets(db: Session, wallet_ids: tuple, balance: tuple):
+    """Row-lock the chunk's wallets and re-read their balances.
+
+    DISTINCT ON cannot take FOR UPDATE, so _load_goals reads without locks; a withdrawal
+    or immediate-mode penalty committed since then would leave its balances stale, and
+    deducting from those could take a wallet below zero. Locks are taken in id order, as
+    everywhere else wallets are locked. Wallets that stopped being active are dropped.
+    """
+    ids = sorted({w for w in wallet_ids if w is not None})
+    if not ids:
+        return wallet_ids, balance
+    current = dict(db.execute(
+        select(WalletLedger.id, WalletLedger.current_balance)
+        .where(WalletLedger.id.in_(ids), WalletLedger.status == WalletStatus.active)
+        .order_by(WalletLedger.id)
+        .with_for_update()
+    ).all())
+    return (
+        tuple(w if w in current else None for w in wallet_ids),
+        tuple(current.get(w, 0) for w in wallet_ids),
+    )
+
+
+def _load_violations(db: Session, goal_ids: list, day_end: datetime):
+    stmt = (
+        select(Violation.id, Violation.goal_id, Violation.warning_number, Violation.event_type)
+        .where(
+            Violation.goal_id.in_(goal_ids),
+            Violation.settled_at.is_(None),
+            Violation.timestamp < day_end,
+        )
+        .order_by(Violation.goal_id, Violation.warning_number)
+    )
+    return db.execute(stmt).all()
+
+
+def _process_chunk(db: Session, goal_rows, day_end: datetime, now: datetime, dry_run: bool) -> dict:
+    goal_ids, user_ids, max_warnings, penalty_percent, wallet_ids, deposit, balance = zip(*goal_rows)
+    index = {goal_id: i for i, goal_id in enumerate(goal_ids)}
+
+    violation_rows = _load_violations(db, list(goal_ids), day_end)
+    if not violation_rows:
+        return {'violations': 0, 'warnings': 0, 'penalties': 0, 'penalty_total': 0}
+    violation_ids, v_goal_ids, v_warning, v_event = zip(*violation_rows)
+    if not dry_run:
+        wallet_ids, balance = _lock_wallets(db, wallet_ids, balance)
+
+    has_wallet = np.array([w is not None for w in wallet_ids])
+    deposit = np.array([d or 0 for d in deposit], dtype=np.int64)
+    balance = np.array([b or 0 for b in balance], dtype=np.int64)
+    max_warnings = np.array([m or 0 for m in max_warnings], dtype=np.int64)
+    percent = np.array([np.nan if p is None else p for p in penalty_percent], dtype=np.float64)
+    percent = np.where(np.isnan(percent), tier_percents(deposit), percent)
+
+    goal_index = np.fromiter((index[g] for g in v_goal_ids), dtype=np.int64, count=len(v_goal_ids))
+    warning_number = np.fromiter(v_warning, dtype=np.int64, count=len(v_warning))
+    event_code = np.fromiter((_EVENT_CODES[ViolationType(e)] for e in v_event), dtype=np.int64, count=len(v_event))
+
+    penalty, is_warning, goal_penalty, goal_warnings = compute_penalties(
+        goal_index, warning_number, event_code, max_warnings, percent, balance
+    )
+    # goals without an active wallet only accumulate warnings
+    penalty = np.where(has_wallet[goal_index], penalty, 0)
+    goal_penalty = np.where(has_wallet, goal_penalty, 0)
+
+    summary = {
+        'violations': len(violation_ids),
+        'warnings': int(is_warning.sum()),
+        'penalties': int((penalty > 0).sum()),
+        'penalty_total': int(goal_penalty.sum()),
+    }
+    if dry_run:
+        return summary
+
+    violation_values = values(
+        column('id', String), column('penalty_applied', Boolean), column('penalty_amount', BigInteger),
+        name='v',
+    ).data([
+        (violation_ids[i], bool(penalty[i] > 0), int(penalty[i]))
+        for i in range(len(violation_ids))
+    ])
+    db.execute(
+        update(Violation)
+        .where(Violation.id == violation_values.c.id)
+        .values(
+            penalty_applied=violation_values.c.penalty_applied,
+            penalty_amount=violation_values.c.penalty_amount,
+            settled_at=now,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    touched = np.flatnonzero(has_wallet & ((goal_penalty > 0) | (goal_warnings > 0)))
+    if len(touched):
+        wallet_values = values(
+            column('id', String), column('penalty', BigInteger), column('warnings', Integer),
+            name='w',
+        ).data([(wallet_ids[g], int(goal_penalty[g]), int(goal_warnings[g])) for g in touched])
+        db.execute(
+            update(WalletLedger)
+            .where(WalletLedger.id == wallet_values.c.id)
+            .values(
+                current_balance=WalletLedger.current_balance - wallet_values.c.penalty,
+                total_penalty=func.coalesce(WalletLedger.total_penalty, 0) + wallet_values.c.penalty,
+                total_warnings=func.coalesce(WalletLedger.total_warnings, 0) + wallet_values.c.warnings,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    charged = np.flatnonzero(penalty > 0)
+    if len(charged):
+        db.execute(insert(Transaction), [
+            {
+                'user_id': user_ids[goal_index[i]],
+                'goal_id': goal_ids[goal_index[i]],
+                'wallet_id': wallet_ids[goal_index[i]],
+                'type': TransactionType.penalty,
+                'amount': int(penalty[i]),
+                'status': TransactionStatus.success,
+                'timestamp': now,
+            }
+            for i in charged
+        ])
+    return summary
+
+
+def run_penalty_engine(
+    day: Optional[date] = None,
+    dry_run: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    session_factory=SessionLocal,
+) -> dict:
+    """Settle every active goal's unsettled violations up to the end of `day` (default: yesterday).
+
+    Each chunk is committed on its own; settled violations are never picked up again, so
+    an interrupted run can simply be restarted. With dry_run nothing is written.
+    """
+    if day is None:
+        day = date.today() - timedelta(days=1)
+    day_end = datetime.combine(day + timedelta(days=1), datetime.min.time())
+    now = datetime.utcnow()
+    totals = {'goals': 0, 'violations': 0, 'warnings': 0, 'penalties': 0, 'penalty_total': 0}
+
+    after_id = ''
+    with session_factory() as db:
+        while True:
+            goal_rows = _load_goals(db, after_id, chunk_size)
+            if not goal_rows:
+                break
+            summary = _process_chunk(db, goal_rows, day_end, now, dry_run)
+            if dry_run:
+                db.rollback()
+            else:
+                db.commit()
+            totals['goals'] += len(goal_rows)
+            for key in ('violations', 'warnings', 'penalties', 'penalty_total'):
+                totals[key] += summary[key]
+            after_id = goal_rows[-1][0]
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply warnings and penalties for all active goals.')
+    parser.add_argument('--date', type=date.fromisoformat, default=None, help='day to settle (default: yesterday)')
+    parser.add_argument('--dry-run', action='store_true', help='compute results without writing them')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    setup_logging()
+    totals = run_penalty_engine(args.date, dry_run=args.dry_run, chunk_size=args.chunk_size)
+    logger.info('penalty engine finished', extra={'dry_run': args.dry_run, **totals})
+
+
+if __name__ == '__main__':
+    main()
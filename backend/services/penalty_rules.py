@@ -0,0 +1,52 @@
+"""Penalty rules from the README, shared by violation ingestion and the nightly penalty engine."""
+import os
+from typing import Optional
+
+from models.models import ViolationType
+
+# 'immediate': apply warnings/penalties on ingestion; 'nightly': leave them to services.penalty_engine
+PENALTY_SETTLEMENT = os.getenv('PENALTY_SETTLEMENT', 'immediate')
+
+# (minimum wallet deposit in paise, penalty percent per violation), highest tier first:
+# ₹1000+ 5%, ₹500-999 10%, ₹200-499 15%, ₹50-199 20%
+PENALTY_TIERS = (
+    (100_000, 5.0),
+    (50_000, 10.0),
+    (20_000, 15.0),
+    (5_000, 20.0),
+)
+
+# Share of the current balance taken by bypass events, regardless of warnings left
+BYPASS_PENALTY_FRACTION = {
+    ViolationType.uninstall_attempt: 0.5,
+    ViolationType.permission_revoke: 0.5,
+    ViolationType.safe_mode: 1.0,
+}
+
+
+def tier_percent(deposit_amount: int) -> float:
+    for minimum, percent in PENALTY_TIERS:
+        if deposit_amount >= minimum:
+            return percent
+    return 0.0
+
+
+def penalty_fraction(
+    event_type: ViolationType,
+    warning_number: int,
+    max_warnings: Optional[int],
+    penalty_percent: Optional[float],
+    deposit_amount: int,
+) -> float:
+    """Share of the wallet's current balance a violation deducts (0.0 for a warning).
+
+    The first `max_warnings` violations of a goal are warnings only; after that each one
+    deducts the goal's penalty_percent, or the README tier for the deposit if unset.
+    """
+    bypass = BYPASS_PENALTY_FRACTION.get(event_type)
+    if bypass is not None:
+        return bypass
+    if warning_number <= (max_warnings or 0):
+        return 0.0
+    percent = penalty_percent if penalty_percent is not None else tier_percent(deposit_amount)
+    return percent / 100.0
@@ -0,0 +1,187 @@
+"""
+Opt-in per-request SQL profiler for development (SQL_PROFILER=true).
+
+Every SQL statement a request runs is recorded with its duration. When the request
+finishes the statements are normalised (literals and bind parameters replaced by `?`,
+IN lists collapsed) and grouped by shape; a shape executed SQL_PROFILER_NPLUS1_THRESHOLD
+or more times is flagged as a likely N+1 pattern. The response gets a `Server-Timing`
+header, and the full report is kept in memory (the last SQL_PROFILER_KEEP requests)
+under the request's X-Request-ID for GET /api/debug/profiles/{request_id}.
+
+Nothing is installed unless the profiler is enabled, so production requests pay nothing.
+"""
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from logs import current_request_id
+
+SQL_PROFILER_ENABLED = os.getenv('SQL_PROFILER', 'false').lower() in ('1', 'true', 'yes')
+SQL_PROFILER_KEEP = int(os.getenv('SQL_PROFILER_KEEP', '200'))
+SQL_PROFILER_NPLUS1_THRESHOLD = int(os.getenv('SQL_PROFILER_NPLUS1_THRESHOLD', '3'))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_BIND_PARAM = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+|\?")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_LIST = re.compile(r"(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """Reduce a statement to its shape so repeated executions group together."""
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _BIND_PARAM.sub('?', shape)
+    shape = _NUMBER.sub('?', shape)
+    shape = _IN_LIST.sub('(?, ...)', shape)
+    shape = _VALUES_LIST.sub(r'\1, ...', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+class QueryProfile:
+    """Statements run while one request (or one `query_budget` block) was active."""
+
+    def __init__(self, request_id: str = '', method: str = '', path: str = ''):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow()
+        self.queries: list = []  # (statement, seconds)
+        self.status: Optional[int] = None
+        self.duration: Optional[float] = None
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.queries.append((statement, seconds))
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def db_seconds(self) -> float:
+        return sum(seconds for _, seconds in self.queries)
+
+    def shapes(self) -> list:
+        """[(normalised sql, executions, total seconds)], most executed first."""
+        grouped: dict = {}
+        for statement, seconds in self.queries:
+            shape = normalize_sql(statement)
+            count, total = grouped.get(shape, (0, 0.0))
+            grouped[shape] = (count + 1, total + seconds)
+        return sorted(((s, c, t) for s, (c, t) in grouped.items()), key=lambda x: (-x[1], -x[2]))
+
+    def report(self) -> dict:
+        shapes = self.shapes()
+        return {
+            'request_id': self.request_id,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'started_at': self.started_at.isoformat(),
+            'duration_ms': None if self.duration is None else round(self.duration * 1000, 2),
+            'db_ms': round(self.db_seconds * 1000, 2),
+            'query_count': self.count,
+            'statements': [
+                {'sql': shape, 'count': count, 'total_ms': round(total * 1000, 2)}
+                for shape, count, total in shapes
+            ],
+            'n_plus_one': [
+                {'sql': shape, 'count': count}
+                for shape, count, _ in shapes if count >= SQL_PROFILER_NPLUS1_THRESHOLD
+            ],
+        }
+
+    def server_timing(self) -> str:
+        parts = [f'db;dur={self.db_seconds * 1000:.2f};desc="{self.count} queries"']
+        if self.duration is not None:
+            parts.append(f'app;dur={self.duration * 1000:.2f}')
+        return ', '.join(parts)
+
+
+_current_profile: ContextVar[Optional[QueryProfile]] = ContextVar('query_profile', default=None)
+
+
+class ProfileStore:
+    """The last `maxsize` request reports, by request id."""
+
+    def __init__(self, maxsize: int = SQL_PROFILER_KEEP):
+        self.maxsize = maxsize
+        self._reports: 'OrderedDict[str, dict]' = OrderedDict()
+
+    def add(self, report: dict) -> None:
+        self._reports[report['request_id']] = report
+        while len(self._reports) > self.maxsize:
+            self._reports.popitem(last=False)
+
+    def get(self, request_id: str) -> Optional[dict]:
+        return self._reports.get(request_id)
+
+    def summaries(self) -> list:
+        return [
+            {k: r[k] for k in ('request_id', 'method', 'path', 'status', 'duration_ms', 'query_count')}
+            | {'n_plus_one': len(r['n_plus_one'])}
+            for r in reversed(self._reports.values())
+        ]
+
+
+profile_store = ProfileStore()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        context._profile_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    started = getattr(context, '_profile_started', None)
+    if profile is not None and started is not None:
+        profile.record(statement, time.perf_counter() - started)
+
+
+def install_profiler_hooks() -> None:
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+class ProfilerMiddleware:
+    """Profiles every HTTP request; only added to the app when SQL_PROFILER is on."""
+
+    def __init__(self, app):
+        self.app = app
+        install_profiler_hooks()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile(current_request_id() or uuid.uuid4().hex, scope['method'], scope['path'])
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                profile.status = message['status']
+                profile.duration = time.perf_counter() - started
+                headers = list(message.get('headers', []))
+                headers.append((b'server-timing', profile.server_timing().encode('latin-1')))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_profile.reset(token)
+            if profile.duration is None:
+                profile.duration = time.perf_counter() - started
+            profile_store.add(profile.report())
@@ -0,0 +1,209 @@
+"""
+Background maintenance scheduler.
+
+Jobs are registered with `register_job` and run by an APScheduler AsyncIOScheduler
+started from `main.on_startup`. Every worker schedules every job, and workers' ticks
+are offset from each other, so a tick has to win two things before the job runs:
+
+- a Postgres advisory lock for the job, so two runs never overlap. It is
+  transaction-scoped (pg_try_advisory_xact_lock), which also works behind PgBouncer
+  transaction pooling;
+- a claim on the job's row in job_runs, which only succeeds when the last run (on any
+  worker) started at least RUN_CLAIM_FRACTION of the job's period ago, by the
+  database's clock. So in a multi-worker deployment each job runs once per interval.
+
+Chunked jobs are called repeatedly with a fresh session, one committed batch at a
+time, until a batch processes fewer rows than the batch size.
+"""
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from db.session import AsyncSessionLocal, async_engine
+
+if TYPE_CHECKING:
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+JOB_BATCH_SIZE = int(os.getenv('JOB_BATCH_SIZE', '1000'))
+# a run is claimed when the previous one started at least this fraction of a period ago
+# (slack for scheduler jitter; offset workers still land within one period of each other)
+RUN_CLAIM_FRACTION = 0.9
+
+logger = logging.getLogger(__name__)
+
+JobFunc = Callable[[AsyncSession, int], Awaitable[int]]
+
+
+@dataclass
+class JobMetrics:
+    runs: int = 0
+    skipped: int = 0  # another worker held the leader lock or already ran this interval
+    failures: int = 0
+    rows: int = 0
+    total_seconds: float = 0.0
+    last_seconds: Optional[float] = None
+    last_run_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'failures': self.failures,
+            'rows': self.rows,
+            'total_seconds': round(self.total_seconds, 3),
+            'last_seconds': None if self.last_seconds is None else round(self.last_seconds, 3),
+            'last_run_at': self.last_run_at.isoformat() if self.last_run_at else None,
+            'last_error': self.last_error,
+        }
+
+
+@dataclass
+class Job:
+    name: str
+    func: JobFunc
+    trigger: str
+    trigger_args: dict
+    chunked: bool = True
+    batch_size: int = JOB_BATCH_SIZE
+    period_seconds: float = 0.0  # time between ticks, set when scheduled
+    metrics: JobMetrics = field(default_factory=JobMetrics)
+
+    @property
+    def lock_key(self) -> int:
+        # stable 64-bit advisory lock key per job name
+        return int.from_bytes(hashlib.sha256(f'job:{self.name}'.encode()).digest()[:8], 'big', signed=True)
+
+
+jobs: dict = {}
+
+_TRY_LOCK = text('SELECT pg_try_advisory_xact_lock(:key)')
+
+# claim this period's run: move started_at forward only if the last run is old enough
+_CLAIM_RUN = text("""
+    INSERT INTO job_runs (name, started_at) VALUES (:name, timezone('utc', now()))
+    ON CONFLICT (name) DO UPDATE SET started_at = EXCLUDED.started_at
+    WHERE job_runs.started_at <= EXCLUDED.started_at - make_interval(secs => :min_gap)
+    RETURNING name
+""")
+
+
+def register_job(
+    name: str,
+    func: JobFunc,
+    trigger: str = 'interval',
+    chunked: bool = True,
+    batch_size: int = JOB_BATCH_SIZE,
+    **trigger_args,
+) -> Job:
+    """Register `func(db, batch_size) -> rows processed` to run on an APScheduler trigger.
+
+    For interval jobs the interval can be overridden with JOB_<NAME>_INTERVAL_SECONDS.
+    """
+    if trigger == 'interval':
+        override = os.getenv(f'JOB_{name.upper()}_INTERVAL_SECONDS')
+        if override:
+            trigger_args = dict(trigger_args, seconds=int(override))
+    job = Job(name=name, func=func, trigger=trigger, trigger_args=trigger_args, chunked=chunked, batch_size=batch_size)
+    jobs[name] = job
+    return job
+
+
+async def claim_run(conn: AsyncConnection, job: Job) -> bool:
+    """Take the job's advisory lock and claim this interval's run, both on `conn`.
+
+    Call inside a transaction on `conn` and keep it open for the run: the lock is
+    released and the claim committed together when it ends, so no other worker can
+    take the lock between the two or see a claim whose run is still going.
+    """
+    if not await conn.scalar(_TRY_LOCK, {'key': job.lock_key}):
+        return False
+    claimed = await conn.scalar(
+        _CLAIM_RUN, {'name': job.name, 'min_gap': RUN_CLAIM_FRACTION * job.period_seconds}
+    )
+    return claimed is not None
+
+
+async def run_job(job: Job) -> None:
+    metrics = job.metrics
+    async with async_engine.connect() as lock_conn:
+        async with lock_conn.begin():
+            if not await claim_run(lock_conn, job):
+                metrics.skipped += 1
+                return
+
+            started = time.perf_counter()
+            metrics.last_run_at = datetime.utcnow()
+            rows = 0
+            try:
+                while True:
+                    async with AsyncSessionLocal() as db:
+                        processed = await job.func(db, job.batch_size)
+                        await db.commit()
+                    rows += processed
+                    if not job.chunked or processed < job.batch_size:
+                        break
+                metrics.last_error = None
+            except Exception as e:
+                metrics.failures += 1
+                metrics.last_error = f'{type(e).__name__}: {e}'
+                logger.exception('maintenance job failed', extra={'job': job.name})
+            finally:
+                elapsed = time.perf_counter() - started
+                metrics.runs += 1
+                metrics.rows += rows
+                metrics.last_seconds = elapsed
+                metrics.total_seconds += elapsed
+
+
+def period_seconds(trigger) -> float:
+    """Seconds between consecutive fire times of an APScheduler trigger."""
+    interval = getattr(trigger, 'interval', None)
+    if interval is not None:
+        return interval.total_seconds()
+    first = trigger.get_next_fire_time(None, datetime.now(timezone.utc))
+    second = trigger.get_next_fire_time(first, first + timedelta(seconds=1))
+    if first is None or second is None:
+        return 0.0
+    return (second - first).total_seconds()
+
+
+def job_stats() -> dict:
+    return {name: job.metrics.as_dict() for name, job in jobs.items()}
+
+
+class MaintenanceScheduler:
+    def __init__(self):
+        self._scheduler: Optional['AsyncIOScheduler'] = None
+
+    def start(self):
+        if not SCHEDULER_ENABLED or self._scheduler is not None:
+            return
+        # imported here so processes that never schedule (scripts, SCHEDULER_ENABLED=false)
+        # don't load APScheduler; importing services.maintenance registers the built-in jobs
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+        import services.maintenance  # noqa: F401
+        self._scheduler = AsyncIOScheduler(timezone='UTC')
+        for job in jobs.values():
+            scheduled = self._scheduler.add_job(
+                run_job, job.trigger, args=[job], id=job.name,
+                max_instances=1, coalesce=True, **job.trigger_args
+            )
+            job.period_seconds = period_seconds(scheduled.trigger)
+        self._scheduler.start()
+
+    async def stop(self):
+        if self._scheduler is not None:
+            self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+
+
+maintenance_scheduler = MaintenanceScheduler()
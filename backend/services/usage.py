@@ -0,0 +1,149 @@
+"""
+Usage time series.
+
+Devices upsert their running per-app total for the day into `daily_usage`; a trigger
+keeps weekly and monthly totals in `usage_rollups` up to date on every write (see
+models.DailyUsage). Range queries read from the coarsest tier that fits the span:
+whole weeks/months come from rollups and only the partial periods at either end are
+summed from daily rows, so a query costs O(periods) however much history there is.
+
+`daily_usage` is range-partitioned by month; `ensure_partitions` (a scheduler job)
+creates the current and upcoming months ahead of time.
+"""
+import logging
+import os
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.models import DailyUsage, UsageRollup
+
+logger = logging.getLogger(__name__)
+
+USAGE_PARTITION_MONTHS_AHEAD = int(os.getenv('USAGE_PARTITION_MONTHS_AHEAD', '2'))
+# Longest spans (in days) answered per day and per week; anything longer is per month
+USAGE_DAILY_MAX_DAYS = int(os.getenv('USAGE_DAILY_MAX_DAYS', '62'))
+USAGE_WEEKLY_MAX_DAYS = int(os.getenv('USAGE_WEEKLY_MAX_DAYS', '366'))
+
+
+def choose_granularity(start: date, end: date) -> str:
+    days = (end - start).days + 1
+    if days <= USAGE_DAILY_MAX_DAYS:
+        return 'day'
+    if days <= USAGE_WEEKLY_MAX_DAYS:
+        return 'week'
+    return 'month'
+
+
+def period_start(day: date, granularity: str) -> date:
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_period(start: date, granularity: str) -> date:
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+async def usage_series(
+    db: AsyncSession, user_id: str, start: date, end: date, app_name: Optional[str] = None
+) -> dict:
+    """Minutes per (period, app) for `user_id` between `start` and `end` inclusive."""
+    granularity = choose_granularity(start, end)
+    end_exclusive = end + timedelta(days=1)
+    buckets = defaultdict(int)
+
+    daily_ranges = [(start, end_exclusive)]
+    if granularity != 'day':
+        first_full = period_start(start, granularity)
+        if first_full < start:
+            first_full = next_period(first_full, granularity)
+        last_full_end = period_start(end_exclusive, granularity)
+        if first_full < last_full_end:
+            daily_ranges = [(start, first_full), (last_full_end, end_exclusive)]
+            stmt = select(UsageRollup.period_start, UsageRollup.app_name, UsageRollup.minutes).where(
+                UsageRollup.user_id == user_id,
+                UsageRollup.period == granularity,
+                UsageRollup.period_start >= first_full,
+                UsageRollup.period_start < last_full_end,
+            )
+            if app_name:
+                stmt = stmt.where(UsageRollup.app_name == app_name)
+            for bucket, app, minutes in (await db.execute(stmt)).all():
+                buckets[(bucket, app)] += minutes
+
+    daily_ranges = [(lo, hi) for lo, hi in daily_ranges if lo < hi]
+    if daily_ranges:
+        stmt = select(DailyUsage.day, DailyUsage.app_name, DailyUsage.minutes).where(
+            DailyUsage.user_id == user_id,
+            or_(*(and_(DailyUsage.day >= lo, DailyUsage.day < hi) for lo, hi in daily_ranges)),
+        )
+        if app_name:
+            stmt = stmt.where(DailyUsage.app_name == app_name)
+        for day, app, minutes in (await db.execute(stmt)).all():
+            buckets[(period_start(day, granularity), app)] += minutes
+
+    totals = defaultdict(int)
+    for (_, app), minutes in buckets.items():
+        totals[app] += minutes
+    return {
+        'user_id': user_id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'granularity': granularity,
+        'series': [
+            {'period_start': bucket.isoformat(), 'app_name': app, 'minutes': minutes}
+            for (bucket, app), minutes in sorted(buckets.items())
+        ],
+        'totals': dict(sorted(totals.items())),
+        'total_minutes': sum(totals.values()),
+    }
+
+
+def partition_name(month: date) -> str:
+    return f'daily_usage_y{month.year}m{month.month:02d}'
+
+
+async def ensure_partitions(db: AsyncSession, batch_size: int = 0, today: Optional[date] = None) -> int:
+    """Create monthly daily_usage partitions for this month and the next few.
+
+    A month whose rows already landed in the default partition is left there, since
+    attaching a partition over them would fail. Returns the number of partitions created.
+    """
+    month = (today or date.today()).replace(day=1)
+    existing = set((await db.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'daily_usage'
+    """))).scalars())
+
+    created = 0
+    for _ in range(USAGE_PARTITION_MONTHS_AHEAD + 1):
+        following = next_period(month, 'month')
+        name = partition_name(month)
+        if name not in existing:
+            stranded = await db.scalar(
+                text('SELECT 1 FROM daily_usage_default WHERE day >= :lo AND day < :hi LIMIT 1'),
+                {'lo': month, 'hi': following},
+            )
+            if stranded:
+                logger.warning('usage partition skipped: rows already in daily_usage_default',
+                               extra={'partition': name})
+            else:
+                await db.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF daily_usage "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+                ))
+                created += 1
+        month = following
+    return created
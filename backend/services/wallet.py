@@ -0,0 +1,161 @@
+"""
+Wallet balance updates.
+
+Every operation is a single SQL statement: an atomic
+`UPDATE wallet_ledger SET current_balance = current_balance +/- :amount ... RETURNING`
+chained (as a CTE) into the INSERT of the matching Transaction row. Nothing is read
+first, so concurrent deposits and penalties on the same wallet never lose updates and
+only hold the row lock for the duration of that one statement. Amounts are integer
+paise. The caller owns the transaction and commits.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.models import gen_uuid
+
+
+class WalletError(ValueError):
+    pass
+
+
+class WalletNotFoundError(WalletError):
+    pass
+
+
+class InsufficientFundsError(WalletError):
+    pass
+
+
+@dataclass(frozen=True)
+class WalletUpdate:
+    wallet_id: str
+    balance: int  # paise, after the update
+    amount: int  # paise actually moved
+    transaction_id: Optional[str]
+
+
+_INSERT_TRANSACTION = """
+    t AS (
+        INSERT INTO transactions (id, user_id, goal_id, wallet_id, razorpay_payment_id, type, amount, status, timestamp)
+        SELECT CAST(:transaction_id AS VARCHAR), w.user_id, w.goal_id, w.id, CAST(:payment_id AS VARCHAR),
+               CAST('{type}' AS transactiontype), w.amount, CAST('success' AS transactionstatus),
+               timezone('utc', now())
+        FROM w
+        WHERE w.amount > 0
+        RETURNING id, wallet_id
+    )
+    SELECT w.id, w.current_balance, w.amount, t.id FROM w LEFT JOIN t ON t.wallet_id = w.id
+"""
+
+_DEPOSIT = text("""
+    WITH w AS (
+        UPDATE wallet_ledger
+        SET current_balance = current_balance + CAST(:amount AS BIGINT),
+            deposit_amount = deposit_amount + CAST(:amount AS BIGINT)
+        WHERE id = :wallet_id AND status = 'active'
+        RETURNING id, user_id, goal_id, current_balance, CAST(:amount AS BIGINT) AS amount
+    ),
+""" + _INSERT_TRANSACTION.format(type='deposit'))
+
+_WITHDRAW = text("""
+    WITH w AS (
+        UPDATE wallet_ledger
+        SET current_balance = current_balance - CAST(:amount AS BIGINT)
+        WHERE id = :wallet_id AND status = 'active' AND current_balance >= CAST(:amount AS BIGINT)
+        RETURNING id, user_id, goal_id, current_balance, CAST(:amount AS BIGINT) AS amount
+    ),
+""" + _INSERT_TRANSACTION.format(type='withdrawal'))
+
+_IS_ACTIVE = text("SELECT 1 FROM wallet_ledger WHERE id = :wallet_id AND status = 'active'")
+
+# Penalties never fail for lack of funds: they take at most what is left. The row is
+# locked in `cur` so the clamped amount is computed from the latest committed balance.
+_PENALTY = text("""
+    WITH cur AS (
+        SELECT id, LEAST(CAST(:amount AS BIGINT), current_balance) AS amount
+        FROM wallet_ledger
+        WHERE id = :wallet_id AND status = 'active'
+        FOR UPDATE
+    ),
+    w AS (
+        UPDATE wallet_ledger
+        SET current_balance = wallet_ledger.current_balance - cur.amount,
+            total_penalty = COALESCE(wallet_ledger.total_penalty, 0) + cur.amount
+        FROM cur
+        WHERE wallet_ledger.id = cur.id
+        RETURNING wallet_ledger.id, wallet_ledger.user_id, wallet_ledger.goal_id,
+                  wallet_ledger.current_balance, cur.amount
+    ),
+""" + _INSERT_TRANSACTION.format(type='penalty'))
+
+# A declined payment moves no money; it is recorded once against the wallet it was meant for
+_FAILED_DEPOSIT = text("""
+    INSERT INTO transactions (id, user_id, goal_id, wallet_id, razorpay_payment_id, type, amount, status, timestamp)
+    SELECT CAST(:transaction_id AS VARCHAR), w.user_id, w.goal_id, w.id, CAST(:payment_id AS VARCHAR),
+           CAST('deposit' AS transactiontype), CAST(:amount AS BIGINT), CAST('failed' AS transactionstatus),
+           timezone('utc', now())
+    FROM wallet_ledger w
+    WHERE w.id = :wallet_id
+    ON CONFLICT (razorpay_payment_id) WHERE razorpay_payment_id IS NOT NULL DO NOTHING
+    RETURNING id
+""")
+
+
+async def _apply(db: AsyncSession, stmt, wallet_id: str, amount: int, payment_id: Optional[str] = None):
+    if amount <= 0:
+        raise WalletError('amount must be a positive number of paise')
+    result = await db.execute(stmt, {
+        'wallet_id': wallet_id,
+        'amount': amount,
+        'payment_id': payment_id,
+        'transaction_id': gen_uuid(),
+    })
+    row = result.first()
+    if row is None:
+        return None
+    return WalletUpdate(wallet_id=row[0], balance=row[1], amount=row[2], transaction_id=row[3])
+
+
+async def deposit(db: AsyncSession, wallet_id: str, amount: int, razorpay_payment_id: Optional[str] = None) -> WalletUpdate:
+    """Credit an active wallet and record a successful deposit transaction."""
+    update = await _apply(db, _DEPOSIT, wallet_id, amount, razorpay_payment_id)
+    if update is None:
+        raise WalletNotFoundError(f'no active wallet {wallet_id}')
+    return update
+
+
+async def apply_penalty(db: AsyncSession, wallet_id: str, amount: int) -> WalletUpdate:
+    """Deduct up to `amount` paise (never below zero) and record a penalty transaction."""
+    update = await _apply(db, _PENALTY, wallet_id, amount)
+    if update is None:
+        raise WalletNotFoundError(f'no active wallet {wallet_id}')
+    return update
+
+
+async def withdraw(db: AsyncSession, wallet_id: str, amount: int, razorpay_payment_id: Optional[str] = None) -> WalletUpdate:
+    """Debit exactly `amount` paise from an active wallet.
+
+    Raises WalletNotFoundError if the wallet is missing or not active, and
+    InsufficientFundsError if its balance is lower than `amount`.
+    """
+    update = await _apply(db, _WITHDRAW, wallet_id, amount, razorpay_payment_id)
+    if update is None:
+        # only the failure path pays for telling the two reasons apart
+        if await db.scalar(_IS_ACTIVE, {'wallet_id': wallet_id}) is None:
+            raise WalletNotFoundError(f'no active wallet {wallet_id}')
+        raise InsufficientFundsError(f'wallet {wallet_id} balance below {amount} paise')
+    return update
+
+
+async def record_failed_deposit(db: AsyncSession, wallet_id: str, amount: int, razorpay_payment_id: str) -> Optional[str]:
+    """Record a declined payment as a failed deposit; None if the wallet is unknown or it is already recorded."""
+    result = await db.execute(_FAILED_DEPOSIT, {
+        'wallet_id': wallet_id,
+        'amount': amount,
+        'payment_id': razorpay_payment_id,
+        'transaction_id': gen_uuid(),
+    })
+    return result.scalar()
@@ -0,0 +1 @@
+# Test helpers shipped with the app (pytest plugins, a signed Razorpay event generator, a read-replica routing check); not collected as tests
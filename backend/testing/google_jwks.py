@@ -0,0 +1,115 @@
+"""
+A local stand-in for Google's JWKS endpoint, for tests and benchmarks of auth.oauth.
+
+    with JWKSServer(max_age=3600, latency=0.08) as server:
+        cache = GoogleKeyCache(certs_url=server.url)
+        token = server.mint_id_token('kid@example.com', audience=CLIENT_ID)
+
+Serves the public half of one or more RSA keys it generates (`rotate()` adds a new key
+and makes it the signing key) with a Cache-Control max-age, optionally after a delay
+that stands in for the round trip to Google, and counts the requests it answers.
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+ISSUER = 'https://accounts.google.com'
+
+
+def rsa_key(kid: str):
+    """A fresh RSA key as (private PEM, public JWK)."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from jose import jwk
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    public_jwk = jwk.construct(public_pem, 'RS256').to_dict()
+    public_jwk.update({'kid': kid, 'use': 'sig', 'alg': 'RS256'})
+    return private_pem, public_jwk
+
+
+class JWKSServer:
+    def __init__(self, max_age: int = 3600, latency: float = 0.0):
+        self.max_age = max_age
+        self.latency = latency
+        self.requests = 0
+        self._private = {}  # kid -> private PEM
+        self._public = []
+        self.kid: Optional[str] = None
+        self.rotate()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}/oauth2/v3/certs'
+
+    @property
+    def jwks(self) -> dict:
+        return {'keys': list(self._public)}
+
+    def rotate(self, drop_old: bool = False) -> str:
+        """Publish a new key and sign with it from now on; returns its kid."""
+        kid = uuid.uuid4().hex[:16]
+        private_pem, public_jwk = rsa_key(kid)
+        if drop_old:
+            self._public.clear()
+        self._private[kid] = private_pem
+        self._public.append(public_jwk)
+        self.kid = kid
+        return kid
+
+    def mint_id_token(self, email: str, audience: str, issuer: str = ISSUER, lifetime: int = 3600,
+                      kid: Optional[str] = None) -> str:
+        from jose import jwt
+
+        kid = kid or self.kid
+        now = int(time.time())
+        claims = {
+            'iss': issuer,
+            'aud': audience,
+            'sub': uuid.uuid5(uuid.NAMESPACE_DNS, email).hex,
+            'email': email,
+            'email_verified': True,
+            'iat': now,
+            'exp': now + lifetime,
+        }
+        return jwt.encode(claims, self._private[kid], algorithm='RS256', headers={'kid': kid})
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                body = json.dumps(server.jwks).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Cache-Control', f'public, max-age={server.max_age}')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,80 @@
+"""
+pytest plugin: SQL query budgets per endpoint.
+
+Load it with `pytest -p testing.query_budget` from the backend folder, or
+`pytest_plugins = ['testing.query_budget']` in a conftest. Then either cap a whole test:
+
+    @pytest.mark.query_budget(2)
+    def test_me_is_cheap(client):
+        client.get('/api/me')
+
+or individual calls:
+
+    def test_linking(client, query_budget):
+        with query_budget(4, 'verify-linking-code'):
+            client.post('/api/linking/verify-linking-code', json={'code': code})
+
+Statements are counted on every SQLAlchemy engine in the process (the app runs in a
+TestClient thread, so a context variable would not see them). Going over budget fails
+the test with the normalised statements and any repeated (N+1) shapes.
+"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from services.profiler import QueryProfile
+
+
+@contextmanager
+def count_queries(label: str = ''):
+    """Yield a QueryProfile that records every statement executed inside the block."""
+    profile = QueryProfile(path=label)
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        profile.record(statement, 0.0)
+
+    event.listen(Engine, 'after_cursor_execute', _record)
+    try:
+        yield profile
+    finally:
+        event.remove(Engine, 'after_cursor_execute', _record)
+
+
+def _check(profile: QueryProfile, budget: int, label: str) -> None:
+    if profile.count <= budget:
+        return
+    report = profile.report()
+    lines = [f"{label or 'block'} ran {profile.count} SQL statements, budget is {budget}:"]
+    lines += [f"  {s['count']}x {s['sql']}" for s in report['statements']]
+    if report['n_plus_one']:
+        lines.append('likely N+1: ' + '; '.join(s['sql'] for s in report['n_plus_one']))
+    pytest.fail('\n'.join(lines), pytrace=False)
+
+
+@pytest.fixture
+def query_budget():
+    @contextmanager
+    def budget(max_queries: int, label: str = ''):
+        with count_queries(label) as profile:
+            yield profile
+        _check(profile, max_queries, label)
+
+    return budget
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'query_budget(n): fail if the test runs more than n SQL statements')
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    marker = item.get_closest_marker('query_budget')
+    if marker is None:
+        yield
+        return
+    with count_queries(item.name) as profile:
+        outcome = yield
+    if outcome.excinfo is None:
+        _check(profile, marker.args[0], item.name)
@@ -0,0 +1,108 @@
+"""
+Routing check for read replicas (db/replicas.py) against two local databases.
+
+The second database stands in for a replica. Any other Postgres database works, even
+on the same server, because only the answering (database, port) is compared. A real
+streaming standby is also measured for lag.
+
+    python -m testing.replicas --database-url postgresql://localhost/guilt_eater \\
+        --read-url postgresql://localhost:5433/guilt_eater
+
+Checks, in order:
+- a replica passing its health check is used;
+- reads go to the primary until the user is known;
+- a write by the user keeps their reads on the primary;
+- a replica that fails its check, or breaks mid-request, is taken out of rotation;
+- a request whose replica connection breaks finishes on the primary.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+WHO = "SELECT current_database() || ':' || COALESCE(inet_server_port(), 0)"
+
+
+async def run_checks(args) -> bool:
+    from sqlalchemy import text
+
+    from db import replicas
+    from db.session import async_engine
+
+    async def answered_by(user_id):
+        replicas._request_user.set(user_id)
+        agen = replicas.get_read_db()
+        db = await agen.__anext__()
+        try:
+            return await db.scalar(text(WHO))
+        finally:
+            await agen.aclose()
+
+    async with async_engine.connect() as conn:
+        primary = await conn.scalar(text(WHO))
+    replica = replicas.replica_set.replicas[0]
+    await replicas.replica_set.check(replica)
+    results = []
+
+    def expect(name, ok, detail=''):
+        results.append(ok)
+        print(f"{'PASS' if ok else 'FAIL'}  {name}{f' ({detail})' if detail else ''}")
+
+    expect('replica passes its health check', replica.healthy,
+           f'lag {replica.lag_seconds}s' if replica.healthy else replica.last_error)
+    standby = await answered_by('replica-check-user')
+    expect('reads go to the replica', replica.healthy and standby != primary, f'answered by {standby}')
+    expect('reads go to the primary before the user is known', await answered_by(None) == primary)
+
+    replicas.recent_writes.mark('replica-check-writer')
+    expect('recent writer reads from the primary', await answered_by('replica-check-writer') == primary)
+    replicas._request_user.set('replica-check-tracked')
+    async with async_engine.begin() as conn:
+        await conn.execute(text('CREATE TEMP TABLE replica_check (x int)'))
+        await conn.execute(text('INSERT INTO replica_check VALUES (1)'))
+    expect('a write marks the user', replicas.recent_writes.is_recent('replica-check-tracked'))
+
+    replicas.replica_set.report_failure(replica, OSError('simulated connection failure'))
+    expect('a failed replica is skipped', await answered_by('replica-check-user') == primary)
+    await replicas.replica_set.check(replica)
+    expect('it is back after a good check', replica.healthy and await answered_by('replica-check-user') != primary)
+
+    # kill the request's replica connection between two statements, from another session
+    replicas._request_user.set('replica-check-user')
+    agen = replicas.get_read_db()
+    db = await agen.__anext__()
+    try:
+        pid = await db.scalar(text('SELECT pg_backend_pid()'))
+        async with replica.engine.connect() as conn:
+            await conn.execute(text('SELECT pg_terminate_backend(:pid)'), {'pid': pid})
+        after = await db.scalar(text(WHO))
+    finally:
+        await agen.aclose()
+    expect('a request whose replica breaks finishes on the primary', after == primary and not replica.healthy,
+           f'answered by {after}')
+    await replicas.replica_set.check(replica)
+
+    down = replicas.ReplicaSet(['postgresql://nobody@127.0.0.1:1/none'])
+    await down.check(down.replicas[0])
+    expect('an unreachable replica stays out of rotation', not down.replicas[0].healthy and down.pick() is None,
+           down.replicas[0].last_error)
+    await down.stop()
+    await replicas.replica_set.stop()
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m testing.replicas', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'), help='primary')
+    parser.add_argument('--read-url', required=True, help='replica, or a second database standing in for one')
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('--database-url or DATABASE_URL is required')
+    # db.session and db.replicas read their URLs at import
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ['DATABASE_READ_URL'] = args.read_url
+    sys.exit(0 if asyncio.run(run_checks(args)) else 1)
+
+
+if __name__ == '__main__':
+    main()
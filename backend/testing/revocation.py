@@ -0,0 +1,121 @@
+"""
+Cross-worker session revocation check (auth/revocation.py) against a local Postgres.
+
+Starts two app workers with uvicorn, each in its own process with its own token cache
+and revocation listener, and Google id_token verification pinned to a local key (as
+bench.load does). A parent signs in and warms the token cache on both workers, then
+signs in again on the first, which rotates the session and publishes it with NOTIFY.
+The second worker has the old token cached and trusts it (its listener is ready, which
+shows in /metrics as a cheaper GET /api/me), so it only refuses it if the notification
+reached its listener.
+
+    python -m testing.revocation --database-url postgresql://localhost/guilt_eater_test
+
+Checks, in order:
+- both workers accept the parent's token;
+- the other worker serves it from its token cache;
+- the worker that rotated the session rejects the old token at once;
+- the other worker rejects it within --timeout seconds (the time taken is printed);
+- both workers accept the new token.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+
+import httpx
+
+from bench.load import BENCH_CLIENT_ID, _serve, make_signing_key, mint_id_token, parse_route_queries, wait_until_up
+
+
+def run_checks(workers: list, private_pem: str, timeout: float) -> bool:
+    email = f'revocation-check-{uuid.uuid4().hex[:8]}@example.com'
+    results = []
+
+    def expect(name, ok, detail=''):
+        results.append(ok)
+        print(f"{'PASS' if ok else 'FAIL'}  {name}{f' ({detail})' if detail else ''}")
+
+    def sign_in(client):
+        resp = client.post('/auth/token', json={'id_token': mint_id_token(private_pem, email, 'Revocation check'),
+                                                'role': 'parent'})
+        resp.raise_for_status()
+        return {'Authorization': f"Bearer {resp.json()['access_token']}"}
+
+    def me(client, headers):
+        return client.get('/api/me', headers=headers).status_code
+
+    def me_queries(client, headers):
+        """SQL statements one GET /api/me cost the worker."""
+        def total():
+            return parse_route_queries(client.get('/metrics').text).get(('GET', '/api/me'), (0.0, 0.0))[0]
+        before = total()
+        me(client, headers)
+        return total() - before
+
+    first, second = workers
+    old = sign_in(first)
+    statuses = [me(client, old) for client in (first, second)]
+    expect('both workers accept the parent token', statuses == [200, 200], f'statuses {statuses}')
+
+    # a parent token is served from the cache only once the listener has loaded the sessions
+    miss = me_queries(second, old)
+    deadline = time.monotonic() + timeout
+    while (hit := me_queries(second, old)) >= miss and time.monotonic() < deadline:
+        time.sleep(0.1)
+    expect('the other worker serves it from its token cache', hit < miss, f'{hit:.0f} vs {miss:.0f} statements')
+
+    new = sign_in(first)
+    rotated_at = time.monotonic()
+    status = me(first, old)
+    expect('the rotating worker rejects the old token', status == 401, f'status {status}')
+
+    while (status := me(second, old)) != 401 and time.monotonic() - rotated_at < timeout:
+        time.sleep(0.01)
+    elapsed = time.monotonic() - rotated_at
+    expect('the other worker rejects the old token', status == 401,
+           f'after {elapsed * 1000:.0f} ms' if status == 401 else f'still {status} after {timeout}s')
+
+    statuses = [me(client, new) for client in (first, second)]
+    expect('both workers accept the new token', statuses == [200, 200], f'statuses {statuses}')
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m testing.revocation', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', default=os.getenv('TEST_DATABASE_URL'),
+                        help='scratch Postgres database (default: $TEST_DATABASE_URL)')
+    parser.add_argument('--ports', type=int, nargs=2, default=[8771, 8772])
+    parser.add_argument('--timeout', type=float, default=5.0, help='seconds the other worker has to catch up')
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('--database-url or TEST_DATABASE_URL is required (use a scratch database)')
+
+    env = {'DATABASE_URL': args.database_url, 'GOOGLE_CLIENT_ID': BENCH_CLIENT_ID, 'SCHEDULER_ENABLED': 'false'}
+    os.environ.update(env)
+    private_pem, jwks = make_signing_key()
+    spawn = multiprocessing.get_context('spawn')
+    processes, clients = [], []
+    try:
+        # one at a time, so the first has migrated the schema before the second starts
+        for port in args.ports:
+            process = spawn.Process(target=_serve, args=(port, env, jwks), daemon=True)
+            process.start()
+            processes.append(process)
+            base_url = f'http://127.0.0.1:{port}'
+            wait_until_up(base_url, process)
+            clients.append(httpx.Client(base_url=base_url, timeout=10))
+        ok = run_checks(clients, private_pem, args.timeout)
+    finally:
+        for client in clients:
+            client.close()
+        for process in processes:
+            process.terminate()
+            process.join(10)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
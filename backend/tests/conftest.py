@@ -0,0 +1,118 @@
+"""
+Request-level tests, run against a scratch Postgres database:
+
+    TEST_DATABASE_URL=postgresql://localhost/guilt_eater_test python -m pytest tests
+
+The app's startup migrates the schema; every test seeds its own users, so the database
+can be reused between runs. Without TEST_DATABASE_URL the tests are skipped.
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+# db.session reads DATABASE_URL at import; never let the tests fall back to the .env database
+os.environ['DATABASE_URL'] = TEST_DATABASE_URL or 'postgresql+psycopg2://localhost/set-TEST_DATABASE_URL'
+os.environ['SCHEDULER_ENABLED'] = 'false'
+# services.payments reads the secret at import; testing.razorpay signs deliveries with it
+os.environ.setdefault('RAZORPAY_WEBHOOK_SECRET', 'test-webhook-secret')
+
+# query_budget fixture and marker: SQL statement caps that fail the test when exceeded
+pytest_plugins = ['testing.query_budget']
+
+
+@pytest.fixture(scope='session')
+def client():
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL is not set (point it at a scratch Postgres database)')
+    from fastapi.testclient import TestClient
+
+    import main
+    from auth.oauth import google_keys
+
+    google_keys.start = lambda: None  # no background fetches from Google
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def make_user(client):
+    """make_user(role='individual', parent_id=None) -> (user_id, auth headers)."""
+    from sqlalchemy import insert
+
+    from auth.security import create_access_token, create_session_token
+    from db.session import SessionLocal
+    from models.models import User, gen_uuid
+
+    def make(role: str = 'individual', parent_id: str = None):
+        user_id = gen_uuid()
+        session_token = create_session_token() if role == 'parent' else None
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            db.execute(insert(User), [{'id': user_id, 'email': f'test-{uuid.uuid4().hex}@example.com',
+                                       'name': f'Test {role}', 'role': role, 'parent_id': parent_id,
+                                       'session_token': session_token, 'created_at': now, 'updated_at': now}])
+            db.commit()
+        token = create_access_token(user_id, session_token=session_token)
+        return user_id, {'Authorization': f'Bearer {token}'}
+
+    return make
+
+
+@pytest.fixture
+def make_goal(client):
+    """make_goal(user_id, balance=50_000) -> (goal_id, wallet_id): an active goal with a funded wallet."""
+    from sqlalchemy import insert
+
+    from db.session import SessionLocal
+    from models.models import Goal, GoalStatus, WalletLedger, gen_uuid
+
+    def make(user_id: str, balance: int = 50_000):
+        goal_id, wallet_id = gen_uuid(), gen_uuid()
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            db.execute(insert(Goal), [{'id': goal_id, 'user_id': user_id, 'app_name': 'com.test.app',
+                                       'daily_limit_minutes': 60, 'start_date': now - timedelta(days=1),
+                                       'end_date': now + timedelta(days=30), 'max_warnings': 2,
+                                       'penalty_percent': 10.0, 'status': GoalStatus.active}])
+            db.execute(insert(WalletLedger), [{'id': wallet_id, 'user_id': user_id, 'goal_id': goal_id,
+                                               'deposit_amount': balance, 'current_balance': balance,
+                                               'total_penalty': 0, 'total_warnings': 0, 'created_at': now}])
+            db.commit()
+        return goal_id, wallet_id
+
+    return make
+
+
+@pytest.fixture
+def run_async(client):
+    """run_async(fn) -> the result of `await fn(db)` on a fresh AsyncSession, committed after.
+
+    For calling services and jobs directly. The app's pooled async connections belong to
+    the TestClient's event loop, so this uses an engine of its own without a pool.
+    """
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    from db.session import DATABASE_URL, to_async_url
+
+    url, connect_args = to_async_url(DATABASE_URL)
+
+    def run(fn):
+        async def main():
+            engine = create_async_engine(url, connect_args=connect_args, poolclass=NullPool)
+            try:
+                async with AsyncSession(engine, expire_on_commit=False) as db:
+                    result = await fn(db)
+                    await db.commit()
+                    return result
+            finally:
+                await engine.dispose()
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from db.session import SessionLocal
+from models.models import Violation, gen_uuid
+from testing.query_budget import count_queries
+
+
+def family_dashboard_queries(client, make_user, make_goal, children: int) -> int:
+    """Seed a parent with `children` children (a goal, wallet and violation today each);
+    returns the statements one dashboard request runs."""
+    parent_id, headers = make_user('parent')
+    violations = []
+    for _ in range(children):
+        child_id, _ = make_user('child', parent_id=parent_id)
+        goal_id, _ = make_goal(child_id)
+        violations.append({'id': gen_uuid(), 'user_id': child_id, 'goal_id': goal_id, 'app_name': 'com.test.app',
+                           'used_minutes': 90, 'limit_minutes': 60, 'warning_number': 1,
+                           'timestamp': datetime.utcnow()})
+    with SessionLocal() as db:
+        db.execute(insert(Violation), violations)
+        db.commit()
+    # first request signs the parent in (token cache), so both sides count the dashboard alone
+    assert client.get('/api/parent/dashboard', headers=headers).status_code == 200
+
+    with count_queries(f'dashboard with {children} children') as profile:
+        resp = client.get('/api/parent/dashboard', headers=headers)
+    assert resp.status_code == 200, resp.text
+    family = resp.json()['children']
+    assert len(family) == children
+    assert all(len(child['goals']) == 1 and child['violations_today'] == 1 for child in family)
+    return profile.count
+
+
+def test_dashboard_queries_do_not_grow_with_family(client, make_user, make_goal):
+    one = family_dashboard_queries(client, make_user, make_goal, 1)
+    fifty = family_dashboard_queries(client, make_user, make_goal, 50)
+
+    assert one == fifty
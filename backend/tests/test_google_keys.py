@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from auth import oauth
+from auth.oauth import GoogleKeyCache
+from testing.google_jwks import JWKSServer
+
+CLIENT_ID = 'test-client.apps.googleusercontent.com'
+
+
+@pytest.fixture
+def jwks():
+    with JWKSServer(max_age=3600) as server:
+        yield server
+
+
+@pytest.fixture
+def keys(jwks, monkeypatch):
+    """A cold GoogleKeyCache on the local JWKS server, used by verify_google_token."""
+    cache = GoogleKeyCache(certs_url=jwks.url, min_refetch_seconds=30)
+    monkeypatch.setattr(oauth, 'google_keys', cache)
+    monkeypatch.setattr(oauth, 'GOOGLE_CLIENT_ID', CLIENT_ID)
+    return cache
+
+
+def verify(token: str) -> dict:
+    return asyncio.run(oauth.verify_google_token(token))
+
+
+def test_cold_cache_fetches_once_then_verifies_locally(jwks, keys):
+    assert verify(jwks.mint_id_token('a@example.com', CLIENT_ID))['email'] == 'a@example.com'
+    assert jwks.requests == 1
+    assert keys.is_fresh
+
+    for i in range(5):
+        verify(jwks.mint_id_token(f'user{i}@example.com', CLIENT_ID))
+
+    assert jwks.requests == 1
+
+
+def test_concurrent_cold_logins_share_one_fetch(jwks, keys):
+    jwks.latency = 0.05
+    tokens = [jwks.mint_id_token(f'user{i}@example.com', CLIENT_ID) for i in range(10)]
+
+    async def login_all():
+        return await asyncio.gather(*(oauth.verify_google_token(t) for t in tokens))
+
+    claims = asyncio.run(login_all())
+
+    assert [c['email'] for c in claims] == [f'user{i}@example.com' for i in range(10)]
+    assert jwks.requests == 1
+
+
+def test_rotated_key_is_fetched_on_first_use(jwks, keys):
+    verify(jwks.mint_id_token('a@example.com', CLIENT_ID))
+    # the refetch limit only applies within min_refetch_seconds of the last fetch
+    keys._fetched_at -= keys.min_refetch_seconds
+    jwks.rotate(drop_old=True)
+
+    assert verify(jwks.mint_id_token('b@example.com', CLIENT_ID))['email'] == 'b@example.com'
+    assert jwks.requests == 2
+
+
+def test_unknown_kid_refetch_is_rate_limited(jwks, keys):
+    verify(jwks.mint_id_token('a@example.com', CLIENT_ID))
+    forged = JWKSServer()  # a key Google never published
+
+    for _ in range(3):
+        with pytest.raises(ValueError, match='unknown signing key'):
+            verify(forged.mint_id_token('a@example.com', CLIENT_ID))
+
+    assert jwks.requests == 1
+
+
+def test_expired_cache_is_refreshed(jwks, keys):
+    jwks.max_age = 0
+    verify(jwks.mint_id_token('a@example.com', CLIENT_ID))
+    verify(jwks.mint_id_token('b@example.com', CLIENT_ID))
+
+    assert jwks.requests == 2
+
+
+@pytest.mark.parametrize('claims, error', [
+    ({'audience': 'someone-else.apps.googleusercontent.com'}, 'Invalid token'),
+    ({'audience': CLIENT_ID, 'issuer': 'https://evil.example.com'}, 'wrong issuer'),
+    ({'audience': CLIENT_ID, 'lifetime': -3600}, 'Invalid token'),
+])
+def test_rejects_bad_claims(jwks, keys, claims, error):
+    with pytest.raises(ValueError, match=error):
+        verify(jwks.mint_id_token('a@example.com', **claims))
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from db.session import SessionLocal
+from models.models import LinkingCode, User
+from services.linking_codes import LinkingCodeAllocator
+
+
+def generate_code(client, headers) -> str:
+    resp = client.post('/api/linking/generate-linking-code', headers=headers)
+    assert resp.status_code == 200, resp.text
+    return resp.json()['code']
+
+
+def test_verify_links_child(client, make_user):
+    parent_id, parent_headers = make_user('parent')
+    child_id, child_headers = make_user()
+
+    resp = client.post('/api/linking/verify-linking-code', json={'code': generate_code(client, parent_headers)},
+                       headers=child_headers)
+
+    assert resp.status_code == 200, resp.text
+    with SessionLocal() as db:
+        assert db.scalar(select(User.parent_id).where(User.id == child_id)) == parent_id
+
+
+def test_verify_rechecks_link_behind_cached_principal(client, make_user):
+    first_parent, _ = make_user('parent')
+    _, second_parent_headers = make_user('parent')
+    child_id, child_headers = make_user()
+    # cache the unlinked principal, then link it behind the cache's back (as another worker would)
+    assert client.get('/api/me', headers=child_headers).status_code == 200
+    with SessionLocal() as db:
+        db.execute(update(User).where(User.id == child_id).values(parent_id=first_parent, role='child'))
+        db.commit()
+
+    resp = client.post('/api/linking/verify-linking-code', json={'code': generate_code(client, second_parent_headers)},
+                       headers=child_headers)
+
+    assert resp.status_code == 400
+    with SessionLocal() as db:
+        assert db.scalar(select(User.parent_id).where(User.id == child_id)) == first_parent
+
+
+def allocator_trying(*codes: str) -> LinkingCodeAllocator:
+    """A fresh allocator (bitmap not loaded from the DB) that offers `codes` first."""
+    allocator = LinkingCodeAllocator()
+    allocator._build_order()
+    allocator._order[:len(codes)] = [int(code) for code in codes]
+    allocator._loaded = True
+    return allocator
+
+
+def code_row(code: str):
+    with SessionLocal() as db:
+        return db.execute(select(LinkingCode.parent_id, LinkingCode.is_used, LinkingCode.used_by_user_id,
+                                 LinkingCode.used_at).where(LinkingCode.code == code)).one()
+
+
+def test_used_code_is_not_recycled_over_its_audit_fields(client, make_user, run_async):
+    parent_id, parent_headers = make_user('parent')
+    child_id, child_headers = make_user()
+    code = generate_code(client, parent_headers)
+    client.post('/api/linking/verify-linking-code', json={'code': code}, headers=child_headers)
+    with SessionLocal() as db:
+        db.execute(update(LinkingCode).where(LinkingCode.code == code)
+                   .values(expires_at=datetime.utcnow() - timedelta(hours=1)))
+        db.commit()
+    other_parent, _ = make_user('parent')
+    allocator = allocator_trying(code)
+
+    allocated = run_async(lambda db: allocator.allocate(db, other_parent, datetime.utcnow() + timedelta(hours=24)))
+
+    assert allocated != code
+    used = code_row(code)
+    assert (used.parent_id, used.is_used, used.used_by_user_id) == (parent_id, True, child_id)
+    assert used.used_at is not None
+
+
+def test_expired_unused_code_is_recycled(client, make_user, run_async):
+    _, parent_headers = make_user('parent')
+    code = generate_code(client, parent_headers)
+    with SessionLocal() as db:
+        db.execute(update(LinkingCode).where(LinkingCode.code == code)
+                   .values(expires_at=datetime.utcnow() - timedelta(hours=1)))
+        db.commit()
+    other_parent, _ = make_user('parent')
+    allocator = allocator_trying(code)
+
+    allocated = run_async(lambda db: allocator.allocate(db, other_parent, datetime.utcnow() + timedelta(hours=24)))
+
+    assert allocated == code
+    assert code_row(code).parent_id == other_parent
+
+
+def test_loaded_allocator_holds_used_codes(client, make_user, run_async):
+    _, parent_headers = make_user('parent')
+    _, child_headers = make_user()
+    code = generate_code(client, parent_headers)
+    client.post('/api/linking/verify-linking-code', json={'code': code}, headers=child_headers)
+    allocator = LinkingCodeAllocator()
+
+    run_async(allocator.load)
+
+    assert allocator._is_active(int(code))
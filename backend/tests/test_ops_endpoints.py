@@ -0,0 +1,50 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api import router as api_router_module
+
+OPS_PATHS = ['/api/health/token-cache', '/api/health/jobs', '/api/health/response-cache',
+             '/api/debug/profiles', '/api/debug/profiles/unknown']
+
+
+@pytest.fixture
+def api():
+    # the router alone: no startup migrations, and these endpoints need no database
+    app = FastAPI()
+    app.include_router(api_router_module.router, prefix='/api')
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.parametrize('path', OPS_PATHS)
+def test_ops_endpoints_are_off_without_a_token(api, monkeypatch, path):
+    monkeypatch.setattr(api_router_module, 'OPS_TOKEN', '')
+
+    assert api.get(path).status_code == 404
+    assert api.get(path, headers={'X-Ops-Token': ''}).status_code == 404
+
+
+@pytest.mark.parametrize('path', OPS_PATHS)
+def test_ops_endpoints_need_the_token(api, monkeypatch, path):
+    monkeypatch.setattr(api_router_module, 'OPS_TOKEN', 'ops-secret')
+
+    assert api.get(path).status_code == 403
+    assert api.get(path, headers={'X-Ops-Token': 'guess'}).status_code == 403
+
+
+def test_ops_token_opens_the_endpoints(api, monkeypatch):
+    monkeypatch.setattr(api_router_module, 'OPS_TOKEN', 'ops-secret')
+    headers = {'X-Ops-Token': 'ops-secret'}
+
+    resp = api.get('/api/health/token-cache', headers=headers)
+
+    assert resp.status_code == 200
+    assert 'hits' in resp.json()
+    assert api.get('/api/health/response-cache', headers=headers).status_code == 200
+
+
+def test_plain_health_check_stays_open(api, monkeypatch):
+    monkeypatch.setattr(api_router_module, 'OPS_TOKEN', 'ops-secret')
+
+    assert api.get('/api/health').json() == {'status': 'ok'}
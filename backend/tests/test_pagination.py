@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from db.session import SessionLocal
+from models.models import Violation, gen_uuid
+
+
+def seed_violations(user_id: str, goal_id: str, n: int) -> list:
+    """n violations, five to a timestamp so pages split ties on the id; every other one settled."""
+    base = datetime.utcnow() - timedelta(days=1)
+    rows = [{'id': gen_uuid(), 'user_id': user_id, 'goal_id': goal_id, 'app_name': 'com.test.app',
+             'used_minutes': 90, 'limit_minutes': 60, 'warning_number': i + 1,
+             'timestamp': base + timedelta(minutes=i // 5), 'settled_at': base if i % 2 else None}
+            for i in range(n)]
+    with SessionLocal() as db:
+        db.execute(insert(Violation), rows)
+        db.commit()
+    return rows
+
+
+def page_through(client, headers, **params) -> tuple:
+    """Follow next_cursor to the end; returns (ids in order, number of pages)."""
+    ids, pages, cursor = [], 0, None
+    while True:
+        resp = client.get('/api/violations', params={**params, **({'cursor': cursor} if cursor else {})},
+                          headers=headers)
+        assert resp.status_code == 200, resp.text
+        body = resp.json()
+        ids += [item['id'] for item in body['items']]
+        pages += 1
+        cursor = body['next_cursor']
+        if cursor is None:
+            return ids, pages
+
+
+def newest_first(rows: list) -> list:
+    return [row['id'] for row in sorted(rows, key=lambda row: (row['timestamp'], row['id']), reverse=True)]
+
+
+def test_violations_page_through_with_cursor(client, make_user, make_goal):
+    user_id, headers = make_user()
+    goal_id, _ = make_goal(user_id)
+    rows = seed_violations(user_id, goal_id, 25)
+
+    ids, pages = page_through(client, headers, limit=10)
+
+    assert ids == newest_first(rows)
+    assert pages == 3
+
+
+def test_violations_cursor_keeps_filters(client, make_user, make_goal):
+    user_id, headers = make_user()
+    goal_id, _ = make_goal(user_id)
+    rows = seed_violations(user_id, goal_id, 25)
+
+    ids, _ = page_through(client, headers, limit=4, status='settled', goal_id=goal_id)
+
+    assert ids == newest_first([row for row in rows if row['settled_at']])
+
+
+def test_violations_exact_last_page_has_no_cursor(client, make_user, make_goal):
+    user_id, headers = make_user()
+    goal_id, _ = make_goal(user_id)
+    seed_violations(user_id, goal_id, 10)
+
+    body = client.get('/api/violations', params={'limit': 10}, headers=headers).json()
+
+    assert len(body['items']) == 10
+    assert body['next_cursor'] is None
+
+
+def test_violations_rejects_forged_cursor(client, make_user):
+    _, headers = make_user()
+
+    resp = client.get('/api/violations', params={'cursor': 'not-a-cursor'}, headers=headers)
+
+    assert resp.status_code == 400
@@ -0,0 +1,94 @@
+import orjson
+from sqlalchemy import func, select, update
+
+from db.session import SessionLocal
+from models.models import PaymentEvent, Transaction, WalletLedger, WalletStatus
+from services.payments import apply_payment_events
+from testing.razorpay import payment_event, signed_delivery
+
+WEBHOOK = '/api/payments/razorpay/webhook'
+
+
+def inbox(event_id: str) -> list:
+    with SessionLocal() as db:
+        return db.execute(select(PaymentEvent.processed_at, PaymentEvent.failed_at, PaymentEvent.last_error)
+                          .where(PaymentEvent.id == event_id)).all()
+
+
+def balance(wallet_id: str) -> int:
+    with SessionLocal() as db:
+        return db.scalar(select(WalletLedger.current_balance).where(WalletLedger.id == wallet_id))
+
+
+def apply_inbox(run_async) -> None:
+    """Run the apply_payment_events job until the inbox is drained, as the scheduler does."""
+    while run_async(lambda db: apply_payment_events(db, 100)):
+        pass
+
+
+def test_bad_signature_is_rejected_and_not_stored(client, make_user, make_goal):
+    user_id, _ = make_user()
+    _, wallet_id = make_goal(user_id)
+    body, headers = signed_delivery(payment_event('payment.captured', wallet_id, 10_000), secret='not-the-secret')
+
+    resp = client.post(WEBHOOK, content=body, headers=headers)
+
+    assert resp.status_code == 400
+    assert inbox(headers['x-razorpay-event-id']) == []
+
+    tampered = orjson.dumps(payment_event('payment.captured', wallet_id, 99_999_00))
+    _, headers = signed_delivery(payment_event('payment.captured', wallet_id, 10_000))
+    assert client.post(WEBHOOK, content=tampered, headers=headers).status_code == 400
+    assert inbox(headers['x-razorpay-event-id']) == []
+
+
+def test_redelivery_is_stored_and_credited_once(client, make_user, make_goal, run_async):
+    user_id, _ = make_user()
+    _, wallet_id = make_goal(user_id, balance=50_000)
+    event = payment_event('payment.captured', wallet_id, 10_000)
+    body, headers = signed_delivery(event)
+
+    first = client.post(WEBHOOK, content=body, headers=headers)
+    again = client.post(WEBHOOK, content=body, headers=headers)
+
+    assert first.json() == {'status': 'ok', 'duplicate': False}
+    assert again.json() == {'status': 'ok', 'duplicate': True}
+    assert len(inbox(headers['x-razorpay-event-id'])) == 1
+    # order.paid for the same payment is a different event but the same money
+    body, headers = signed_delivery(dict(event, event='order.paid'))
+    assert client.post(WEBHOOK, content=body, headers=headers).json()['duplicate'] is False
+    apply_inbox(run_async)
+
+    assert balance(wallet_id) == 60_000
+    payment_id = event['payload']['payment']['entity']['id']
+    with SessionLocal() as db:
+        assert db.scalar(select(func.count()).select_from(Transaction)
+                         .where(Transaction.razorpay_payment_id == payment_id)) == 1
+
+
+def test_captured_payment_for_inactive_wallet_is_marked_failed(client, make_user, make_goal, run_async):
+    user_id, _ = make_user()
+    _, wallet_id = make_goal(user_id, balance=50_000)
+    with SessionLocal() as db:
+        db.execute(update(WalletLedger).where(WalletLedger.id == wallet_id).values(status=WalletStatus.withdrawn))
+        db.commit()
+    body, headers = signed_delivery(payment_event('payment.captured', wallet_id, 10_000))
+    assert client.post(WEBHOOK, content=body, headers=headers).status_code == 200
+
+    apply_inbox(run_async)
+
+    [(processed_at, failed_at, last_error)] = inbox(headers['x-razorpay-event-id'])
+    assert processed_at is None and failed_at is not None
+    assert wallet_id in last_error
+    assert balance(wallet_id) == 50_000
+
+
+def test_captured_payment_without_wallet_id_is_marked_failed(client, run_async):
+    body, headers = signed_delivery(payment_event('payment.captured', '', 10_000))
+    assert client.post(WEBHOOK, content=body, headers=headers).status_code == 200
+
+    apply_inbox(run_async)
+
+    [(processed_at, failed_at, last_error)] = inbox(headers['x-razorpay-event-id'])
+    assert processed_at is None and failed_at is not None
+    assert last_error == 'no wallet_id in payment notes'
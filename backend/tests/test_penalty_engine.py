@@ -0,0 +1,103 @@
+import random
+
+import numpy as np
+import pytest
+
+from models.models import ViolationType
+from services.penalty_engine import _EVENT_CODES, compute_penalties, tier_percents
+from services.penalty_rules import penalty_fraction, tier_percent
+
+LIMIT = ViolationType.limit_exceeded
+
+
+def engine(goals: list, violations: list):
+    """compute_penalties over `goals` ((max_warnings, percent, balance)) and `violations`
+    ((goal, event type), in order within each goal); returns penalties per violation."""
+    order = sorted(range(len(violations)), key=lambda i: violations[i][0])
+    goal_index = np.array([violations[i][0] for i in order], dtype=np.int64)
+    warning_number = np.zeros(len(order), dtype=np.int64)
+    for n, i in enumerate(order):
+        warning_number[n] = 1 if n == 0 or goal_index[n - 1] != goal_index[n] else warning_number[n - 1] + 1
+    penalty, is_warning, goal_penalty, goal_warnings = compute_penalties(
+        goal_index,
+        warning_number,
+        np.array([_EVENT_CODES[violations[i][1]] for i in order], dtype=np.int64),
+        np.array([g[0] for g in goals], dtype=np.int64),
+        np.array([g[1] for g in goals], dtype=np.float64),
+        np.array([g[2] for g in goals], dtype=np.int64),
+    )
+    assert goal_penalty.tolist() == np.bincount(goal_index, weights=penalty, minlength=len(goals)).tolist()
+    result = [0] * len(violations)
+    for n, i in enumerate(order):
+        result[i] = int(penalty[n])
+    return result, goal_warnings.tolist()
+
+
+def immediate(goals: list, violations: list) -> list:
+    """Penalties as POST /api/violations/batch charges them in immediate mode, event by event."""
+    balances = [g[2] for g in goals]
+    counts = [0] * len(goals)
+    penalties = []
+    for goal, event_type in violations:
+        max_warnings, percent, _ = goals[goal]
+        counts[goal] += 1
+        fraction = penalty_fraction(event_type, counts[goal], max_warnings, percent, 0)
+        penalty = min(int(balances[goal] * fraction), balances[goal])
+        balances[goal] -= penalty
+        penalties.append(penalty)
+    return penalties
+
+
+def test_first_max_warnings_violations_are_warnings():
+    penalties, warnings = engine([(3, 10.0, 10_000)], [(0, LIMIT)] * 6)
+
+    assert penalties == [0, 0, 0, 1_000, 900, 810]
+    assert warnings == [3]
+
+
+@pytest.mark.parametrize('deposit, percent', [
+    (100_000_00, 5.0), (100_000, 5.0), (99_999, 10.0), (50_000, 10.0),
+    (49_999, 15.0), (20_000, 15.0), (19_999, 20.0), (5_000, 20.0), (4_999, 0.0),
+])
+def test_tier_percent_follows_readme_table(deposit, percent):
+    assert tier_percent(deposit) == percent
+    assert tier_percents(np.array([deposit]))[0] == percent
+
+
+@pytest.mark.parametrize('event_type', [ViolationType.uninstall_attempt, ViolationType.permission_revoke])
+def test_uninstall_and_permission_revoke_take_half_even_during_warnings(event_type):
+    penalties, warnings = engine([(3, 10.0, 10_001)], [(0, LIMIT), (0, event_type), (0, LIMIT)])
+
+    assert penalties == [0, 5_000, 0]
+    assert warnings == [2]
+
+
+def test_safe_mode_takes_everything_left():
+    penalties, _ = engine([(0, 10.0, 12_345)], [(0, LIMIT), (0, ViolationType.safe_mode), (0, LIMIT)])
+
+    assert penalties == [1_234, 11_111, 0]
+
+
+def test_goals_in_one_chunk_are_settled_independently():
+    goals = [(1, 10.0, 1_000), (0, 20.0, 500), (2, 5.0, 0)]
+    violations = [(1, LIMIT), (0, LIMIT), (1, LIMIT), (0, LIMIT), (2, LIMIT), (2, LIMIT), (2, LIMIT)]
+
+    penalties, warnings = engine(goals, violations)
+
+    assert penalties == [100, 0, 80, 100, 0, 0, 0]
+    assert warnings == [1, 0, 2]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_immediate_mode_to_the_paisa(seed):
+    # odd balances and long runs are where rounding the running balance once per
+    # violation and compounding the fractions first would drift apart
+    rng = random.Random(seed)
+    events = [LIMIT] * 8 + list(ViolationType)
+    goals = [(rng.randint(0, 3), rng.choice([5.0, 10.0, 15.0, 20.0, 33.3]), rng.choice([0, 1, 999, 5_001, rng.randint(0, 10 ** 9)]))
+             for _ in range(200)]
+    violations = [(rng.randrange(len(goals)), rng.choice(events)) for _ in range(3_000)]
+
+    penalties, _ = engine(goals, violations)
+
+    assert penalties == immediate(goals, violations)
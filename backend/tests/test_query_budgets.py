@@ -0,0 +1,66 @@
+"""
+SQL statement budgets for the hot authenticated paths. A budget is the number of
+statements the handler needs today; going over it fails with the statements run.
+"""
+
+
+def test_cached_token_costs_no_queries(client, make_user, query_budget):
+    _, headers = make_user()
+    assert client.get('/api/me', headers=headers).status_code == 200
+
+    with query_budget(0, 'GET /api/me with a cached token'):
+        assert client.get('/api/me', headers=headers).status_code == 200
+
+
+def test_uncached_token_costs_one_user_lookup(client, make_user, query_budget):
+    _, headers = make_user()
+
+    with query_budget(1, 'GET /api/me with a new token'):
+        assert client.get('/api/me', headers=headers).status_code == 200
+
+
+def test_uncached_parent_token_costs_one_user_lookup(client, make_user, query_budget):
+    # the session token is compared on the row get_current_user already loaded
+    _, headers = make_user('parent')
+
+    with query_budget(1, 'GET /api/me with a new parent token'):
+        assert client.get('/api/me', headers=headers).status_code == 200
+
+
+def test_verify_linking_code_budget(client, make_user, query_budget):
+    _, parent_headers = make_user('parent')
+    _, child_headers = make_user()
+    code = client.post('/api/linking/generate-linking-code', headers=parent_headers).json()['code']
+    assert client.get('/api/me', headers=child_headers).status_code == 200
+
+    # code lookup, parent, locked user row, the two updates and the refresh
+    with query_budget(6, 'POST /api/linking/verify-linking-code'):
+        resp = client.post('/api/linking/verify-linking-code', json={'code': code}, headers=child_headers)
+    assert resp.status_code == 200, resp.text
+
+
+def test_my_children_budget(client, make_user, query_budget):
+    parent_id, headers = make_user('parent')
+    for _ in range(3):
+        make_user('child', parent_id=parent_id)
+
+    # user lookup, ETag version, children
+    with query_budget(3, 'GET /api/linking/my-children'):
+        resp = client.get('/api/linking/my-children', headers=headers)
+    assert resp.status_code == 200, resp.text
+    assert len(resp.json()['children']) == 3
+
+
+def test_my_parent_budget(client, make_user, query_budget):
+    parent_id, _ = make_user('parent')
+    _, headers = make_user('child', parent_id=parent_id)
+
+    # user lookup, then the parent row (which is also the ETag version)
+    with query_budget(2, 'GET /api/linking/my-parent'):
+        resp = client.get('/api/linking/my-parent', headers=headers)
+    assert resp.status_code == 200, resp.text
+    assert resp.json()['id'] == parent_id
+
+    # the token and the rendered body are both cached now
+    with query_budget(0, 'GET /api/linking/my-parent, cached'):
+        assert client.get('/api/linking/my-parent', headers=headers).status_code == 200
@@ -0,0 +1,109 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api import rate_limit as rate_limit_module
+from api.linking import router as linking_router
+from api.rate_limit import RateLimiter, limiter, limiters
+from auth.security import create_access_token
+from db.session import get_db
+from testing.query_budget import count_queries
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit_module, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def fresh_limits():
+    """Empty every limiter's buckets around the test (the app's limiters are process-wide)."""
+    for lim in limiters.values():
+        lim.clear()
+    yield
+    for lim in limiters.values():
+        lim.clear()
+
+
+def test_bucket_refills_at_the_configured_rate(clock):
+    bucket = RateLimiter('test', capacity=3, period=3)
+
+    assert [bucket.hit('a') for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.hit('a') == pytest.approx(1.0)
+
+    clock.now += 0.5
+    assert bucket.hit('a') == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.hit('a') == 0.0
+
+    # a long idle spell refills to capacity and no further
+    clock.now += 60
+    assert [bucket.hit('a') for _ in range(4)][-1] == pytest.approx(1.0)
+    assert (bucket.allowed, bucket.rejected) == (7, 3)
+
+
+def test_keys_have_separate_buckets(clock):
+    bucket = RateLimiter('test', capacity=1, period=60)
+
+    assert bucket.hit('a') == 0.0
+    assert bucket.hit('a') > 0
+    assert bucket.hit('b') == 0.0
+
+
+def test_idle_keys_are_evicted_least_recently_used_first(clock):
+    bucket = RateLimiter('test', capacity=1, period=60, max_keys=2, shards=1)
+    bucket.hit('a')
+    bucket.hit('b')
+    bucket.hit('a')  # a is now the most recently used, and empty
+
+    bucket.hit('c')
+
+    assert bucket.evictions == 1
+    assert bucket.stats()['keys'] == 2
+    # a kept its empty bucket; b was dropped and comes back with a full one, pushing out c
+    assert bucket.hit('a') > 0
+    assert bucket.hit('b') == 0.0
+    assert bucket.evictions == 2
+    assert bucket.hit('c') == 0.0
+
+
+def test_over_limit_verify_is_rejected_before_any_query(fresh_limits):
+    app = FastAPI()
+    app.include_router(linking_router, prefix='/api/linking')
+
+    async def no_db():
+        raise AssertionError('a rate-limited request opened a database session')
+        yield  # pragma: no cover
+
+    app.dependency_overrides[get_db] = no_db
+    headers = {'Authorization': f"Bearer {create_access_token('rate-limited-user')}"}
+    limiter('verify_code_user', '5/60').hit('user:rate-limited-user', cost=5)
+
+    with TestClient(app) as client, count_queries('verify-linking-code') as profile:
+        resp = client.post('/api/linking/verify-linking-code', json={'code': '123456'}, headers=headers)
+
+    assert resp.status_code == 429
+    assert int(resp.headers['retry-after']) >= 1
+    assert profile.count == 0
+
+
+def test_verify_over_limit_costs_no_queries(client, make_user, query_budget, fresh_limits):
+    _, headers = make_user()
+    for _ in range(5):
+        resp = client.post('/api/linking/verify-linking-code', json={'code': '000000'}, headers=headers)
+        assert resp.status_code != 429, resp.text
+
+    with query_budget(0, 'POST /api/linking/verify-linking-code over the limit'):
+        resp = client.post('/api/linking/verify-linking-code', json={'code': '000000'}, headers=headers)
+
+    assert resp.status_code == 429
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from db import replicas
+from db.replicas import Replica, ReadSession, get_read_db
+
+
+class FakeSession:
+    def __init__(self, name: str, fail_after: int = None, error: Exception = None):
+        self.name = name
+        self.fail_after = fail_after
+        self.error = error or OperationalError('SELECT 1', {}, ConnectionResetError('connection reset by peer'))
+        self.statements = []
+        self.closed = False
+
+    async def execute(self, statement):
+        if self.fail_after is not None and len(self.statements) >= self.fail_after:
+            raise self.error
+        self.statements.append(statement)
+        return f'{self.name}: {statement}'
+
+    async def scalar(self, statement):
+        return await self.execute(statement)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    """A replica whose session fails after `fail_after` statements, and the primary sessions handed out."""
+    primaries = []
+
+    def primary():
+        primaries.append(FakeSession('primary'))
+        return primaries[-1]
+
+    def make(fail_after: int, error: Exception = None):
+        session = FakeSession('replica', fail_after, error)
+        replica = Replica(name='replica/test', engine=None, sessionmaker=lambda: session, healthy=True)
+        monkeypatch.setattr(replicas, 'replica_for', lambda user_id: replica)
+        return replica, session
+
+    monkeypatch.setattr(replicas, 'AsyncSessionLocal', primary)
+    return make, primaries
+
+
+def read(statements: list) -> list:
+    """Run `statements` in one get_read_db session, as a handler would."""
+    async def run():
+        agen = get_read_db()
+        db = await agen.__anext__()
+        try:
+            return [await db.execute(statement) for statement in statements]
+        finally:
+            await agen.aclose()
+
+    return asyncio.run(run())
+
+
+def test_request_moves_to_the_primary_when_the_replica_fails(sessions):
+    make, primaries = sessions
+    replica, session = make(fail_after=1)
+
+    answers = read(['a', 'b', 'c'])
+
+    # the failed statement is re-run on the primary, which serves the rest of the request
+    assert answers == ['replica: a', 'primary: b', 'primary: c']
+    assert not replica.healthy and replica.failures == 1
+    assert session.closed
+    assert len(primaries) == 1 and primaries[0].closed
+
+
+def test_healthy_replica_serves_the_whole_request(sessions):
+    make, primaries = sessions
+    replica, session = make(fail_after=None)
+
+    assert read(['a', 'b']) == ['replica: a', 'replica: b']
+    assert replica.healthy and replica.reads == 1
+    assert primaries == [] and session.closed
+
+
+def test_statement_errors_are_not_retried_on_the_primary(sessions):
+    make, primaries = sessions
+    replica, _ = make(fail_after=0, error=ProgrammingError('SELECT nope', {}, Exception('syntax error')))
+
+    with pytest.raises(ProgrammingError):
+        read(['a'])
+
+    assert replica.healthy and replica.failures == 0
+    assert primaries == []
+
+
+def test_primary_failure_after_fallback_is_raised(sessions, monkeypatch):
+    make, _ = sessions
+    replica, _ = make(fail_after=0)
+    monkeypatch.setattr(replicas, 'AsyncSessionLocal', lambda: FakeSession('primary', fail_after=0))
+
+    with pytest.raises(OperationalError):
+        read(['a'])
+
+    assert replica.failures == 1
+
+
+def test_read_session_passes_other_attributes_through():
+    session = FakeSession('replica')
+    db = ReadSession(Replica(name='replica/test', engine=None, sessionmaker=None), session)
+
+    assert db.statements is session.statements
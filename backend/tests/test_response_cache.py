@@ -0,0 +1,91 @@
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+from api.response_cache import ResponseCache, make_etag, response_cache
+from auth import oauth
+from auth.oauth import GoogleKeyCache
+from db.session import SessionLocal
+from models.models import User
+from testing.google_jwks import JWKSServer
+
+CLIENT_ID = 'test-client.apps.googleusercontent.com'
+
+
+def test_invalidate_user_drops_only_that_users_bodies():
+    cache = ResponseCache(maxsize=10, ttl_seconds=60)
+    cache.put('me', 'parent', make_etag('me', 1), b'{}')
+    cache.put('my-children', 'parent', make_etag('my-children', 1), b'{}')
+    cache.put('me', 'other', make_etag('me', 2), b'{}')
+
+    cache.invalidate_user('parent', None)
+
+    assert cache.get('me', 'parent') is None
+    assert cache.get('my-children', 'parent') is None
+    assert cache.get('me', 'other') is not None
+
+
+def test_matching_if_none_match_gets_304(client, make_user):
+    _, headers = make_user()
+    first = client.get('/api/me', headers=headers)
+    etag = first.headers['etag']
+
+    again = client.get('/api/me', headers={**headers, 'If-None-Match': etag})
+
+    assert again.status_code == 304
+    assert again.content == b''
+    assert again.headers['etag'] == etag
+    # weak comparison: the strong form and a list both match
+    assert client.get('/api/me', headers={**headers, 'If-None-Match': etag[2:]}).status_code == 304
+    assert client.get('/api/me', headers={**headers, 'If-None-Match': f'W/"stale", {etag}'}).status_code == 304
+    assert client.get('/api/me', headers={**headers, 'If-None-Match': 'W/"stale"'}).status_code == 200
+
+
+def test_verify_linking_code_invalidates_the_parents_children(client, make_user):
+    parent_id, parent_headers = make_user('parent')
+    child_id, child_headers = make_user()
+    before = client.get('/api/linking/my-children', headers=parent_headers)
+    assert before.json()['children'] == []
+    assert response_cache.get('my-children', parent_id) is not None
+    code = client.post('/api/linking/generate-linking-code', headers=parent_headers).json()['code']
+
+    resp = client.post('/api/linking/verify-linking-code', json={'code': code}, headers=child_headers)
+
+    assert resp.status_code == 200, resp.text
+    assert response_cache.get('my-children', parent_id) is None
+    after = client.get('/api/linking/my-children', headers={**parent_headers, 'If-None-Match': before.headers['etag']})
+    assert after.status_code == 200
+    assert [child['id'] for child in after.json()['children']] == [child_id]
+
+
+@pytest.fixture
+def google(monkeypatch):
+    """google(email) -> an id_token for /auth/token, signed by a local JWKS server."""
+    with JWKSServer() as server:
+        monkeypatch.setattr(oauth, 'google_keys', GoogleKeyCache(certs_url=server.url))
+        monkeypatch.setattr(oauth, 'GOOGLE_CLIENT_ID', CLIENT_ID)
+        yield lambda email: server.mint_id_token(email, CLIENT_ID)
+
+
+def test_token_exchange_invalidates_the_users_responses(client, make_user, google):
+    email = f'test-{uuid.uuid4().hex}@example.com'
+
+    def sign_in(role):
+        resp = client.post('/auth/token', json={'id_token': google(email), 'role': role})
+        assert resp.status_code == 200, resp.text
+        return {'Authorization': f"Bearer {resp.json()['access_token']}"}
+
+    headers = sign_in('parent')
+    with SessionLocal() as db:
+        parent_id = db.scalar(select(User.id).where(User.email == email))
+    _, child_headers = make_user('child', parent_id=parent_id)
+    assert client.get('/api/me', headers=headers).status_code == 200
+    assert client.get('/api/linking/my-parent', headers=child_headers).status_code == 200
+    assert response_cache.get('me', parent_id) is not None
+    assert response_cache.get('my-parent', parent_id) is not None
+
+    sign_in('parent')
+
+    assert response_cache.get('me', parent_id) is None
+    assert response_cache.get('my-parent', parent_id) is None
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from services import scheduler
+from services.scheduler import Job, run_job
+
+
+class FakeConnection:
+    """Records each statement with the connection it ran on and whether a transaction was open."""
+
+    def __init__(self, log, results):
+        self.log = log
+        self.results = results
+        self.in_transaction = False
+
+    def begin(self):
+        conn = self
+
+        class Transaction:
+            async def __aenter__(self):
+                conn.in_transaction = True
+                conn.log.append(('begin', conn))
+
+            async def __aexit__(self, *exc):
+                conn.log.append(('commit', conn))
+                conn.in_transaction = False
+
+        return Transaction()
+
+    async def scalar(self, statement, params=None):
+        assert self.in_transaction, 'statement ran outside the lock transaction'
+        self.log.append((str(statement).split()[0], self))
+        return self.results.pop(0)
+
+
+class FakeEngine:
+    def __init__(self, log, results):
+        self.log = log
+        self.results = results
+        self.connections = []
+
+    def connect(self):
+        engine = self
+
+        class Connect:
+            async def __aenter__(self):
+                conn = FakeConnection(engine.log, engine.results)
+                engine.connections.append(conn)
+                return conn
+
+            async def __aexit__(self, *exc):
+                pass
+
+        return Connect()
+
+
+class FakeSession:
+    def __init__(self, log):
+        self.log = log
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def commit(self):
+        self.log.append(('job commit', None))
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    log = []
+
+    def install(*results):
+        engine = FakeEngine(log, list(results))
+        monkeypatch.setattr(scheduler, 'async_engine', engine)
+        monkeypatch.setattr(scheduler, 'AsyncSessionLocal', lambda: FakeSession(log))
+        return engine
+
+    install.log = log
+    return install
+
+
+def make_job(log):
+    async def func(db, batch_size):
+        log.append(('job', None))
+        return 0
+
+    return Job(name='test', func=func, trigger='interval', trigger_args={}, period_seconds=60)
+
+
+def test_lock_and_claim_share_one_transaction_held_for_the_run(fake_db):
+    engine = fake_db(True, 'test')
+    job = make_job(fake_db.log)
+
+    asyncio.run(run_job(job))
+
+    [conn] = engine.connections
+    assert fake_db.log == [
+        ('begin', conn), ('SELECT', conn), ('INSERT', conn),
+        ('job', None), ('job commit', None),
+        ('commit', conn),
+    ]
+    assert (job.metrics.runs, job.metrics.skipped) == (1, 0)
+
+
+@pytest.mark.parametrize('results', [(False,), (True, None)], ids=['lock held', 'already ran'])
+def test_tick_that_loses_the_lock_or_the_claim_is_skipped(fake_db, results):
+    fake_db(*results)
+    job = make_job(fake_db.log)
+
+    asyncio.run(run_job(job))
+
+    assert ('job', None) not in fake_db.log
+    assert (job.metrics.runs, job.metrics.skipped) == (0, 1)
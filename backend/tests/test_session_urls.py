@@ -0,0 +1,28 @@
+import pytest
+
+from db.session import to_async_url, to_sync_url
+
+
+@pytest.mark.parametrize('url, driver', [
+    ('postgresql://u:p@db.example.com/app', 'postgresql+psycopg2'),
+    ('postgres://u:p@db.example.com/app', 'postgresql+psycopg2'),
+    ('postgresql+psycopg2://u:p@db.example.com/app', 'postgresql+psycopg2'),
+    # a driver picked on purpose is kept
+    ('postgresql+psycopg://u:p@db.example.com/app', 'postgresql+psycopg'),
+])
+def test_sync_url_pins_psycopg2_when_no_driver_is_named(url, driver):
+    assert to_sync_url(url).drivername == driver
+
+
+def test_sync_url_keeps_libpq_parameters():
+    url = to_sync_url('postgresql://u:p@db.example.com/app?sslmode=require&channel_binding=require')
+
+    assert dict(url.query) == {'sslmode': 'require', 'channel_binding': 'require'}
+
+
+def test_async_url_moves_sslmode_to_connect_args():
+    url, connect_args = to_async_url('postgresql://u:p@db.example.com/app?sslmode=require&channel_binding=require')
+
+    assert url.drivername == 'postgresql+asyncpg'
+    assert dict(url.query) == {}
+    assert connect_args == {'ssl': 'require'}
@@ -0,0 +1,46 @@
+from sqlalchemy import delete, update
+
+from db.session import SessionLocal
+from models.models import Goal, WalletLedger
+
+
+def sync(client, headers, since: int) -> dict:
+    resp = client.get('/api/sync', params={'since': since}, headers=headers)
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def test_sync_returns_only_changes_after_cursor(client, make_user, make_goal):
+    user_id, headers = make_user()
+    goal_id, wallet_id = make_goal(user_id)
+
+    first = sync(client, headers, 0)
+    assert first['full'] is True
+    assert [g['id'] for g in first['goals']] == [goal_id]
+    assert [w['id'] for w in first['wallets']] == [wallet_id]
+
+    idle = sync(client, headers, first['version'])
+    assert (idle['full'], idle['goals'], idle['wallets'], idle['deleted']) == (False, [], [], [])
+
+    with SessionLocal() as db:
+        db.execute(update(Goal).where(Goal.id == goal_id).values(daily_limit_minutes=45))
+        db.commit()
+    changed = sync(client, headers, idle['version'])
+    assert [(g['id'], g['daily_limit_minutes']) for g in changed['goals']] == [(goal_id, 45)]
+    assert changed['wallets'] == []
+
+    with SessionLocal() as db:
+        db.execute(delete(WalletLedger).where(WalletLedger.id == wallet_id))
+        db.commit()
+    removed = sync(client, headers, changed['version'])
+    assert [(d['entity'], d['entity_id']) for d in removed['deleted']] == [('wallet', wallet_id)]
+
+
+def test_sync_cursor_from_the_future_gets_full_state(client, make_user, make_goal):
+    user_id, headers = make_user()
+    goal_id, _ = make_goal(user_id)
+
+    body = sync(client, headers, 2 ** 62)
+
+    assert body['full'] is True
+    assert [g['id'] for g in body['goals']] == [goal_id]
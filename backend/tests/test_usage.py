@@ -0,0 +1,107 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import delete, text, update
+
+from db.session import SessionLocal
+from models.models import DailyUsage
+
+APPS = ('com.test.video', 'com.test.game')
+
+
+def seed_usage(client, headers, first: date, days: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    reports = [{'app_name': app, 'day': (first + timedelta(days=d)).isoformat(), 'minutes': rng.randint(0, 300)}
+               for d in range(days) for app in APPS if rng.random() < 0.8]
+    for i in range(0, len(reports), 500):
+        resp = client.post('/api/usage', json=reports[i:i + 500], headers=headers)
+        assert resp.status_code == 200, resp.text
+
+
+def plain_sum(user_id: str, start: date, end: date, granularity: str, app_name: str = None) -> list:
+    """The series as a GROUP BY over daily_usage, without the rollups."""
+    with SessionLocal() as db:
+        rows = db.execute(text("""
+            SELECT CAST(date_trunc(:granularity, day) AS date) AS period_start, app_name, SUM(minutes) AS minutes
+            FROM daily_usage
+            WHERE user_id = :user_id AND day BETWEEN :start AND :end
+              AND (CAST(:app_name AS VARCHAR) IS NULL OR app_name = :app_name)
+            GROUP BY 1, 2
+            HAVING SUM(minutes) > 0
+            ORDER BY 1, 2
+        """), {'granularity': granularity, 'user_id': user_id, 'start': start, 'end': end,
+               'app_name': app_name}).all()
+    return [{'period_start': row.period_start.isoformat(), 'app_name': row.app_name, 'minutes': row.minutes}
+            for row in rows]
+
+
+def series(client, headers, start: date, end: date, **params) -> dict:
+    resp = client.get('/api/usage', params={'start': start.isoformat(), 'end': end.isoformat(), **params},
+                      headers=headers)
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    # periods with no minutes left (e.g. after deletes) read as zero rows in the rollups
+    body['series'] = [row for row in body['series'] if row['minutes']]
+    return body
+
+
+def spans(today: date) -> list:
+    """(granularity, start, end) spans with partial periods at both ends, and aligned ones."""
+    monday = today - timedelta(days=today.weekday() + 7 * 60)
+    wednesday = monday + timedelta(days=2)
+    month = (today.replace(day=1) - timedelta(days=440)).replace(day=1)
+    return [
+        ('day', today - timedelta(days=40), today - timedelta(days=3)),
+        ('week', wednesday, wednesday + timedelta(days=120)),  # Wednesday to Thursday
+        ('week', monday, monday + timedelta(weeks=20, days=-1)),  # whole weeks only
+        ('week', monday + timedelta(days=6), monday + timedelta(days=70)),  # one day of the first week
+        ('month', month + timedelta(days=14), month + timedelta(days=414)),
+        ('month', month, today.replace(day=1) - timedelta(days=1)),  # whole months only
+    ]
+
+
+@pytest.fixture
+def usage_user(client, make_user):
+    user_id, headers = make_user()
+    today = date.today()
+    seed_usage(client, headers, today - timedelta(days=460), 455)
+    return user_id, headers, today
+
+
+def test_series_matches_a_plain_sum_over_daily_rows(client, usage_user):
+    user_id, headers, today = usage_user
+
+    for granularity, start, end in spans(today):
+        body = series(client, headers, start, end)
+        assert body['granularity'] == granularity, (start, end)
+        assert body['series'] == plain_sum(user_id, start, end, granularity), (granularity, start, end)
+        assert body['total_minutes'] == sum(row['minutes'] for row in body['series'])
+
+
+def test_series_for_one_app_matches_a_plain_sum(client, usage_user):
+    user_id, headers, today = usage_user
+
+    for granularity, start, end in spans(today):
+        body = series(client, headers, start, end, app_name=APPS[0])
+        assert body['series'] == plain_sum(user_id, start, end, granularity, APPS[0]), (granularity, start, end)
+
+
+def test_rollups_follow_deleted_and_moved_daily_rows(client, usage_user):
+    user_id, headers, today = usage_user
+    first = today - timedelta(days=460)
+    with SessionLocal() as db:
+        # whole weeks and months go, as in a data deletion request, plus scattered days
+        db.execute(delete(DailyUsage).where(DailyUsage.user_id == user_id, DailyUsage.day >= first + timedelta(days=100),
+                                            DailyUsage.day < first + timedelta(days=140)))
+        db.execute(delete(DailyUsage).where(DailyUsage.user_id == user_id,
+                                            text("CAST(EXTRACT(DOY FROM day) AS integer) % 9 = 0")))
+        # a correction moving a row to another day (and month partition) and another app
+        db.execute(update(DailyUsage).where(DailyUsage.user_id == user_id, DailyUsage.day == first + timedelta(days=200),
+                                            DailyUsage.app_name == APPS[1])
+                   .values(day=first + timedelta(days=260), app_name='com.test.moved'))
+        db.commit()
+
+    for granularity, start, end in spans(today):
+        body = series(client, headers, start, end)
+        assert body['series'] == plain_sum(user_id, start, end, granularity), (granularity, start, end)
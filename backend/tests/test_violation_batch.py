@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from db.session import SessionLocal
+from models.models import Transaction, Violation, WalletLedger
+
+
+def events(goal_id: str, ids) -> list:
+    start = datetime.utcnow() - timedelta(hours=1)
+    return [{'client_event_id': f'evt-{i}', 'goal_id': goal_id, 'app_name': 'com.test.app',
+             'used_minutes': 90, 'limit_minutes': 60, 'timestamp': (start + timedelta(minutes=i)).isoformat()}
+            for i in ids]
+
+
+def ledger(user_id: str, wallet_id: str) -> tuple:
+    """(violations, transactions, wallet balance, total penalty) of one user."""
+    with SessionLocal() as db:
+        return (
+            db.scalar(select(func.count()).select_from(Violation).where(Violation.user_id == user_id)),
+            db.scalar(select(func.count()).select_from(Transaction).where(Transaction.user_id == user_id)),
+            *db.execute(select(WalletLedger.current_balance, WalletLedger.total_penalty)
+                        .where(WalletLedger.id == wallet_id)).one(),
+        )
+
+
+def test_resent_batch_changes_nothing(client, make_user, make_goal):
+    user_id, headers = make_user()
+    goal_id, wallet_id = make_goal(user_id)
+    batch = events(goal_id, range(6))
+
+    first = client.post('/api/violations/batch', json=batch, headers=headers)
+    assert first.status_code == 200, first.text
+    assert first.json()['inserted'] == 6
+    after_first = ledger(user_id, wallet_id)
+    assert after_first[1] > 0  # past max_warnings, so some events were charged
+
+    again = client.post('/api/violations/batch', json=batch, headers=headers)
+
+    assert again.status_code == 200, again.text
+    assert (again.json()['inserted'], again.json()['duplicates'], again.json()['penalty_total']) == (0, 6, 0)
+    assert ledger(user_id, wallet_id) == after_first
+
+
+def test_overlapping_batch_records_only_new_events(client, make_user, make_goal):
+    user_id, headers = make_user()
+    goal_id, wallet_id = make_goal(user_id)
+    client.post('/api/violations/batch', json=events(goal_id, range(4)), headers=headers)
+    violations, transactions, *_ = ledger(user_id, wallet_id)
+
+    resp = client.post('/api/violations/batch', json=events(goal_id, range(6)), headers=headers)
+
+    assert (resp.json()['inserted'], resp.json()['duplicates']) == (2, 4)
+    assert ledger(user_id, wallet_id)[:2] == (violations + 2, transactions + 2)
+
+
+def test_duplicates_within_a_batch_count_once(client, make_user, make_goal):
+    user_id, headers = make_user()
+    goal_id, wallet_id = make_goal(user_id)
+
+    resp = client.post('/api/violations/batch', json=events(goal_id, [0, 0, 1, 1, 1]), headers=headers)
+
+    assert resp.json()['inserted'] == 2
+    assert ledger(user_id, wallet_id)[0] == 2
+
+
+def test_ndjson_resend_is_idempotent(client, make_user, make_goal):
+    import json
+
+    user_id, headers = make_user()
+    goal_id, wallet_id = make_goal(user_id)
+    body = '\n'.join(json.dumps(event) for event in events(goal_id, range(5)))
+    headers = {**headers, 'Content-Type': 'application/x-ndjson'}
+
+    client.post('/api/violations/batch', content=body, headers=headers)
+    after_first = ledger(user_id, wallet_id)
+    resp = client.post('/api/violations/batch', content=body, headers=headers)
+
+    assert resp.json()['inserted'] == 0
+    assert ledger(user_id, wallet_id) == after_first
+
+
+def test_oversized_ndjson_is_rejected_while_streaming(client, make_user, make_goal, monkeypatch):
+    import json
+
+    monkeypatch.setattr('api.violations.VIOLATION_BATCH_MAX', 3)
+    user_id, headers = make_user()
+    goal_id, wallet_id = make_goal(user_id)
+    # the chunk that crosses the limit ends mid-line; that must not turn into a parse error
+    body = ''.join(json.dumps(event) + '\n' for event in events(goal_id, range(5))) + '{"client_event_id": "evt-'
+    headers = {**headers, 'Content-Type': 'application/x-ndjson'}
+
+    resp = client.post('/api/violations/batch', content=body, headers=headers)
+
+    assert resp.status_code == 413, resp.text
+    assert ledger(user_id, wallet_id)[0] == 0
+
+
+def test_event_without_timestamp_counts_as_received_now(client, make_user, make_goal):
+    user_id, headers = make_user()
+    goal_id, _ = make_goal(user_id)
+    batch = events(goal_id, range(3))
+    undated = dict(batch[0], client_event_id='evt-undated')
+    del undated['timestamp']
+
+    resp = client.post('/api/violations/batch', json=[undated] + batch, headers=headers)
+
+    assert resp.status_code == 200, resp.text
+    with SessionLocal() as db:
+        rows = db.execute(select(Violation.client_event_id, Violation.warning_number, Violation.timestamp)
+                          .where(Violation.user_id == user_id).order_by(Violation.warning_number)).all()
+    # sorted and stored with the same substituted time: after the dated events, not before them
+    assert [row.client_event_id for row in rows] == ['evt-0', 'evt-1', 'evt-2', 'evt-undated']
+    assert rows[-1].timestamp > rows[-2].timestamp
@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy import func, select, update
+
+from db.session import SessionLocal
+from models.models import Transaction, TransactionType, WalletLedger, WalletStatus
+from services import wallet
+
+
+def state(wallet_id: str) -> tuple:
+    """(balance, withdrawal transactions) of one wallet."""
+    with SessionLocal() as db:
+        return (
+            db.scalar(select(WalletLedger.current_balance).where(WalletLedger.id == wallet_id)),
+            db.scalar(select(func.count()).select_from(Transaction).where(
+                Transaction.wallet_id == wallet_id, Transaction.type == TransactionType.withdrawal)),
+        )
+
+
+def test_withdraw_debits_an_active_wallet(client, make_user, make_goal, run_async):
+    user_id, _ = make_user()
+    _, wallet_id = make_goal(user_id, balance=50_000)
+
+    result = run_async(lambda db: wallet.withdraw(db, wallet_id, 20_000))
+
+    assert (result.balance, result.amount) == (30_000, 20_000)
+    assert state(wallet_id) == (30_000, 1)
+
+
+def test_withdraw_over_the_balance_is_refused(client, make_user, make_goal, run_async):
+    user_id, _ = make_user()
+    _, wallet_id = make_goal(user_id, balance=50_000)
+
+    with pytest.raises(wallet.InsufficientFundsError):
+        run_async(lambda db: wallet.withdraw(db, wallet_id, 50_001))
+
+    assert state(wallet_id) == (50_000, 0)
+
+
+@pytest.mark.parametrize('status', [WalletStatus.withdrawn, WalletStatus.completed])
+def test_withdraw_from_an_inactive_wallet_is_refused(client, make_user, make_goal, run_async, status):
+    user_id, _ = make_user()
+    _, wallet_id = make_goal(user_id, balance=50_000)
+    with SessionLocal() as db:
+        db.execute(update(WalletLedger).where(WalletLedger.id == wallet_id).values(status=status))
+        db.commit()
+
+    with pytest.raises(wallet.WalletNotFoundError):
+        run_async(lambda db: wallet.withdraw(db, wallet_id, 10_000))
+
+    assert state(wallet_id) == (50_000, 0)